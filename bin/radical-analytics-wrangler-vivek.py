@@ -37,7 +37,7 @@ def get_adap_time(loc, sid):
     
     # Get adap time
     duration = 0.0
-    sess = ra.Session(stype='radical.entk', src=loc, sid=sid)
+    sess = ra.Session(stype='radical.entk', src=loc, sid=sid, cache=True)
     stages = sorted(sess.filter(etype='stage', inplace=False).list('uid'))
 #     print stages
     for stage in stages:
@@ -51,7 +51,7 @@ def get_adap_time(loc, sid):
 
 def get_entk_overheads(loc, sid):
     
-    sess = ra.Session(stype='radical.entk', src=loc, sid=sid)
+    sess = ra.Session(stype='radical.entk', src=loc, sid=sid, cache=True)
     init_time = sess.duration(event=[{ru.EVENT: 'create amgr obj'},
                                      {ru.EVENT: 'init rreq submission'}])
     res_sub_time = sess.duration(event=[{ru.EVENT: 'creating rreq'},
@@ -71,7 +71,7 @@ def get_entk_overheads(loc, sid):
 
 
 def get_entk_exec_time(loc, sid):
-    sess = ra.Session(stype='radical.entk', src=loc, sid=sid)
+    sess = ra.Session(stype='radical.entk', src=loc, sid=sid, cache=True)
     tasks = sess.filter(etype='task', inplace=False)
     return tasks.duration(state=['SCHEDULING','DONE'])
 
@@ -133,7 +133,7 @@ def process_rp_profiles(src):
     proc_data = os.path.join(proc,tag) + '/rp_data.json'
     data = {'task_mgmt': 0, 'exec_time': 0}
     
-    sess = ra.Session(stype='radical.pilot', src=loc, sid=sid)
+    sess = ra.Session(stype='radical.pilot', src=loc, sid=sid, cache=True)
     units = sess.filter(etype='unit', inplace=False)
         
     data['task_mgmt'] = units.duration(state=['NEW','DONE'])
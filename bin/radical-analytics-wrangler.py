@@ -13,11 +13,12 @@ This is a wrangler for RADICAL-Pilot (RP) sessions. It assumes the following:
 
 The wrangler cycles through all the experiment directories within the data
 directory and calculates all the durations for each session, pilot, and unit.
-Durations and associated timestamps are saved into three csv files:
-sessions.csv for the session entities; pilots.csv for pilot entities; and
-units.csv for unit entities.
+Durations and associated timestamps are saved into three tables of the SQLite
+database wrangler.db: sessions for the session entities; pilots for pilot
+entities; and units for unit entities.
 
-CSV files are written incrementally
+The tables are indexed by session, pilot and unit IDs, and are written
+incrementally, in one transaction per session.
 
 Examples:
 
@@ -28,15 +29,12 @@ Todo:
 
 1. Intercept and handle more errors from ra:
   - ValueError: no duration defined for given constraints
-2. Eliminate records in units/pilots when session fails to wrangle
-   (transactions).
 
 """
 
 import os
 import sys
 import glob
-import fcntl
 import getopt
 import psutil
 import numpy as np
@@ -47,7 +45,151 @@ import radical.utils     as ru
 import radical.pilot     as rp
 import radical.analytics as ra
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
+
+
+# -----------------------------------------------------------------------------
+# Database and table names where to save the DF of each entity of each
+# session, and the indexed columns of each table.  The database engine is
+# created in main, and the queue to the writer process in parallel mode.
+engine  = None
+queue   = None
+tables  = {'session': 'sessions',
+           'pilot'  : 'pilots',
+           'unit'   : 'units'}
+indexes = {'session': ['sid'],
+           'pilot'  : ['sid', 'pid'],
+           'unit'   : ['sid', 'uid', 'pid']}
+
+# FIXME: Define timestamps of the events of the pilot's states.
+sts = {rp.NEW     : None,
+       rp.DONE    : None,
+       rp.CANCELED: None,
+       rp.FAILED  : None}
+
+# FIXME: Define session durations.
+sdm = {'TTC': None}
+
+# Define timestamps of the events of the pilot's states.
+pts = {rp.NEW                   : None,
+       rp.PMGR_LAUNCHING_PENDING: None,
+       rp.PMGR_LAUNCHING        : None,
+       rp.PMGR_ACTIVE_PENDING   : None,
+       rp.PMGR_ACTIVE           : None,
+       rp.DONE                  : None,
+       rp.CANCELED              : None,
+       rp.FAILED                : None}
+
+# Define pilot durations.
+pdm = {'P_PMGR_SCHEDULING': [{ru.EVENT: 'state',             ru.STATE: rp.NEW                   },
+                             {ru.EVENT: 'state',             ru.STATE: rp.PMGR_LAUNCHING_PENDING}],
+       'P_PMGR_QUEUING'   : [{ru.EVENT: 'state',             ru.STATE: rp.PMGR_LAUNCHING_PENDING},
+                             {ru.EVENT: 'state',             ru.STATE: rp.PMGR_LAUNCHING        }],
+       'P_LRMS_SUBMITTING': [{ru.EVENT: 'state',             ru.STATE: rp.PMGR_LAUNCHING        },
+                             {ru.EVENT: 'state',             ru.STATE: rp.PMGR_ACTIVE_PENDING   }],
+       'P_LRMS_QUEUING'   : [{ru.EVENT: 'state',             ru.STATE: rp.PMGR_ACTIVE_PENDING   },
+                             {ru.EVENT: 'state',             ru.STATE: rp.PMGR_ACTIVE           }],
+       'P_LRMS_RUNNING'   : [{ru.EVENT: 'state',             ru.STATE: rp.PMGR_ACTIVE           },
+                            [{ru.EVENT: 'state',             ru.STATE: rp.DONE                  },
+                             {ru.EVENT: 'state',             ru.STATE: rp.FAILED                },
+                             {ru.EVENT: 'state',             ru.STATE: rp.CANCELED              }]],
+
+       # from utilization script
+       'util_p_total'     : [{ru.EVENT: 'bootstrap_1_start', ru.STATE: None                     },
+                             {ru.EVENT: 'bootstrap_1_stop',  ru.STATE: None                     }],
+
+       'util_p_boot'      : [{ru.EVENT: 'bootstrap_1_start', ru.STATE: None                     },
+                             {ru.EVENT: 'sync_rel',          ru.STATE: None                     }],
+       'util_p_setup_1'   : [{ru.EVENT: 'sync_rel',          ru.STATE: None                     },
+                             {ru.EVENT: 'orte_dvm_start',    ru.STATE: None                     }],
+       'util_p_orte'      : [{ru.EVENT: 'orte_dvm_start',    ru.STATE: None                     },
+                             {ru.EVENT: 'orte_dvm_ok',       ru.STATE: None                     }],
+       'util_p_setup_2'   : [{ru.EVENT: 'orte_dvm_ok',       ru.STATE: None                     },
+                             {ru.EVENT: 'state',             ru.STATE: rp.PMGR_ACTIVE           }],
+       'util_p_uexec'     : [{ru.EVENT: 'state',             ru.STATE: rp.PMGR_ACTIVE           },
+                             {ru.EVENT: 'cmd',               ru.STATE: None                     }],
+       'util_p_term'      : [{ru.EVENT: 'cmd',               ru.STATE: None                     },
+                             {ru.EVENT: 'bootstrap_1_stop',  ru.STATE: None                     }],
+      }
+
+# Define timestamps of the events of the pilot's states.
+uts = {rp.NEW                         : None,
+       rp.UMGR_SCHEDULING_PENDING     : None,
+       rp.UMGR_SCHEDULING             : None,
+       rp.UMGR_STAGING_INPUT_PENDING  : None,
+       rp.UMGR_STAGING_INPUT          : None,
+       rp.AGENT_STAGING_INPUT_PENDING : None,
+       rp.AGENT_STAGING_INPUT         : None,
+       rp.AGENT_SCHEDULING_PENDING    : None,
+       rp.AGENT_SCHEDULING            : None,
+       rp.AGENT_EXECUTING_PENDING     : None,
+       rp.AGENT_EXECUTING             : None,
+       rp.AGENT_STAGING_OUTPUT_PENDING: None,
+       rp.AGENT_STAGING_OUTPUT        : None,
+       rp.UMGR_STAGING_OUTPUT_PENDING : None,
+       rp.UMGR_STAGING_OUTPUT         : None,
+       rp.DONE                        : None,
+       rp.CANCELED                    : None,
+       rp.FAILED                      : None}
+
+# Define unit durations.
+udm = {'U_UMGR_SCHEDULING'      : [{ru.EVENT: 'state',                  ru.STATE: rp.NEW                         },
+                                   {ru.EVENT: 'state',                  ru.STATE: rp.UMGR_SCHEDULING_PENDING     }],
+       'U_UMGR_BINDING'         : [{ru.EVENT: 'state',                  ru.STATE: rp.UMGR_SCHEDULING_PENDING     },
+                                   {ru.EVENT: 'state',                  ru.STATE: rp.UMGR_SCHEDULING             }],
+     # 'I_UMGR_SCHEDULING'      : [{ru.EVENT: 'state',                  ru.STATE: rp.UMGR_SCHEDULING             },
+     #                             {ru.EVENT: 'state',                  ru.STATE: rp.UMGR_STAGING_INPUT_PENDING  }],
+     # 'I_UMGR_QUEING'          : [{ru.EVENT: 'state',                  ru.STATE: rp.UMGR_STAGING_INPUT_PENDING  },
+     #                             {ru.EVENT: 'state',                  ru.STATE: rp.UMGR_STAGING_INPUT          }],
+     # 'I_AGENT_SCHEDULING'     : [{ru.EVENT: 'state',                  ru.STATE: rp.UMGR_STAGING_INPUT          },
+     #                             {ru.EVENT: 'state',                  ru.STATE: rp.AGENT_STAGING_INPUT_PENDING }],
+     # 'I_AGENT_QUEUING'        : [{ru.EVENT: 'state',                  ru.STATE: rp.AGENT_STAGING_INPUT_PENDING },
+     #                             {ru.EVENT: 'state',                  ru.STATE: rp.AGENT_STAGING_INPUT         }],
+     # 'I_AGENT_TRANSFERRING'   : [{ru.EVENT: 'state',                  ru.STATE: rp.AGENT_STAGING_INPUT         },
+     #                             {ru.EVENT: 'state',                  ru.STATE: rp.AGENT_SCHEDULING_PENDING    }],
+       'U_AGENT_QUEUING'        : [{ru.EVENT: 'state',                  ru.STATE: rp.AGENT_SCHEDULING_PENDING    },
+                                   {ru.EVENT: 'state',                  ru.STATE: rp.AGENT_SCHEDULING            }],
+       'U_AGENT_SCHEDULING'     : [{ru.EVENT: 'state',                  ru.STATE: rp.AGENT_SCHEDULING            },
+                                   {ru.EVENT: 'state',                  ru.STATE: rp.AGENT_EXECUTING_PENDING     }],
+       'U_AGENT_QUEUING_EXEC'   : [{ru.EVENT: 'state',                  ru.STATE: rp.AGENT_EXECUTING_PENDING     },
+                                   {ru.EVENT: 'state',                  ru.STATE: rp.AGENT_EXECUTING             }],
+       'U_AGENT_EXECUTING'      : [{ru.EVENT: 'state',                  ru.STATE: rp.AGENT_EXECUTING             },
+                                   {ru.EVENT: 'state',                  ru.STATE: rp.AGENT_STAGING_OUTPUT_PENDING}],
+     # 'O_AGENT_QUEUING'        : [{ru.EVENT: 'state',                  ru.STATE: rp.AGENT_STAGING_OUTPUT_PENDING},
+     #                             {ru.EVENT: 'state',                  ru.STATE: rp.AGENT_STAGING_OUTPUT        }],
+     # 'O_UMGR_SCHEDULING'      : [{ru.EVENT: 'state',                  ru.STATE: rp.AGENT_STAGING_OUTPUT        },
+     #                             {ru.EVENT: 'state',                  ru.STATE: rp.UMGR_STAGING_OUTPUT_PENDING }],
+     # 'O_UMGR_QUEUING'         : [{ru.EVENT: 'state',                  ru.STATE: rp.UMGR_STAGING_OUTPUT_PENDING },
+     #                             {ru.EVENT: 'state',                  ru.STATE: rp.UMGR_STAGING_OUTPUT         }],
+     # 'O_UMGR_TRANSFERRING'    : [{ru.EVENT: 'state',                  ru.STATE: rp.UMGR_STAGING_OUTPUT         },
+     #                            [{ru.EVENT: 'state',                  ru.STATE: rp.DONE                        },
+     #                             {ru.EVENT: 'state',                  ru.STATE: rp.FAILED                      },
+     #                             {ru.EVENT: 'state',                  ru.STATE: rp.CANCELED                    }]],
+
+       # from utilization script
+        'util_u_total'          : [{ru.EVENT: 'schedule_ok',            ru.STATE: None                           },
+                                   {ru.EVENT: 'unschedule_stop',        ru.STATE: None                           }],
+
+        'util_u_equeue'         : [{ru.EVENT: 'schedule_ok',            ru.STATE: None                           },
+                                   {ru.EVENT: 'state',                  ru.STATE: rp.AGENT_EXECUTING             }],
+        'util_u_eprep'          : [{ru.EVENT: 'state',                  ru.STATE: rp.AGENT_EXECUTING             },
+                                   {ru.EVENT: 'exec_start',             ru.STATE: None                           }],
+        'util_u_exec_rp'        : [{ru.EVENT: 'exec_start',             ru.STATE: None                           },
+                                   {ru.EVENT: 'cu_start',               ru.STATE: None                           }],
+        'util_u_exec_cu'        : [{ru.EVENT: 'cu_start',               ru.STATE: None                           },
+                                   {ru.EVENT: 'cu_exec_start',          ru.STATE: None                           }],
+        'util_u_exec_orte'      : [{ru.EVENT: 'cu_exec_start',          ru.STATE: None                           },
+                                   {ru.EVENT: 'app_start',              ru.STATE: None                           }],
+        'util_u_exec_app'       : [{ru.EVENT: 'app_start',              ru.STATE: None                           },
+                                   {ru.EVENT: 'app_stop',               ru.STATE: None                           }],
+        'util_u_unschedule'     : [{ru.EVENT: 'app_stop',               ru.STATE: None                           },
+                                   {ru.EVENT: 'unschedule_stop',        ru.STATE: None                           }],
+      }
+
+
+# Compile the duration definitions once, instead of once per entity.
+pdm = {name: ra.RangeMatcher(event=event) for name, event in pdm.items()}
+udm = {name: ra.RangeMatcher(event=event) for name, event in udm.items()}
 
 
 # -----------------------------------------------------------------------------
@@ -65,9 +207,12 @@ def help():
                         For example 'rp.session.radical.mturilli.017233.0002'.
                         When specified, the wrangler wrangles only this
                         session.
-        -o --odir       Name of the directory where to load and save the csv
-                        files created by the wrangler. When not specified,
+        -o --odir       Name of the directory where to load and save the
+                        database created by the wrangler. When not specified,
                         -d is used.
+        -j --jobs       Number of sessions to wrangle in parallel. Results are
+                        written by a single writer process. When not
+                        specified, sessions are wrangled one at a time.
         -h --help       Prints the help page.
         -u --usage      Prints usage command.
         """
@@ -79,7 +224,7 @@ def usage():
         message = """
         ra-wrangler.py -d <directory> -t <tag>
                        [-e <integer>] [-s <rp_session_ID>][-o <directory>]
-                       [-h] [-u]
+                       [-j <integer>] [-h] [-u]
         """
         return message
 
@@ -89,11 +234,12 @@ def clparse(argv):
               'eid' : None,  # experiment tag (mandatory).
               'enum': None,  # experiment number.
               'sid' : None,  # session ID.
-              'odir': None}  # directory where to save csv files.
+              'odir': None,  # directory where to save the database.
+              'jobs': 1}     # number of sessions to wrangle in parallel.
 
     try:
-        opts, args = getopt.getopt(argv, 'hud:t:e:s:o:',
-            ['help','usage','ddir=','etag=','eid=','sid=','odir='])
+        opts, args = getopt.getopt(argv, 'hud:t:e:s:o:j:',
+            ['help','usage','ddir=','etag=','eid=','sid=','odir=','jobs='])
         if not opts:
             print 'No options supplied'
             print usage()
@@ -118,6 +264,8 @@ def clparse(argv):
             clopts['sid'] = arg
         elif opt in ('-o', '--odir'):
             clopts['odir'] = arg
+        elif opt in ('-j', '--jobs'):
+            clopts['jobs'] = int(arg)
 
     # Define the directory where to output the cvs files created by the
     # wrangler.
@@ -179,64 +327,59 @@ def initialize_entity(etype=None):
 
 
 # -----------------------------------------------------------------------------
-def load_df(etype=None, sid=None):
-    if etype in ['session', 'pilot', 'unit']:
+def create_db(path):
+    '''
+    Create the engine of the SQLite database at `path`.  The Python sqlite3
+    driver commits on its own before `CREATE` statements, which would break
+    the transaction of `write_session()`.  We thus disable the transaction
+    handling of the driver and begin the transactions ourselves.
+    '''
 
-        # Initialize an empty DF with the entity's properties.
-        df = pd.DataFrame(initialize_entity(etype=etype))
+    ret = create_engine('sqlite:///%s' % path)
 
-        # Load the entity's csv into a Panda DataFrame.
-        if os.path.isfile(csvs[etype]):
-            df = pd.read_csv(csvs[etype], index_col=0)
+    @event.listens_for(ret, 'connect')
+    def connect(dbapi_conn, record):
+        dbapi_conn.isolation_level = None
 
-            # Prune the DF to save memory.
-            if sid:
-                df = df[df.sid == sid]
+    @event.listens_for(ret, 'begin')
+    def begin(conn):
+        conn.execute('BEGIN')
 
-        return df
-    else:
-        error = 'Cannot itialize entity %s' % etype
-        print error
-        sys.exit(1)
+    return ret
 
 
 # -----------------------------------------------------------------------------
-def store_df(new_df, stored=pd.DataFrame(), etype=None):
+def has_table(conn, etype):
+
+    return conn.dialect.has_table(conn, tables[etype])
+
+
+# -----------------------------------------------------------------------------
+def store_df(new_df, etype=None, conn=None):
 
     # skip storing if no new data are passed.
     if new_df.empty:
         print 'WARNING: attempting to store an empty DF (skip).'
         return
 
-    # Set header for csv file
-    header = True
-    if os.path.isfile(csvs[etype]):
-        header = False
-
-    if etype == 'session':
-        new_sessions = new_df.drop('session', axis=1)
-        if stored.empty:
-            sessions = new_sessions
-        else:
-            sessions = stored.append(new_sessions)
-        sessions.to_csv(csvs[etype])
-
-    elif etype in ['pilot', 'unit']:
-        if stored.empty:
-            df = new_df
-        else:
-            df = stored.append(new_df, ignore_index=True)
-        df.reset_index(inplace=True, drop=True)
-        with open(csvs[etype], 'a') as f:
-            fcntl.flock(f, fcntl.LOCK_EX)
-            df.to_csv(f, header=header)
-            fcntl.flock(f, fcntl.LOCK_UN)
-
-    else:
+    if etype not in ['session', 'pilot', 'unit']:
         error = 'Cannot store DF to %s' % etype
         print error
         sys.exit(1)
 
+    if not conn:
+        conn = engine
+
+    if etype == 'session':
+        new_df = new_df.drop('session', axis=1)
+
+    # Only the new rows are appended.  The indexes are created along with the
+    # table.
+    new_df.to_sql(tables[etype], conn, if_exists='append', index=False)
+    for column in indexes[etype]:
+        conn.execute('CREATE INDEX IF NOT EXISTS %s_%s ON %s (%s)'
+                     % (tables[etype], column, tables[etype], column))
+
 
 # -----------------------------------------------------------------------------
 def parse_osg_hostid(hostid):
@@ -312,23 +455,13 @@ def load_pilots(sid, exp, sra_pilots, pdm, pu_rels, pts):
     sys.stdout.write('\n%s --- %s' % (exp, sid))
     ps = initialize_entity(etype='pilot')
 
-    # Did we already store pilots of this session?
-    # TODO: AM: ?
-    stored_pilots = load_df(etype='pilot', sid=sid)
-    stored_pids = []
-    if stored_pilots['sid'].any():
-        stored_pilots_sid = stored_pilots.loc[
-            stored_pilots['sid'] == sid].copy()
-        stored_pids = stored_pilots_sid['pid'].values.tolist()
+    # Derive all timestamps and durations of all pilots at once.
+    ptimes = sra_pilots.state_matrix('pilot', states=pts.keys())
+    pdurs  = sra_pilots.durations(pdm)
 
     # Derive properties and duration for each pilot.
     for pid in sorted(sra_pilots.list('uid')):
 
-        # Skip session if its pilots have been already stored.
-        if pid in stored_pids:
-            sys.stdout.write('\n%s already in %s' % (pid, csvs['pilot']))
-            continue
-
         # Pilot properties.
         sys.stdout.write('\n' + pid + ':\n')
         ps['pid'].append(pid)
@@ -336,7 +469,7 @@ def load_pilots(sid, exp, sra_pilots, pdm, pu_rels, pts):
         ps['experiment'].append(exp)
 
         # Get pilot entity from RA session.
-        pentity = sra_pilots.get(uid=pid)[0]
+        pentity = sra_pilots.entity(pid)
 
         # Host ID.
         if pentity.cfg['hostid']:
@@ -354,11 +487,9 @@ def load_pilots(sid, exp, sra_pilots, pdm, pu_rels, pts):
         for state in pts.keys():
             if state not in ps.keys():
                 ps[state] = []
-            try:
-                ps[state].append(pentity.timestamps(state=state)[0])
-            except:
+            ps[state].append(ptimes.loc[pid, state])
+            if np.isnan(ps[state][-1]):
                 print ' WARNING: Failed to get timestamp for state %s' % state
-                ps[state].append(np.nan)
 
         # Pilot durations.
         for duration in pdm.keys():
@@ -367,53 +498,33 @@ def load_pilots(sid, exp, sra_pilots, pdm, pu_rels, pts):
             #           Can there be more than one (why is it a list)?
             if duration not in ps.keys():
                 ps[duration] = []
-            try:
-                ps[duration].append(pentity.duration(event=pdm[duration]))
-                sys.stdout.write(' %s' % duration)
-            except:
+            ps[duration].append(pdurs.loc[pid, duration])
+            if np.isnan(ps[duration][-1]):
                 print ' WARNING: Failed to calculate duration %s' % duration
-                ps[duration].append(np.nan)
-
-    # Store pilots DF to csv and reload into memory to return the complete
-    # DF for the given sid.
-    if ps['pid']:
-        pilots = pd.DataFrame(ps)
-        # FIXME: This is a workaround to load the full DF before saving it. The
-        # DF is then unloaded loading only the portion related to the pilots
-        # just wrangled. This avoids using memory but needs cleanup.
-        # TODO: AM: ?
-        store_df(pilots, etype='pilot')
-        stored_pilots = load_df(etype='pilot', sid=sid)
-        print '\nstored in %s.' % csvs['pilot']
+            else:
+                sys.stdout.write(' %s' % duration)
 
-    # Returns the DF of the stored pilots if no new pilots have been added;
-    # the DF with the old and new pilots otherwise.
-    return stored_pilots
+    # Returns the DF of the session's pilots.  They are stored by
+    # write_session(), together with the session's units.
+    return pd.DataFrame(ps)
 
 
 # -----------------------------------------------------------------------------
-def load_units(sid, exp, sra_units, udm, pilots, sra, pu_rels, uts):
+def load_units(sid, exp, sra_units, udm, pilots, sra, up_rels, uts):
 
     sys.stdout.write('\n%s --- %s' % (exp, sid))
     us = initialize_entity(etype='unit')
 
-    # Did we already store units of this session?
-    stored_units = load_df(etype='unit', sid=sid)
-    stored_uids = []
-    if stored_units['sid'].any():
-        stored_units_sid = stored_units.loc[
-            stored_units['sid'] == sid].copy()
-        stored_uids = stored_units_sid['uid'].values.tolist()
+    # Host ID of each pilot of this session.
+    hids = dict(zip(pilots['pid'], pilots['hid']))
+
+    # Derive all timestamps and durations of all units at once.
+    utimes = sra_units.state_matrix('unit', states=uts.keys())
+    udurs  = sra_units.durations(udm)
 
     # Derive properties and duration for each unit.
     for uid in sorted(sra_units.list('uid')):
 
-        # Skip session if its pilots have been already stored.
-        if uid in stored_uids:
-            sys.stdout.write('\n%s already stored in %s' %
-                             (uid, csvs['unit']))
-            continue
-
         # Properties.
         sys.stdout.write('\n' + uid + ':\n')
         us['uid'].append(uid)
@@ -421,67 +532,46 @@ def load_units(sid, exp, sra_units, udm, pilots, sra, pu_rels, uts):
         us['experiment'].append(exp)
 
         # Get unit entity from RA session
-        uentity = sra_units.get(uid=uid)[0]
+        uentity = sra_units.entity(uid)
 
         # Unit Timestamps.
         for state in uts.keys():
             if state not in us.keys():
                 us[state] = []
-            try:
-                us[state].append(uentity.timestamps(state=state)[0])
-            except:
-                if state not in 'CANCELEDFAILED':
-                    print 'WARNING: Failed to get timestampe for state %s' % \
-                        state
-                us[state].append(np.nan)
+            us[state].append(utimes.loc[uid, state])
+            if np.isnan(us[state][-1]) and state not in 'CANCELEDFAILED':
+                print 'WARNING: Failed to get timestampe for state %s' % \
+                    state
 
         # Durations.
         for duration in udm.keys():
             if duration not in us.keys():
                 us[duration] = []
-            try:
-                # TODO: this is a temporary fix for inconsistent state model.
-                # TODO: AM: WHAT INCONSISTENT STATE MODEL?? ;)  Still needed?
-                if duration == 'U_AGENT_EXECUTING':
-                    if 'AGENT_STAGING_OUTPUT_PENDING' in \
-                            uentity.states.keys() and \
-                       'FAILED' in uentity.states.keys():
-                            us[duration].append(np.nan)
-                            continue
-                us[duration].append(uentity.duration(event=udm[duration]))
-                sys.stdout.write(' %s' % duration)
-            except:
+            # TODO: this is a temporary fix for inconsistent state model.
+            # TODO: AM: WHAT INCONSISTENT STATE MODEL?? ;)  Still needed?
+            if duration == 'U_AGENT_EXECUTING':
+                if 'AGENT_STAGING_OUTPUT_PENDING' in \
+                        uentity.states.keys() and \
+                   'FAILED' in uentity.states.keys():
+                        us[duration].append(np.nan)
+                        continue
+            us[duration].append(udurs.loc[uid, duration])
+            if np.isnan(us[duration][-1]):
                 print '\nWARNING: Failed to calculate duration %s' % \
                     duration
-                us[duration].append(np.nan)
+            else:
+                sys.stdout.write(' %s' % duration)
 
         # pilot and host on which the unit has been executed.
-        punit = [key[0] for key in pu_rels.items() if uid in key[1]]
-        if punit:
-            punit = punit[0]
-        else:
-            print '\nDEBUG: pu_rels.items():\n' % pu_rels.items()
+        punit = up_rels.get(uid)
+        if not punit:
             print 'WARNING: empty pilot name for unit %s' % uid
-            punit = None
-        hid = pilots[(pilots['sid'] == sid) &
-                     (pilots['pid'] == punit)]['hid'].tolist()[0]
         us['pid'].append(punit)
-        us['hid'].append(hid)
+        us['hid'].append(hids.get(punit, np.nan))
 
-    # Store unit DF to csv and reload into memory to return the complete
-    # DF for the given sid.
-    if us['pid']:
-        units = pd.DataFrame(us)
-        # FIXME: This is a workaround to load the full DF before saving it. The
-        # DF is then reloaded, loading only the units just wrangled. This
-        # avoids using memory but needs cleanup.
-        store_df(units, etype='unit')
-        stored_units = load_df(etype='unit', sid=sid)
-        print '\nstored in %s.' % csvs['unit']
-
-    # Returns the DF of the stored pilots if no new pilots have been added;
-    # the DF with the old and new pilots otherwise.
-    return stored_units
+    # Returns the DF of the session's units.  They are stored by
+    # write_session().
+    return pd.DataFrame(us)
 
 
 # -----------------------------------------------------------------------------
@@ -492,7 +582,7 @@ def load_session(sid, exp, sra_session, sra_pilots, sra_units,
     # If this session has been already stored get out, nothing to do here.
     # stored_sessions = load_df(etype='session', sid=sid)
     # if sid in stored_sessions.index.tolist():
-    #     sys.stdout.write('%s already stored in %s' % (sid, csvs['session']))
+    #     sys.stdout.write('%s already stored in %s' % (sid, tables['session']))
     #     return False
 
     sys.stdout.write('\n%s --- %s' % (exp, sid))
@@ -545,14 +635,26 @@ def load_session(sid, exp, sra_session, sra_pilots, sra_units,
     for duration in udm.keys():
         s[duration].append(sra_units.duration(event=udm[duration]))
 
-    # Store session.
-    session = pd.DataFrame(s, index=[sid])
-    # FIXME: This is a workaround to load the full DF before saving it.
-    stored_sessions = load_df(etype='session')
-    store_df(session, stored=stored_sessions, etype='session')
-    print '\nstored in %s' % csvs['session']
+    # Returns the DF of the session.  It is stored by write_session().
+    return pd.DataFrame(s, index=[sid])
+
+
+# -----------------------------------------------------------------------------
+def write_session(sid, frames):
+    '''
+    Store the session, pilot and unit DFs of a session.  All rows of the
+    session are replaced in a single transaction: if storing fails, no rows of
+    the session are changed, and no rows are ever duplicated.
+    '''
 
-    return stored_sessions
+    with engine.begin() as conn:
+        for etype in ['session', 'pilot', 'unit']:
+            if has_table(conn, etype):
+                conn.execute(text('DELETE FROM %s WHERE sid = :sid'
+                                  % tables[etype]), sid=sid)
+            store_df(frames[etype], etype=etype, conn=conn)
+
+    print '\n%s stored in %s' % (sid, ', '.join(sorted(tables.values())))
 
 
 # -----------------------------------------------------------------------------
@@ -615,31 +717,28 @@ def get_new_sessions(sids):
     print '\n\nMarking sessions for wrangling: '
     towrangle = {}
 
-    # Load current sessions, pilots, units DFs
-    sessions = load_df(etype='session')
-    pilots = load_df(etype='pilot')
-    units = load_df(etype='unit')
-
     # All sessions are new if we have no stored sessions.
-    if sessions.empty:
+    if not has_table(engine, 'session'):
         return sids
 
-    # Add a session to wrangler when the sesison is not in the sessions DF or
-    # when any of the session's units or pilots are not in the units or pilots
-    # DFs.
+    # Add a session to wrangler when the sesison is not in the sessions table
+    # or when any of the session's units or pilots are not in the units or
+    # pilots tables.  All lookups are index probes on the session ID.
     for sdir, sid in sids.iteritems():
-        nurequest = sessions[sessions.sid == sid].nunit.tolist()
-        nprequest = sessions[sessions.sid == sid].npilot.tolist()
+        requested = engine.execute(text('SELECT nunit, npilot FROM %s '
+                                        'WHERE sid = :sid'
+                                        % tables['session']),
+                                   sid=sid).fetchall()
 
         # Duplicates in sessions need to be addressed manually by the user.
         # TODO: AM: ?
-        if (len(nurequest) > 1) or (len(nprequest) > 1):
+        if len(requested) > 1:
             print 'ERROR: Duplicate entries for sid %s in sessions df' % sid
             sys.exit(1)
 
-        if (sid not in sessions.sid.tolist()) or \
-                (units[units.sid == sid].shape[0] < nurequest[0]) or \
-                (pilots[pilots.sid == sid].shape[0] < nprequest[0]):
+        if not requested or \
+                count_rows('unit',  sid) < requested[0]['nunit'] or \
+                count_rows('pilot', sid) < requested[0]['npilot']:
             print 'Mark session %s for wrangling' % sid
             towrangle[sdir] = sid
 
@@ -648,29 +747,31 @@ def get_new_sessions(sids):
 
 
 # -----------------------------------------------------------------------------
-def wrangle_session(sdir, sid):
+def count_rows(etype, sid):
+
+    if not has_table(engine, etype):
+        return 0
+
+    return engine.execute(text('SELECT COUNT(*) FROM %s WHERE sid = :sid'
+                               % tables[etype]), sid=sid).scalar()
+
+
+# -----------------------------------------------------------------------------
+def wrangle_session(sdir, sid, sra_session=None):
 
     # Get the experiment tag for the current sdir.
     exp = sdir.split('/')[-2:][0]
 
-    # RA objects cannot be serialize: every RA session object need
-    # to be constructed at every run.
-    #
-    # FIXME: AM: Actually, RA sessions can be pickled all right:
-    #
-    #        import radical.analytics as ra
-    #        import pickle
-    #        s1 = ra.Session(src=sdir, stype='radical.pilot')
-    #        p  = pickle.dumps(s1)
-    #        s2 = pickle.loads(p)
-    #        assert(len(s1.get()) == len(s2.get()))
-    #
-    #        If we found cases where this does not work, we can make it work.
-    #
-    sra_session = ra.Session(sdir, 'radical.pilot')
-
-    # Pilot-unit relationship dictionary
+    # In sequential mode, the RA session is loaded by an ra.SessionSet, which
+    # parses the sessions in parallel and caches them.  In parallel mode, each
+    # worker loads its session.
+    if not sra_session:
+        sra_session = ra.Session(sdir, 'radical.pilot', cache=True)
+
+    # Pilot-unit relationship dictionaries: units per pilot, and pilot per
+    # unit.
     pu_rels = sra_session.describe('relations', ['pilot', 'unit'])
+    up_rels = sra_session.describe('parents',   ['pilot', 'unit'])
 
     # Pilots of sra: dervie properties and durations.
     print '\n\n%s -- %s -- Loading pilots:' % (exp, sid)
@@ -681,12 +782,149 @@ def wrangle_session(sdir, sid):
     print '\n\n%s -- %s -- Loading units:' % (exp, sid)
     sra_units = sra_session.filter(etype='unit', inplace=False)
     units = load_units(sid, exp, sra_units, udm, pilots,
-                       sra_session, pu_rels, uts)
+                       sra_session, up_rels, uts)
 
     # Session of sra: derive properties and total durations.
     print '\n\n%s -- %s -- Loading session:\n' % (exp, sid)
-    load_session(sid, exp, sra_session, sra_pilots, sra_units,
-                 sdm, pdm, udm, pilots, units, sts)
+    session = load_session(sid, exp, sra_session, sra_pilots, sra_units,
+                           sdm, pdm, udm, pilots, units, sts)
+
+    return {'session': session,
+            'pilot'  : pilots,
+            'unit'   : units}
+
+
+# -----------------------------------------------------------------------------
+def wrangle_sequential(sids, workers=None):
+    '''
+    Sequential mode: the sessions are parsed in parallel, and are wrangled and
+    stored as they become available.  A session which fails is reported and
+    skipped.  Returns the list of session IDs which have not been stored.
+    '''
+
+    failed   = list()
+    sdirs    = {sid: sdir for sdir, sid in sids.iteritems()}
+    sessions = ra.SessionSet(sdirs, 'radical.pilot', workers=workers)
+
+    for sid, sra_session in sessions:
+        try:
+            write_session(sid, wrangle_session(sdirs[sid], sid, sra_session))
+        except Exception as e:
+            print '\nERROR: cannot wrangle session %s: %s: %s' \
+                  % (sid, e.__class__.__name__, e)
+            failed.append(sid)
+
+    for sid, error in sessions.errors.iteritems():
+        print 'ERROR: cannot load session %s: %s' % (sid, error)
+        failed.append(sid)
+
+    return failed
+
+
+# -----------------------------------------------------------------------------
+def wrangle_parallel(sids, jobs):
+    '''
+    Parallel mode: workers wrangle one session each, and send the resulting
+    DFs over a queue to the writer process, which owns the database.  The
+    queue is inherited by the forked processes.  Returns the list of session
+    IDs which have not been stored.
+    '''
+
+    global queue
+
+    queue          = mp.Queue()
+    report, notify = mp.Pipe(duplex=False)
+    proc           = mp.Process(target=writer, args=(notify,))
+    proc.start()
+
+    failed  = list()
+    workers = mp.Pool(jobs)
+    results = {sid: workers.apply_async(wrangle_worker, (sdir, sid))
+               for sdir, sid in sids.iteritems()}
+
+    for sid in sorted(results.keys()):
+        try:
+            error = results[sid].get()
+        except Exception as e:
+            error = '%s: %s' % (e.__class__.__name__, e)
+        if error:
+            print '\nERROR: cannot wrangle session %s: %s' % (sid, error)
+            failed.append(sid)
+
+    # workers flush their queued DFs when they exit, which would block if the
+    # writer is gone.
+    workers.close()
+    if proc.is_alive():
+        workers.join()
+    else:
+        workers.terminate()
+
+    queue.put(None)
+    proc.join()
+
+    if report.poll():
+        failed += report.recv()
+
+    elif proc.exitcode != 0:
+        # the writer died: we cannot tell which sessions have been stored.
+        print '\nERROR: writer process failed (exit code %s)' % proc.exitcode
+        failed += [sid for sid in sids.values() if sid not in failed]
+
+    return failed
+
+
+# -----------------------------------------------------------------------------
+def wrangle_worker(sdir, sid):
+    '''
+    Worker process in parallel mode: wrangle a session and send the resulting
+    DFs to the writer process.  Workers never write to the database.  Returns
+    an error message if the session cannot be wrangled, and `None` otherwise.
+    '''
+
+    try:
+        frames = wrangle_session(sdir, sid)
+
+    except Exception as e:
+        return '%s: %s' % (e.__class__.__name__, e)
+
+    queue.put([sid, frames])
+
+
+# -----------------------------------------------------------------------------
+def writer(notify):
+    '''
+    Writer process in parallel mode: the only process which writes to the
+    database.  Stores the DFs of each session as they arrive from the workers,
+    until it receives `None`.  A session which cannot be stored is reported,
+    and the queue is drained nonetheless, so that the workers never block on
+    it.  The IDs of those sessions are sent to the parent over `notify`, and
+    the writer exits with a non-zero exit code.
+    '''
+
+    # do not reuse database connections inherited from the parent process.
+    engine.dispose()
+
+    failed = list()
+
+    while True:
+
+        item = queue.get()
+        if item is None:
+            break
+
+        sid, frames = item
+        try:
+            write_session(sid, frames)
+        except Exception as e:
+            print '\nERROR: cannot store session %s: %s: %s' \
+                  % (sid, e.__class__.__name__, e)
+            failed.append(sid)
+
+    notify.send(failed)
+    notify.close()
+
+    if failed:
+        sys.exit(1)
 
 
 # =============================================================================
@@ -700,156 +938,28 @@ if __name__ == '__main__':
     ddir = clopts['ddir']  # e.g., '../data/'
     etag = clopts['etag']  # e.g., 'exp'
 
-    # File names where to save the DF of each entity of each session.
-    csvs = {'session': '%s/sessions.csv' % clopts['odir'],
-            'pilot'  : '%s/pilots.csv'   % clopts['odir'],
-            'unit'   : '%s/units.csv'    % clopts['odir']}
-
-    # FIXME: Define timestamps of the events of the pilot's states.
-    sts = {rp.NEW     : None,
-           rp.DONE    : None,
-           rp.CANCELED: None,
-           rp.FAILED  : None}
-
-    # FIXME: Define session durations.
-    sdm = {'TTC': None}
-
-    # Define timestamps of the events of the pilot's states.
-    pts = {rp.NEW                   : None,
-           rp.PMGR_LAUNCHING_PENDING: None,
-           rp.PMGR_LAUNCHING        : None,
-           rp.PMGR_ACTIVE_PENDING   : None,
-           rp.PMGR_ACTIVE           : None,
-           rp.DONE                  : None,
-           rp.CANCELED              : None,
-           rp.FAILED                : None}
-
-    # Define pilot durations.
-    pdm = {'P_PMGR_SCHEDULING': [{ru.EVENT: 'state',             ru.STATE: rp.NEW                   },
-                                 {ru.EVENT: 'state',             ru.STATE: rp.PMGR_LAUNCHING_PENDING}],
-           'P_PMGR_QUEUING'   : [{ru.EVENT: 'state',             ru.STATE: rp.PMGR_LAUNCHING_PENDING},
-                                 {ru.EVENT: 'state',             ru.STATE: rp.PMGR_LAUNCHING        }],
-           'P_LRMS_SUBMITTING': [{ru.EVENT: 'state',             ru.STATE: rp.PMGR_LAUNCHING        },
-                                 {ru.EVENT: 'state',             ru.STATE: rp.PMGR_ACTIVE_PENDING   }],
-           'P_LRMS_QUEUING'   : [{ru.EVENT: 'state',             ru.STATE: rp.PMGR_ACTIVE_PENDING   },
-                                 {ru.EVENT: 'state',             ru.STATE: rp.PMGR_ACTIVE           }],
-           'P_LRMS_RUNNING'   : [{ru.EVENT: 'state',             ru.STATE: rp.PMGR_ACTIVE           },
-                                [{ru.EVENT: 'state',             ru.STATE: rp.DONE                  },
-                                 {ru.EVENT: 'state',             ru.STATE: rp.FAILED                },
-                                 {ru.EVENT: 'state',             ru.STATE: rp.CANCELED              }]],
-
-           # from utilization script
-           'util_p_total'     : [{ru.EVENT: 'bootstrap_1_start', ru.STATE: None                     },
-                                 {ru.EVENT: 'bootstrap_1_stop',  ru.STATE: None                     }],
-
-           'util_p_boot'      : [{ru.EVENT: 'bootstrap_1_start', ru.STATE: None                     },
-                                 {ru.EVENT: 'sync_rel',          ru.STATE: None                     }],
-           'util_p_setup_1'   : [{ru.EVENT: 'sync_rel',          ru.STATE: None                     },
-                                 {ru.EVENT: 'orte_dvm_start',    ru.STATE: None                     }],
-           'util_p_orte'      : [{ru.EVENT: 'orte_dvm_start',    ru.STATE: None                     },
-                                 {ru.EVENT: 'orte_dvm_ok',       ru.STATE: None                     }],
-           'util_p_setup_2'   : [{ru.EVENT: 'orte_dvm_ok',       ru.STATE: None                     },
-                                 {ru.EVENT: 'state',             ru.STATE: rp.PMGR_ACTIVE           }],
-           'util_p_uexec'     : [{ru.EVENT: 'state',             ru.STATE: rp.PMGR_ACTIVE           },
-                                 {ru.EVENT: 'cmd',               ru.STATE: None                     }],
-           'util_p_term'      : [{ru.EVENT: 'cmd',               ru.STATE: None                     },
-                                 {ru.EVENT: 'bootstrap_1_stop',  ru.STATE: None                     }],
-          }
-
-    # Define timestamps of the events of the pilot's states.
-    uts = {rp.NEW                         : None,
-           rp.UMGR_SCHEDULING_PENDING     : None,
-           rp.UMGR_SCHEDULING             : None,
-           rp.UMGR_STAGING_INPUT_PENDING  : None,
-           rp.UMGR_STAGING_INPUT          : None,
-           rp.AGENT_STAGING_INPUT_PENDING : None,
-           rp.AGENT_STAGING_INPUT         : None,
-           rp.AGENT_SCHEDULING_PENDING    : None,
-           rp.AGENT_SCHEDULING            : None,
-           rp.AGENT_EXECUTING_PENDING     : None,
-           rp.AGENT_EXECUTING             : None,
-           rp.AGENT_STAGING_OUTPUT_PENDING: None,
-           rp.AGENT_STAGING_OUTPUT        : None,
-           rp.UMGR_STAGING_OUTPUT_PENDING : None,
-           rp.UMGR_STAGING_OUTPUT         : None,
-           rp.DONE                        : None,
-           rp.CANCELED                    : None,
-           rp.FAILED                      : None}
-
-    # Define unit durations.
-    udm = {'U_UMGR_SCHEDULING'      : [{ru.EVENT: 'state',                  ru.STATE: rp.NEW                         },
-                                       {ru.EVENT: 'state',                  ru.STATE: rp.UMGR_SCHEDULING_PENDING     }],
-           'U_UMGR_BINDING'         : [{ru.EVENT: 'state',                  ru.STATE: rp.UMGR_SCHEDULING_PENDING     },
-                                       {ru.EVENT: 'state',                  ru.STATE: rp.UMGR_SCHEDULING             }],
-         # 'I_UMGR_SCHEDULING'      : [{ru.EVENT: 'state',                  ru.STATE: rp.UMGR_SCHEDULING             },
-         #                             {ru.EVENT: 'state',                  ru.STATE: rp.UMGR_STAGING_INPUT_PENDING  }],
-         # 'I_UMGR_QUEING'          : [{ru.EVENT: 'state',                  ru.STATE: rp.UMGR_STAGING_INPUT_PENDING  },
-         #                             {ru.EVENT: 'state',                  ru.STATE: rp.UMGR_STAGING_INPUT          }],
-         # 'I_AGENT_SCHEDULING'     : [{ru.EVENT: 'state',                  ru.STATE: rp.UMGR_STAGING_INPUT          },
-         #                             {ru.EVENT: 'state',                  ru.STATE: rp.AGENT_STAGING_INPUT_PENDING }],
-         # 'I_AGENT_QUEUING'        : [{ru.EVENT: 'state',                  ru.STATE: rp.AGENT_STAGING_INPUT_PENDING },
-         #                             {ru.EVENT: 'state',                  ru.STATE: rp.AGENT_STAGING_INPUT         }],
-         # 'I_AGENT_TRANSFERRING'   : [{ru.EVENT: 'state',                  ru.STATE: rp.AGENT_STAGING_INPUT         },
-         #                             {ru.EVENT: 'state',                  ru.STATE: rp.AGENT_SCHEDULING_PENDING    }],
-           'U_AGENT_QUEUING'        : [{ru.EVENT: 'state',                  ru.STATE: rp.AGENT_SCHEDULING_PENDING    },
-                                       {ru.EVENT: 'state',                  ru.STATE: rp.AGENT_SCHEDULING            }],
-           'U_AGENT_SCHEDULING'     : [{ru.EVENT: 'state',                  ru.STATE: rp.AGENT_SCHEDULING            },
-                                       {ru.EVENT: 'state',                  ru.STATE: rp.AGENT_EXECUTING_PENDING     }],
-           'U_AGENT_QUEUING_EXEC'   : [{ru.EVENT: 'state',                  ru.STATE: rp.AGENT_EXECUTING_PENDING     },
-                                       {ru.EVENT: 'state',                  ru.STATE: rp.AGENT_EXECUTING             }],
-           'U_AGENT_EXECUTING'      : [{ru.EVENT: 'state',                  ru.STATE: rp.AGENT_EXECUTING             },
-                                       {ru.EVENT: 'state',                  ru.STATE: rp.AGENT_STAGING_OUTPUT_PENDING}],
-         # 'O_AGENT_QUEUING'        : [{ru.EVENT: 'state',                  ru.STATE: rp.AGENT_STAGING_OUTPUT_PENDING},
-         #                             {ru.EVENT: 'state',                  ru.STATE: rp.AGENT_STAGING_OUTPUT        }],
-         # 'O_UMGR_SCHEDULING'      : [{ru.EVENT: 'state',                  ru.STATE: rp.AGENT_STAGING_OUTPUT        },
-         #                             {ru.EVENT: 'state',                  ru.STATE: rp.UMGR_STAGING_OUTPUT_PENDING }],
-         # 'O_UMGR_QUEUING'         : [{ru.EVENT: 'state',                  ru.STATE: rp.UMGR_STAGING_OUTPUT_PENDING },
-         #                             {ru.EVENT: 'state',                  ru.STATE: rp.UMGR_STAGING_OUTPUT         }],
-         # 'O_UMGR_TRANSFERRING'    : [{ru.EVENT: 'state',                  ru.STATE: rp.UMGR_STAGING_OUTPUT         },
-         #                            [{ru.EVENT: 'state',                  ru.STATE: rp.DONE                        },
-         #                             {ru.EVENT: 'state',                  ru.STATE: rp.FAILED                      },
-         #                             {ru.EVENT: 'state',                  ru.STATE: rp.CANCELED                    }]],
-
-           # from utilization script
-            'util_u_total'          : [{ru.EVENT: 'schedule_ok',            ru.STATE: None                           },
-                                       {ru.EVENT: 'unschedule_stop',        ru.STATE: None                           }],
-
-            'util_u_equeue'         : [{ru.EVENT: 'schedule_ok',            ru.STATE: None                           },
-                                       {ru.EVENT: 'state',                  ru.STATE: rp.AGENT_EXECUTING             }],
-            'util_u_eprep'          : [{ru.EVENT: 'state',                  ru.STATE: rp.AGENT_EXECUTING             },
-                                       {ru.EVENT: 'exec_start',             ru.STATE: None                           }],
-            'util_u_exec_rp'        : [{ru.EVENT: 'exec_start',             ru.STATE: None                           },
-                                       {ru.EVENT: 'cu_start',               ru.STATE: None                           }],
-            'util_u_exec_cu'        : [{ru.EVENT: 'cu_start',               ru.STATE: None                           },
-                                       {ru.EVENT: 'cu_exec_start',          ru.STATE: None                           }],
-            'util_u_exec_orte'      : [{ru.EVENT: 'cu_exec_start',          ru.STATE: None                           },
-                                       {ru.EVENT: 'app_start',              ru.STATE: None                           }],
-            'util_u_exec_app'       : [{ru.EVENT: 'app_start',              ru.STATE: None                           },
-                                       {ru.EVENT: 'app_stop',               ru.STATE: None                           }],
-            'util_u_unschedule'     : [{ru.EVENT: 'app_stop',               ru.STATE: None                           },
-                                       {ru.EVENT: 'unschedule_stop',        ru.STATE: None                           }],
-          }
-
+    # Database where to save the DF of each entity of each session.
+    engine = create_db('%s/wrangler.db' % clopts['odir'])
 
     # Find out what sessions need to be wrangled.
     rawsids = get_raw_sessions(ddir, etag, clopts)
     sids = get_new_sessions(rawsids)
 
-    procs = []
+    failed = list()
 
-    num_workers = psutil.cpu_count(logical=False)
-    workers = mp.Pool(num_workers)
+    if not sids:
+        print 'No new sessions to wrangle found.'
 
-    # Wrangle the new sessions.
-    if sids:
-        for sdir,sid in sids.iteritems():
-            wrangle_session(sdir, sid)
-        #     workers.apply_async(wrangle_session, (sdir, sid,))
-        # workers.close()
-        # workers.join()
+    elif clopts['jobs'] > 1:
+        failed = wrangle_parallel(sids, clopts['jobs'])
 
     else:
-        print 'No new sessions to wrangle found.'
+        failed = wrangle_sequential(sids, psutil.cpu_count(logical=False))
 
-# ------------------------------------------------------------------------------
+    # An incomplete database is an error.
+    if failed:
+        print '\nERROR: %d sessions not stored: %s' \
+              % (len(failed), ', '.join(sorted(failed)))
+        sys.exit(1)
 
+# ------------------------------------------------------------------------------
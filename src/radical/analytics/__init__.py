@@ -5,8 +5,13 @@ __license__   = "MIT"
 
 # ------------------------------------------------------------------------------
 
-from .session import Session
-from .plotter import Plotter
+from .session     import Session
+from .session_set import SessionSet
+from .store       import EventStore
+from .ranges      import RangeSet
+from .series      import TimeSeries
+from .matcher     import EventMatcher, RangeMatcher, TableMatcher
+from .plotter     import Plotter
 
 
 # ------------------------------------------------------------------------------
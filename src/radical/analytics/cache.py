@@ -0,0 +1,195 @@
+
+import os
+import mmap
+import struct
+import cPickle as pickle
+
+import numpy as np
+
+import radical.utils as ru
+
+from .store import EventStore
+
+
+# ------------------------------------------------------------------------------
+#
+# A session cache is a single binary file which holds the parsed session
+# profile (as columns of an `EventStore`) and the session description (which
+# includes the time accuracy and hostmap).  The layout is:
+#
+#   - MAGIC        : 8 bytes
+#   - header size  : uint64, little endian
+#   - header       : pickled dict with cache key, description, symbol tables,
+#                    and the list of stored arrays
+#   - arrays       : raw array data, each array aligned to ALIGN bytes
+#
+# The cache key captures the names, sizes and mtimes of all source files, the
+# session type and ID, and the radical.analytics version.  A cache is only used
+# if its key matches the key of the session source.
+#
+MAGIC         = 'RA.CACHE'
+CACHE_VERSION = 1
+ALIGN         = 64
+SUFFIX        = '.ra.cache'
+
+
+# ------------------------------------------------------------------------------
+#
+def get_path(src, sid):
+    '''
+    return the default cache location for a session: a file named after the
+    session ID, next to the session directory (or profile).
+    '''
+
+    src = os.path.abspath(src)
+    if os.path.isdir(src):
+        return '%s/%s%s' % (os.path.dirname(src), sid, SUFFIX)
+    else:
+        return '%s/%s%s' % (os.path.dirname(src), os.path.basename(src), SUFFIX)
+
+
+# ------------------------------------------------------------------------------
+#
+def get_key(src, stype, sid):
+    '''
+    derive the cache key for a session source
+    '''
+
+    import radical.analytics as ra
+
+    files = list()
+    if os.path.isdir(src):
+        for root, _, fnames in os.walk(src):
+            for fname in fnames:
+                if fname.endswith(SUFFIX):
+                    continue
+                path = os.path.join(root, fname)
+                st   = os.stat(path)
+                files.append([os.path.relpath(path, src),
+                              st.st_size, st.st_mtime])
+    else:
+        st = os.stat(src)
+        files.append([os.path.basename(src), st.st_size, st.st_mtime])
+
+    return {'cache'   : CACHE_VERSION,
+            'version' : ra.version_detail,
+            'stype'   : stype,
+            'sid'     : sid,
+            'files'   : sorted(files)}
+
+
+# ------------------------------------------------------------------------------
+#
+def save(path, key, store, description):
+    '''
+    write the given event store and session description into a cache file at
+    `path`.  The file is written to a temporary location first, and then moved
+    into place.
+    '''
+
+    arrays = [['time', store.time]]
+    for k in EventStore.CODED:
+        arrays.append([k, store.column(k)])
+    arrays.append(['bounds', store.bounds])
+
+    offset = 0
+    layout = list()
+    for name, arr in arrays:
+        layout.append([name, arr.dtype.str, offset, len(arr)])
+        offset += _align(arr.nbytes)
+
+    header = pickle.dumps({'key'        : key,
+                           'description': description,
+                           'symbols'    : {k: store.symbols(k)
+                                           for k in EventStore.CODED},
+                           'arrays'     : layout},
+                          protocol=pickle.HIGHEST_PROTOCOL)
+
+    start = _align(len(MAGIC) + 8 + len(header))
+    tmp   = '%s.%d.tmp' % (path, os.getpid())
+
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(MAGIC)
+            f.write(struct.pack('<Q', len(header)))
+            f.write(header)
+            for (name, arr), (_, _, off, _) in zip(arrays, layout):
+                f.seek(start + off)
+                f.write(np.ascontiguousarray(arr).tostring())
+            f.truncate(start + offset)
+        os.rename(tmp, path)
+
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+
+
+# ------------------------------------------------------------------------------
+#
+def load(path, key, mapped=False):
+    '''
+    load a cache file, and return a tuple of `[store, description]`.  If the
+    cache does not exist, is unreadable, or does not match the given key,
+    `None` is returned.
+
+    If `mapped` is set, the store columns are not read into memory, but are
+    read-only views onto a memory map of the cache file: the OS then only
+    pages in those parts of the file which are actually accessed, and can
+    evict them again under memory pressure.
+    '''
+
+    if not os.path.isfile(path):
+        return None
+
+    try:
+        with open(path, 'rb') as f:
+
+            if f.read(len(MAGIC)) != MAGIC:
+                return None
+
+            size   = struct.unpack('<Q', f.read(8))[0]
+            header = pickle.loads(f.read(size))
+
+            if header['key'] != key:
+                return None
+
+            start  = _align(len(MAGIC) + 8 + size)
+            arrays = dict()
+
+            if mapped:
+                # the arrays keep a reference to the map, which stays valid
+                # after the file is closed
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                for name, dtype, offset, count in header['arrays']:
+                    arrays[name] = np.frombuffer(mm, dtype=np.dtype(dtype),
+                                                 count=count,
+                                                 offset=start + offset)
+            else:
+                for name, dtype, offset, count in header['arrays']:
+                    f.seek(start + offset)
+                    arrays[name] = np.fromfile(f, dtype=np.dtype(dtype),
+                                               count=count)
+
+    except Exception as e:
+        ru.get_logger('radical.analytics').warn('cannot read cache %s: %s'
+                                                % (path, e))
+        return None
+
+    cols = {ru.TIME: arrays['time']}
+    for k in EventStore.CODED:
+        cols[k] = arrays[k]
+
+    store = EventStore.from_columns(cols, header['symbols'], arrays['bounds'])
+
+    return store, header['description']
+
+
+# ------------------------------------------------------------------------------
+#
+def _align(size):
+
+    return (size + ALIGN - 1) // ALIGN * ALIGN
+
+
+# ------------------------------------------------------------------------------
+
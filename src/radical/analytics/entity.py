@@ -3,14 +3,26 @@ import os
 import sys
 import pprint
 
+import numpy         as np
 import radical.utils as ru
 
+from .matcher import get_event_matcher, get_range_matcher, walk_ranges
+from .ranges  import RangeSet
+
 
 # ------------------------------------------------------------------------------
 #
 class Entity(object):
 
-    def __init__(self, _uid, _etype, _profile, _details):
+    # sessions can hold many thousands of entities, so we keep them compact:
+    # no instance dict, states are kept as positions in the event list, and
+    # the state dict and consistency information are only allocated when they
+    # are used.
+    __slots__ = ['_uid', '_etype', '_details', '_description', '_cfg',
+                 '_states', '_state_dict', '_events', '_consistency',
+                 '_t_start', '_t_stop', '_store', '_slice']
+
+    def __init__(self, _uid, _etype, _profile, _details, _store=None):
         """
         This is a private constructor for an RA Entity: it gets a series of
         events and sorts it into its properties.  We have 4 properties:
@@ -22,6 +34,12 @@ class Entity(object):
           - states: a set of timed state transitions which are assumed to adhere
                     to a well defined state model
           - events: a time series of named, but otherwise unspecified events
+
+        If an `ra.EventStore` is passed as `_store`, then `_profile` is expected
+        to be a `slice` which selects the entity's events from that store.  The
+        events are then not copied into the entity, but remain in the columnar
+        store.  Otherwise, a time sorted event list is used as is, and not
+        copied.
         """
 
         assert(_uid)
@@ -31,29 +49,39 @@ class Entity(object):
         self._etype       = _etype
         self._details     = _details
         self._description = self._details.get('description', dict())
-        self._cfg         = self._details.get('cfg',         dict())
 
         # FIXME: this should be sorted out on RP level
+        self._cfg         = self._details.get('cfg') or dict()
         self._cfg['hostid'] = self._details['hostid']
 
-        self._states      = dict()
-        self._events      = list()
-        self._consistency = { 'log'         : list(), 
-                              'state_model' : None, 
-                              'event_model' : None, 
-                              'timestamps'  : None}
+        self._states      = ()
+        self._state_dict  = None
+        self._events      = None
+        self._consistency = None
+        self._slice       = None
 
         self._t_start     = None
         self._t_stop      = None
-        self._ttc         = None
 
-        self._initialize(_profile)
+        self._store       = _store
 
-      # print '%s events     : %20d kB' % (self._uid, ru.get_size(e0._events)/ (1024))
-      # print '%s states     : %20d kB' % (self._uid, ru.get_size(e0._states)/ (1024))
-      # print '%s consistency: %20d kB' % (self._uid, ru.get_size(e0._consistency)/ (1024))
-      # print '%s #events    : %20d   ' % (self._uid, ru.get_size(len(e0._events)))
-      # print
+        if self._store is None:
+            self._initialize(_profile)
+        else:
+            self._initialize_store(_profile)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def __getstate__(self):
+
+        return [getattr(self, key) for key in self.__slots__]
+
+
+    def __setstate__(self, state):
+
+        for key, val in zip(self.__slots__, state):
+            setattr(self, key, val)
 
 
     # --------------------------------------------------------------------------
@@ -68,7 +96,9 @@ class Entity(object):
 
     @property
     def ttc(self):
-        return self._ttc
+        if self._t_start is None:
+            return None
+        return self._t_stop - self._t_start
 
     @property
     def t_range(self):
@@ -84,7 +114,15 @@ class Entity(object):
 
     @property
     def states(self):
-        return self._states
+        if self._state_dict is None:
+            if self._store is not None:
+                self._state_dict = self._store.states(self._slice)
+            else:
+                # a later transition into the same state overwrites an
+                # earlier one
+                self._state_dict = {self._events[idx][ru.STATE]:
+                                    self._events[idx] for idx in self._states}
+        return self._state_dict
 
     @property
     def description(self):
@@ -96,10 +134,27 @@ class Entity(object):
 
     @property
     def events(self):
+        if self._store is not None:
+            return self._store.events(self._slice)
         return self._events
 
     @property
     def consistency(self):
+        return self._get_consistency()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _get_consistency(self):
+        """
+        return the consistency information, allocating it on first use
+        """
+
+        if self._consistency is None:
+            self._consistency = {'log'         : list(),
+                                 'state_model' : None,
+                                 'event_model' : None,
+                                 'timestamps'  : None}
         return self._consistency
 
 
@@ -108,7 +163,7 @@ class Entity(object):
     def __str__(self):
 
         return "ra.Entity [%s]: %s\n    states: %s" \
-                % (self.etype, self.uid, self._states.keys())
+                % (self.etype, self.uid, self.list_states())
 
 
     # --------------------------------------------------------------------------
@@ -124,57 +179,55 @@ class Entity(object):
 
         # only call once
         assert (not self._states)
-        assert (not self._events)
+        assert (self._events is None)
 
-        if profile:
-            self._t_start = sys.float_info.max
-            self._t_stop  = sys.float_info.min
+        # profiles are usually time sorted already, so we only sort if needed
+        for i in xrange(1, len(profile)):
+            if profile[i][ru.TIME] < profile[i - 1][ru.TIME]:
+                profile = sorted(profile, key=lambda (x): (x[ru.TIME]))
+                break
 
-        # we expect each event tuple to have `time` and `event`, and expect
-        # 'advance' events to signify a state transition.
-        for event in sorted(profile, key=lambda (x): (x[ru.TIME])):
-
-            t = event[ru.TIME]
-
-            self._t_start = min(self._t_start, t)
-            self._t_stop  = max(self._t_stop,  t)
+        if not isinstance(profile, list):
+            profile = list(profile)
 
-            if event[ru.EVENT] == 'state':
-                state = event[ru.STATE]
-                self._states[state] = event
-
-            # we also treat state transitions as generic event.
-            # Because, why not?
-            self._events.append(event)
+        # we expect each event tuple to have `time` and `event`, and expect
+        # 'advance' events to signify a state transition.  We also treat state
+        # transitions as generic event.  Because, why not?
+        self._events = profile
+        self._states = tuple(idx for idx, event in enumerate(profile)
+                                 if event[ru.EVENT] == 'state')
 
         if profile:
-            self._ttc = self._t_stop - self._t_start
+            self._t_start = profile[ 0][ru.TIME]
+            self._t_stop  = profile[-1][ru.TIME]
 
         # FIXME: assert state model adherence here
-        # FIXME: sort events by time
 
 
     # --------------------------------------------------------------------------
     #
-    def _ensure_tuplelist(self, events):
+    def _initialize_store(self, rng):
 
-        if not events:
-            return []
+        # events are kept in the store, time sorted per entity, so we only need
+        # to remember where they are.
+        assert (rng.stop > rng.start)
 
-        ret = list()
-        if not isinstance(events, list):
-            events = [events]
+        self._slice   = rng
+        self._t_start = float(self._store.time[rng.start])
+        self._t_stop  = float(self._store.time[rng.stop - 1])
 
-        for e in events:
-            if isinstance(e,dict):
-                et = ru.PROF_KEY_MAX * [None]
-                for k,v in e.iteritems():
-                    et[k] = v
-                ret.append(tuple(et))
-            else:
-                ret.append(e)
 
-        return ret
+    # --------------------------------------------------------------------------
+    #
+    def _event_names(self):
+        '''
+        return the names of all events, in time order
+        '''
+
+        if self._store is not None:
+            return self._store.names(ru.EVENT, self._slice)
+
+        return [e[ru.EVENT] for e in self._events]
 
 
     # --------------------------------------------------------------------------
@@ -184,8 +237,8 @@ class Entity(object):
         return {
                 'uid'    : self._uid,
                 'etype'  : self._etype,
-                'states' : self._states,
-                'events' : self._events
+                'states' : self.states,
+                'events' : self.events
                }
 
 
@@ -200,7 +253,7 @@ class Entity(object):
     #
     def list_states(self):
 
-        return self._states.keys()
+        return self.states.keys()
 
 
     # --------------------------------------------------------------------------
@@ -210,26 +263,28 @@ class Entity(object):
         This method accepts a set of initial and final conditions, interprets
         them as documented in the `ranges()` method (which has the same
         signature), and then returns the difference between the resulting
-        timestamps.
+        timestamps.  Instead of conditions, a list of ranges or an `ra.RangeSet`
+        can be passed as `ranges` parameter, and an empty list of ranges has
+        a duration of zero.
         """
 
-        if not ranges:
+        if ranges is None:
             ranges = self.ranges(state, event, time)
           # print 'get %5d ranges for %s' % (len(ranges), self.uid)
           # pprint.pprint(self.events)
 
+            if not ranges:
+                raise ValueError('no duration defined for given constraints')
+
         else:
             assert(not state)
             assert(not event)
             assert(not time)
 
             # make sure the ranges are collapsed (although they likely are
-            # already...)
+            # already...).  An empty set of ranges has no duration.
           # print 'use %5d ranges for %s' % (len(ranges), self.uid)
-            ranges = ru.collapse_ranges(ranges)
-
-        if not ranges:
-            raise ValueError('no duration defined for given constraints')
+            return RangeSet(ranges).length
 
         return sum(r[1] - r[0] for r in ranges) 
 
@@ -250,10 +305,12 @@ class Entity(object):
         tuples, each defining a pair of start and end time which are used to
         constrain the matching timestamps.
 
+        Instead of event conditions, `event` can also be an `ra.EventMatcher`.
+
         The returned list will be sorted.
         """
 
-        event = self._ensure_tuplelist(event)
+        matcher = get_event_matcher(event)
 
         if not state:
             state = []
@@ -262,38 +319,33 @@ class Entity(object):
         
         ret = []
 
-        for e in event:
+        if not matcher:
+            pass
+
+        elif self._store is not None:
+            mask = matcher.mask(self._store, self._slice)
+            ret.extend(self._store.time[self._slice][mask].tolist())
+
+        else:
             for x in self._events:
-                if self._match_event(e,x):
+                if matcher.match(x):
                     ret.append(x[ru.TIME])
 
+        states = self.states
         for s in state:
-            if s in self._states:
-                ret.append(self._states[s][ru.TIME])
+            if s in states:
+                ret.append(states[s][ru.TIME])
 
         # apply time filters
-        if time:
-            matched = list()
-            for etime in ret:
-                for ttuple in time:
-                    if etime >= ttuple[0] and etime <= etime[1]:
-                        matched.append(etime)
-                        break
-            ret = matched
+        if time and ret:
+            if not isinstance(time, RangeSet) and \
+               not isinstance(time[0], list):
+                time = [time]
+            ret = np.asarray(ret)[RangeSet(time).contains(ret)].tolist()
 
         return sorted(ret)
 
 
-    # --------------------------------------------------------------------------
-    #
-    def _match_event(self, needle, hay):
-        for key in range(ru.PROF_KEY_MAX):
-            if needle[key] is not None:
-                if needle[key] != hay[key]:
-                    return False
-        return True
-
-
     # --------------------------------------------------------------------------
     #
     def ranges(self, state=None, event=None, time=None, 
@@ -345,6 +397,9 @@ class Entity(object):
         Setting 'collapse' to 'True' (default) will prompt the method to
         collapse the resulting set of ranges.
 
+        Instead of `state` and `event` conditions, an `ra.RangeMatcher` can be
+        passed as `event` parameter.
+
         Example:
 
            unit.ranges(state=[rp.NEW, rp.FINAL]))
@@ -356,54 +411,49 @@ class Entity(object):
         #       `self.states`) to also be recorded as events (as events in in
         #       `self.events` with `ru.NAME == 'state'`).
 
-        if not state and not event:
+        matcher = get_range_matcher(state, event)
+
+        if not matcher.valid:
             raise ValueError('duration needs state and/or event arguments')
 
-        if not state: state = [[], []]
-        if not event: event = [[], []]
-
-        s_init  = state[0]
-        s_final = state[1]
-        e_init  = event[0]
-        e_final = event[1]
-
-        if not isinstance(s_init,  list): s_init  = [s_init ]
-        if not isinstance(s_final, list): s_final = [s_final]
-        if not isinstance(e_init,  list): e_init  = [e_init ]
-        if not isinstance(e_final, list): e_final = [e_final]
-
-        conds_init  = list()
-        conds_final = list()
-
-        for s in s_init:
-            et = ru.PROF_KEY_MAX * [None]
-            et[ru.STATE] = s
-            et[ru.EVENT] = 'state'
-            conds_init.append(tuple(et))
-
-        for s in s_final:
-            et = ru.PROF_KEY_MAX * [None]
-            et[ru.STATE] = s
-            et[ru.EVENT] = 'state'
-            conds_final.append(tuple(et))
-
-        for e in e_init:
-            if isinstance(e,dict):
-                et = ru.PROF_KEY_MAX * [None]
-                for k,v in e.iteritems():
-                    et[k] = v
-                conds_init.append(tuple(et))
-            else:
-                conds_init.append(e)
-
-        for e in e_final:
-            if isinstance(e,dict):
-                et = ru.PROF_KEY_MAX * [None]
-                for k,v in e.iteritems():
-                    et[k] = v
-                conds_final.append(tuple(et))
-            else:
-                conds_final.append(e)
+        if self._store is not None:
+            ranges = self._store_ranges(matcher, expand)
+        else:
+            ranges = self._profile_ranges(matcher, expand)
+
+        # apply time filter, if specified
+        # For all ranges, check if they fall completely or partially within any
+        # of the given time filters.  If not, drop that range, if yes, include
+        # the overlapping part.
+        #
+        if not time or not len(time) or not ranges:
+            ret = ranges
+
+        else:
+            if not isinstance(time, RangeSet) and \
+               not isinstance(time[0], list):
+                time = [time]
+
+            # clip all ranges against all time filters at once, and only keep
+            # the non-empty overlaps
+            ranges = np.asarray(ranges,         dtype=np.float64)
+            time   = np.asarray(list(time),     dtype=np.float64)
+            starts = np.maximum.outer(ranges[:, 0], time[:, 0]).ravel()
+            stops  = np.minimum.outer(ranges[:, 1], time[:, 1]).ravel()
+            mask   = stops > starts
+            ret    = np.column_stack([starts[mask], stops[mask]]).tolist()
+
+        # ranges are found in time order and do not overlap, so a single range
+        # is already collapsed
+        if collapse and len(ret) > 1:
+            return RangeSet(ret).tolist()
+        else:
+            return ret
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _profile_ranges(self, matcher, expand):
 
         ranges     = list()
         this_range = [None, None]
@@ -412,21 +462,17 @@ class Entity(object):
         for e in self._events:
             if None == this_range[0]:
                 # check for an initial event.
-                for c in conds_init:
-                    if self._match_event(c, e):
-                        this_range[0] = e[ru.TIME]
-                        break
+                if matcher.init.match(e):
+                    this_range[0] = e[ru.TIME]
             else:
                 # check for a final event.  If found and '!expand`, then store
                 # the now completed event away, and start a new one; if
                 # `expand`, then keep searching for a later final event
-                for c in conds_final:
-                    if self._match_event(c, e):
-                        this_range[1] = e[ru.TIME]
-                        if not expand:
-                            ranges.append(this_range)
-                            this_range = [None, None]
-                            break
+                if matcher.final.match(e):
+                    this_range[1] = e[ru.TIME]
+                    if not expand:
+                        ranges.append(this_range)
+                        this_range = [None, None]
 
         # we went through all events.  `this_range` may or may not be a usable
         # range here.  If it is, append it to ranges.
@@ -434,32 +480,39 @@ class Entity(object):
             this_range[1] is not None     :
             ranges.append(this_range)
 
-        # apply time filter, if specified
-        # For all ranges, check if they fall completely or partially within any
-        # of the given time filters.  If not, drop that range, if yes, include
-        # the overlapping part.
-        #
-        if not time or not len(time):
-            ret = ranges
+        return ranges
 
-        else:
-            ret = list()
-            if not isinstance(time[0], list):
-                time = [time]
 
-            # for each range in ret, we make  sure that it does not violate any
-            # time filter
-            for erange in ranges:
-                for trange in time:
-                    new_start = max(trange[0], erange[0])
-                    new_stop  = min(trange[1], erange[1])
-                    if new_stop > new_start:
-                        ret.append([new_start, new_stop])
-
-        if collapse:
-            return ru.collapse_ranges(ret)
+    # --------------------------------------------------------------------------
+    #
+    def _store_ranges(self, matcher, expand):
+
+        # same as `_profile_ranges()`, but we only iterate over those events
+        # which match any initial or final condition
+        store    = self._store
+        is_init  = matcher.init.mask(store,  self._slice)
+        is_final = matcher.final.mask(store, self._slice)
+        idx      = np.flatnonzero(is_init | is_final)
+
+        return walk_ranges(zip(store.time[self._slice][idx].tolist(),
+                               is_init[idx].tolist(),
+                               is_final[idx].tolist()), expand)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _table_ranges(self, matcher, expand=False):
+        '''
+        For an `ra.TableMatcher`, return a list with the (uncollapsed) ranges
+        for each table entry, found in a single pass over the events.
+        '''
+
+        if self._store is not None:
+            hits = matcher.store_hits(self._store, self._slice)
         else:
-            return ret
+            hits = matcher.hits(self._events)
+
+        return [walk_ranges(h, expand) for h in hits]
 
 
 # ------------------------------------------------------------------------------
@@ -0,0 +1,180 @@
+
+import numpy as np
+
+import radical.utils as ru
+
+
+# ------------------------------------------------------------------------------
+#
+class EntityIndex(object):
+
+    PROPERTIES = ['etype', 'state', 'event']
+
+    def __init__(self, entities, store=None):
+        '''
+        This is a private constructor for an RA entity index: it keeps inverted
+        indexes from entity types, state names and event names to the entities
+        which have those properties.  Entities are represented by integer
+        entity IDs (`eid`), which are the positions of the entity uids in the
+        sorted list of all uids.  All index values are sorted arrays of eids,
+        so that queries can be answered by array intersections.
+
+        If an `ra.EventStore` is given, the state and event indexes are derived
+        from the store columns directly.
+        '''
+
+        self._uids  = sorted(entities.keys())
+        self._eids  = {uid: eid for eid, uid in enumerate(self._uids)}
+        self._index = {prop: dict() for prop in self.PROPERTIES}
+
+        etypes = dict()
+        for eid, uid in enumerate(self._uids):
+            etypes.setdefault(entities[uid].etype, list()).append(eid)
+        self._index['etype'] = self._to_arrays(etypes)
+
+        if store is not None:
+            self._initialize_store(store)
+        else:
+            self._initialize_entities(entities)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _initialize_entities(self, entities):
+
+        states = dict()
+        events = dict()
+
+        for eid, uid in enumerate(self._uids):
+            entity = entities[uid]
+            for state in entity.list_states():
+                states.setdefault(state, list()).append(eid)
+            for name in set(entity._event_names()):
+                events.setdefault(name, list()).append(eid)
+
+        self._index['state'] = self._to_arrays(states)
+        self._index['event'] = self._to_arrays(events)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _initialize_store(self, store):
+
+        # map uid codes to eids, and then all store rows to eids
+        uid2eid = np.full(len(store.symbols(ru.UID)), -1, dtype=np.int64)
+        for eid, uid in enumerate(self._uids):
+            code = store.code(ru.UID, uid)
+            if code is not None:
+                uid2eid[code] = eid
+
+        # collect (eid, code) pairs chunk by chunk
+        code   = store.code(ru.EVENT, 'state')
+        events = list()
+        states = list()
+
+        for rng in store.chunks():
+
+            rows  = uid2eid[store.column(ru.UID)[rng]]
+            names = store.column(ru.EVENT)[rng]
+            events.append(self._pairs(rows, names))
+
+            if code is not None:
+                mask = names == code
+                states.append(self._pairs(rows[mask],
+                                          store.column(ru.STATE)[rng][mask]))
+
+        self._index['event'] = self._group(events, store.symbols(ru.EVENT))
+        self._index['state'] = self._group(states, store.symbols(ru.STATE))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _pairs(self, eids, codes):
+        '''
+        for a set of (eid, code) pairs, return a sorted, unique array of keys
+        `code * n_eids + eid`
+        '''
+
+        mask  = eids >= 0
+        eids  = eids[mask]
+        codes = codes[mask].astype(np.int64)
+
+        return np.unique(codes * max(len(self._uids), 1) + eids)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _group(self, pairs, symbols):
+        '''
+        for a list of pair key arrays (see `_pairs()`), return a dict of decoded
+        values to sorted, unique arrays of eids
+        '''
+
+        if not pairs:
+            return dict()
+
+        # sort pairs by code, then by eid, and remove duplicates
+        n_eids = max(len(self._uids), 1)
+        pairs  = np.unique(np.concatenate(pairs))
+        codes  = pairs // n_eids
+        eids   = pairs %  n_eids
+
+        ret    = dict()
+        splits = np.flatnonzero(np.diff(codes)) + 1
+        for chunk_codes, chunk_eids in zip(np.split(codes, splits),
+                                           np.split(eids,  splits)):
+            if len(chunk_codes):
+                ret[symbols[chunk_codes[0]]] = chunk_eids
+
+        return ret
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _to_arrays(self, index):
+
+        return {k: np.array(v, dtype=np.int64) for k, v in index.iteritems()}
+
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def eids(self):
+        '''
+        return the sorted array of all eids in the index
+        '''
+        return np.arange(len(self._uids), dtype=np.int64)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def uids(self, eids):
+        '''
+        translate an array of eids into a list of uids
+        '''
+        return [self._uids[eid] for eid in eids.tolist()]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def lookup(self, prop, values):
+        '''
+        return the sorted array of eids for all entities which have any of the
+        given values for the given property.  For `prop='uid'`, the given uids
+        are translated into eids, unknown uids are ignored.
+        '''
+
+        if prop == 'uid':
+            eids = [self._eids[uid] for uid in values if uid in self._eids]
+            return np.unique(np.array(eids, dtype=np.int64))
+
+        index = self._index[prop]
+        found = [index[v] for v in values if v in index]
+
+        if not found    : return np.zeros(0, dtype=np.int64)
+        if len(found) == 1: return found[0]
+        return np.unique(np.concatenate(found))
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,396 @@
+
+import numpy         as np
+import radical.utils as ru
+
+
+# ------------------------------------------------------------------------------
+#
+class EventMatcher(object):
+
+    def __init__(self, events=None, states=None):
+        '''
+        An EventMatcher is a compiled set of event conditions, as accepted by
+        `Entity.timestamps()`: each condition is an event tuple (or a dict)
+        where only the set fields need to match.  Any given state names are
+        added as conditions on the respective state transition events.
+
+        The conditions are sorted once, by the fields they set:
+
+          - conditions on the event name only are kept in a set of names,
+          - conditions on event name and state are kept in a set of
+            `(name, state)` pairs,
+          - all other conditions are kept as lists of `(field, value)` pairs,
+
+        so that an event can be matched by two hash lookups and, only for the
+        remaining conditions, a check of the set fields.
+
+        The matcher can be passed as `event` parameter to the `timestamps()`
+        methods of `ra.Entity` and `ra.Session`.  The matcher is evaluated
+        without being recompiled for each entity.
+        '''
+
+        self._names  = set()   # conditions on ru.EVENT
+        self._pairs  = set()   # conditions on ru.EVENT and ru.STATE
+        self._fields = list()  # other conditions, as list of (key, val) pairs
+
+        # store codes of the conditions, for the last store we matched against
+        self._store  = None
+        self._codes  = None
+
+        if not events: events = list()
+        if not states: states = list()
+
+        if not isinstance(events, list): events = [events]
+        if not isinstance(states, list): states = [states]
+
+        for s in states:
+            self._add({ru.EVENT: 'state', ru.STATE: s})
+
+        for e in events:
+            if isinstance(e, dict):
+                self._add(e)
+            elif isinstance(e, (tuple, list)):
+                self._add(dict(enumerate(e[:ru.PROF_KEY_MAX])))
+            # anything else never matches any event
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _add(self, cond):
+
+        fields = [[k, v] for k, v in cond.iteritems() if v is not None]
+        keys   = set(k for k, _ in fields)
+
+        try:
+            if keys == set([ru.EVENT]):
+                self._names.add(cond[ru.EVENT])
+                return
+
+            if keys == set([ru.EVENT, ru.STATE]):
+                self._pairs.add((cond[ru.EVENT], cond[ru.STATE]))
+                return
+
+        except TypeError:
+            # unhashable values are compared field by field
+            pass
+
+        self._fields.append(sorted(fields))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def __nonzero__(self):
+
+        return bool(self._names or self._pairs or self._fields)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def match(self, event):
+        '''
+        return `True` if the given event tuple matches any condition
+        '''
+
+        if event[ru.EVENT] in self._names:
+            return True
+
+        if (event[ru.EVENT], event[ru.STATE]) in self._pairs:
+            return True
+
+        for fields in self._fields:
+            for k, v in fields:
+                if event[k] != v:
+                    break
+            else:
+                return True
+
+        return False
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _get_codes(self, store):
+
+        # translate the conditions into the code space of the store.  Values
+        # unknown to the store can never match, and are dropped.
+        if store is self._store:
+            return self._codes
+
+        names = [store.code(ru.EVENT, n) for n in self._names]
+        names = np.array([c for c in names if c is not None], dtype=np.int64)
+
+        n_states = max(len(store.symbols(ru.STATE)), 1)
+        pairs    = list()
+        for n, s in self._pairs:
+            n_code = store.code(ru.EVENT, n)
+            s_code = store.code(ru.STATE, s)
+            if n_code is not None and s_code is not None:
+                pairs.append(n_code * n_states + s_code)
+        pairs = np.array(pairs, dtype=np.int64)
+
+        fields = list()
+        for cond in self._fields:
+            et = ru.PROF_KEY_MAX * [None]
+            for k, v in cond:
+                et[k] = v
+            fields.append(tuple(et))
+
+        self._store = store
+        self._codes = [names, n_states, pairs, fields]
+
+        return self._codes
+
+
+    # --------------------------------------------------------------------------
+    #
+    def mask(self, store, rng):
+        '''
+        Return a boolean mask over the given slice of an `ra.EventStore`,
+        marking all events which match any condition.
+        '''
+
+        names, n_states, pairs, fields = self._get_codes(store)
+
+        ret = np.zeros(rng.stop - rng.start, dtype=bool)
+
+        if len(names) or len(pairs):
+            ecol = store.column(ru.EVENT)[rng]
+
+        if len(names):
+            ret |= np.in1d(ecol, names)
+
+        if len(pairs):
+            scol = store.column(ru.STATE)[rng]
+            ret |= np.in1d(ecol.astype(np.int64) * n_states + scol, pairs)
+
+        for cond in fields:
+            ret |= store.match(cond, rng)
+
+        return ret
+
+
+# ------------------------------------------------------------------------------
+#
+class RangeMatcher(object):
+
+    def __init__(self, state=None, event=None):
+        '''
+        A RangeMatcher is a compiled pair of initial and final conditions, as
+        accepted by `Entity.ranges()`, with the same interpretation of the
+        `state` and `event` parameters.  Initial and final conditions are kept
+        as `ra.EventMatcher` instances.
+
+        The matcher can be passed as `event` parameter (with no `state`
+        parameter) to `ranges()`, `duration()` and `concurrency()` of
+        `ra.Entity` and `ra.Session`, so that duration definitions which are
+        applied to many entities are only compiled once:
+
+            matcher = ra.RangeMatcher(event=[{ru.EVENT: 'exec_start'},
+                                             {ru.EVENT: 'exec_stop' }])
+            for unit in session.get(etype='unit'):
+                print unit.duration(event=matcher)
+        '''
+
+        # an empty condition set is an error when applied, as in the original
+        # `ranges()` call
+        self.valid = bool(state or event)
+
+        if not state: state = [[], []]
+        if not event: event = [[], []]
+
+        self.init  = EventMatcher(events=event[0], states=state[0])
+        self.final = EventMatcher(events=event[1], states=state[1])
+
+
+# ------------------------------------------------------------------------------
+#
+def get_range_matcher(state=None, event=None):
+    '''
+    return a `RangeMatcher` for the given conditions, or the given matcher if
+    `event` already is one.
+    '''
+
+    if isinstance(event, RangeMatcher):
+        assert (not state)
+        return event
+
+    return RangeMatcher(state=state, event=event)
+
+
+# ------------------------------------------------------------------------------
+#
+def get_event_matcher(event=None):
+    '''
+    return an `EventMatcher` for the given event conditions, or the given
+    matcher if `event` already is one.
+    '''
+
+    if isinstance(event, EventMatcher):
+        return event
+
+    return EventMatcher(events=event)
+
+
+# ------------------------------------------------------------------------------
+#
+class TableMatcher(object):
+
+    def __init__(self, table):
+        '''
+        A TableMatcher compiles a table of named range conditions, i.e., a dict
+        which maps names to `event` parameters for `ranges()` (or to
+        `RangeMatcher` instances), such as
+
+            {'exec' : [{ru.EVENT: 'exec_start'}, {ru.EVENT: 'exec_stop'}],
+             'run'  : [{ru.EVENT: 'state', ru.STATE: 'AGENT_EXECUTING'},
+                       {ru.EVENT: 'state', ru.STATE: 'DONE'           }]}
+
+        The conditions of all table entries are merged into one lookup table,
+        so that a single pass over an entity's events finds the initial and
+        final events for all entries.  The entries are ordered by name.
+        '''
+
+        self.names    = sorted(table.keys())
+        self.matchers = [get_range_matcher(event=table[name])
+                         for name in self.names]
+
+        # map event names and (name, state) pairs to the list of
+        # `(entry, is_final)` tuples they are conditions for.  Other conditions
+        # are kept as `[entry, is_final, matcher]`.
+        self._names  = dict()
+        self._pairs  = dict()
+        self._others = list()
+
+        # per store: positions of the matching events of all entries
+        self._store  = None
+        self._hits   = None
+
+        for idx, matcher in enumerate(self.matchers):
+            for final, em in [[False, matcher.init], [True, matcher.final]]:
+                for name in em._names:
+                    self._names.setdefault(name, list()).append((idx, final))
+                for pair in em._pairs:
+                    self._pairs.setdefault(pair, list()).append((idx, final))
+                for fields in em._fields:
+                    other = EventMatcher()
+                    other._fields.append(fields)
+                    self._others.append([idx, final, other])
+
+
+    # --------------------------------------------------------------------------
+    #
+    def hits(self, events):
+        '''
+        For a time sorted list of event tuples, return a list with one entry
+        per table entry, each being the time sorted list of
+
+            [time, is_init, is_final]
+
+        tuples for those events which match any initial or final condition of
+        that entry.
+        '''
+
+        ret = [list() for _ in self.names]
+
+        for e in events:
+
+            found = self._names.get(e[ru.EVENT], []) \
+                  + self._pairs.get((e[ru.EVENT], e[ru.STATE]), [])
+
+            for idx, final, other in self._others:
+                if other.match(e):
+                    found.append((idx, final))
+
+            if not found:
+                continue
+
+            # an event can be an initial and final condition for an entry
+            flags = dict()
+            for idx, final in found:
+                flags.setdefault(idx, [False, False])[final] = True
+
+            for idx, (init, final) in flags.iteritems():
+                ret[idx].append([e[ru.TIME], init, final])
+
+        return ret
+
+
+    # --------------------------------------------------------------------------
+    #
+    def store_hits(self, store, rng):
+        '''
+        Same as `hits()`, but for the events in the given slice of an
+        `ra.EventStore`.  The matching events of all entities are determined
+        once per store, column-wise, and are then looked up per slice.
+        '''
+
+        if store is not self._store:
+
+            self._hits = list()
+
+            for matcher in self.matchers:
+                pos      = list()
+                is_init  = list()
+                is_final = list()
+                for chunk in store.chunks():
+                    init  = matcher.init.mask(store,  chunk)
+                    final = matcher.final.mask(store, chunk)
+                    hits  = np.flatnonzero(init | final)
+                    pos.append(hits + chunk.start)
+                    is_init.append(init[hits])
+                    is_final.append(final[hits])
+
+                if pos:
+                    pos      = np.concatenate(pos)
+                    is_init  = np.concatenate(is_init).tolist()
+                    is_final = np.concatenate(is_final).tolist()
+                else:
+                    pos      = np.zeros(0, dtype=np.int64)
+
+                self._hits.append([pos, store.time[pos].tolist(),
+                                   is_init, is_final])
+            self._store = store
+
+        ret = list()
+        for pos, times, is_init, is_final in self._hits:
+            start, stop = np.searchsorted(pos, [rng.start, rng.stop]).tolist()
+            ret.append(zip(times   [start:stop],
+                           is_init [start:stop],
+                           is_final[start:stop]))
+
+        return ret
+
+
+# ------------------------------------------------------------------------------
+#
+def walk_ranges(hits, expand=False):
+    '''
+    Derive ranges from a time sorted list of `[time, is_init, is_final]`
+    tuples, as described in `Entity.ranges()`: a range starts at the first
+    initial event, and ends at the next final event (or the last final event
+    if `expand` is set).
+    '''
+
+    ranges     = list()
+    this_range = [None, None]
+
+    for t, init, final in hits:
+        if None == this_range[0]:
+            if init:
+                this_range[0] = t
+        else:
+            if final:
+                this_range[1] = t
+                if not expand:
+                    ranges.append(this_range)
+                    this_range = [None, None]
+
+    if  this_range[0] is not None and \
+        this_range[1] is not None     :
+        ranges.append(this_range)
+
+    return ranges
+
+
+# ------------------------------------------------------------------------------
+
@@ -1,4 +1,16 @@
 
+def _to_axes(data):
+    """
+    Split a time series into x and y axis.  The series can be a list of
+    [time, value] pairs, or an ra.TimeSeries.
+    """
+
+    if hasattr(data, 'times'):
+        return data.times, data.values
+
+    return [point[0] for point in data], [point[1] for point in data]
+
+
 class Plotter(object):
 
     def __init__(self,style=None,plot_grid=None):
@@ -25,6 +37,8 @@ class Plotter(object):
         except:
             raise RuntimeError('Plotter class needs matplotlib installed')
 
+        self._plt = plt
+
         
     def utilization(self,util_data=None,normalized=None,resource=None,fig_size=None):
 
@@ -34,27 +48,25 @@ class Plotter(object):
 
         The method is able to normalized the plot based on the owner resources and the
         utilized resources at any given time. In addition, figure's size can be provided as
-        input
+        input.  The utilization of an owner can be given as a list of [time, value]
+        pairs, or as an ra.TimeSeries.
         """
         
         # Initially check if plot_grid is set. If not, create a single plot, else create
         # a figure based on the user's specification.
         if not self._plot_grid:
 
-            self._fig,self._axis = plt.subplots(nrows=1,ncols=1,figsize=fig_size)
+            self._fig,self._axis = self._plt.subplots(nrows=1,ncols=1,figsize=fig_size)
 
             # Iterate over the owners and add a line for every owner.
             for key, util in util_data.iteritems():
 
-                # Getting the time moments where the utilization changes
-                x_axis = [point[0] for point in util['utilization']]
-
-                # Getting the utilization points. If normalized flag is set, utilization is
+                # Getting the time moments where the utilization changes, and the
+                # utilization points. If normalized flag is set, utilization is
                 # divided with the total resources of the owner and multiply with 100
+                x_axis, y_axis = _to_axes(util['utilization'])
                 if normalized:
-                    y_axis = [(point[1]/util['resources'])*100 for point in util['utilization']]
-                else:
-                    y_axis = [point[1] for point in util['utilization']]
+                    y_axis = [(y/float(util['resources']))*100 for y in y_axis]
 
                 # If there is a range where the owner had the resources get it. Otherwise
                 # it is none. The resource range will be use to set the utilization plot
@@ -74,18 +86,15 @@ class Plotter(object):
                 self._axis.legend()
 
         else:
-            self._fig,self._axis = plt.subplots(nrows=self._plot_grid[0],ncols=self._plot_grid[1],figsize=fig_size)
+            self._fig,self._axis = self._plt.subplots(nrows=self._plot_grid[0],ncols=self._plot_grid[1],figsize=fig_size)
             for (key, util),i in zip(util_data.iteritems(),range(self._plot_grid[0]*self._plot_grid[1])):
                 
-                # Getting the time moments where the utilization changes
-                x_axis = [point[0] for point in util['utilization']]
-                
-                # Getting the utilization points. If normalized flag is set, utilization is
+                # Getting the time moments where the utilization changes, and the
+                # utilization points. If normalized flag is set, utilization is
                 # divided with the total resources of the owner and multiply with 100
+                x_axis, y_axis = _to_axes(util['utilization'])
                 if normalized:
-                    y_axis = [(point[1]/util['resources'])*100 for point in util['utilization']]
-                else:
-                    y_axis = [point[1] for point in util['utilization']]
+                    y_axis = [(y/float(util['resources']))*100 for y in y_axis]
                 
                 # If there is a range where the owner had the resources get it. Otherwise
                 # it is none. The resource range will be use to set the utilization plot
@@ -108,18 +117,16 @@ class Plotter(object):
         
         """
         This method receives as input concurrency data and creates a figure.
+        The data can be a list of [time, value] pairs, or an ra.TimeSeries.
 
         The user is able to set the figure size.
         """
 
 
-        self._fig,self._axis = plt.subplots(nrows=1,ncols=1,figsize=fig_size)
-
-        # The x axis is setup.
-        x_axis = [point[0] for point in data]
+        self._fig,self._axis = self._plt.subplots(nrows=1,ncols=1,figsize=fig_size)
 
-        # The y axis is setup.
-        y_axis = [point[1] for point in data]
+        # The x and y axis are setup.
+        x_axis, y_axis = _to_axes(data)
 
         #Just plot
         self._axis.plot(x_axis,y_axis)        
@@ -0,0 +1,268 @@
+import numpy as np
+
+
+# ------------------------------------------------------------------------------
+#
+# Kinds of range edges for `_sweep()`.  At equal times, edges are ordered by
+# kind: the second operand opens before and closes after the first operand,
+# so that ranges which touch at a single point are handled as closed ranges.
+#
+_B_START = 0
+_A_START = 1
+_A_STOP  = 2
+_B_STOP  = 3
+
+
+# ------------------------------------------------------------------------------
+#
+class RangeSet(object):
+
+    def __init__(self, ranges=None):
+        '''
+        A `RangeSet` is a set of times, represented as the minimal list of
+        disjoint, closed `[start, stop]` ranges which cover it.  It is created
+        from any list of `[start, stop]` pairs (or from another `RangeSet`):
+        the ranges are sorted by their start time, and overlapping or touching
+        ranges are collapsed into one range, like `ru.collapse_ranges()` does.
+        Ranges of zero length are kept if they are not covered by other ranges.
+
+        The ranges are stored in two sorted NumPy arrays of start and stop
+        times, and all set operations (`|`, `&`, `-`, `clip()`) are computed by
+        sorting and scanning those arrays, instead of pairwise comparisons of
+        ranges.
+
+        A `RangeSet` is a (read-only) sequence of `[start, stop]` lists, and
+        can thus be used wherever a list of ranges is accepted, for example as
+        `time` filter of `Session.ranges()`, or as `ranges` parameter of
+        `Session.duration()`:
+
+            busy = ra.RangeSet(session.ranges(state=[rp.AGENT_EXECUTING,
+                                                     rp.DONE]))
+            idle = ra.RangeSet([session.t_range]) - busy
+            print idle.length
+        '''
+
+        if isinstance(ranges, RangeSet):
+            self._starts = ranges._starts
+            self._stops  = ranges._stops
+            return
+
+        if ranges is None or not len(ranges):
+            starts = np.zeros(0)
+            stops  = np.zeros(0)
+        else:
+            ranges = np.asarray(ranges, dtype=np.float64).reshape(-1, 2)
+            starts = ranges[:, 0]
+            stops  = ranges[:, 1]
+
+        self._starts, self._stops = self._collapse(starts, stops)
+
+
+    # --------------------------------------------------------------------------
+    #
+    @classmethod
+    def from_arrays(cls, starts, stops):
+        '''
+        Create a `RangeSet` from two arrays of range start and stop times.
+        '''
+
+        ret = cls.__new__(cls)
+        ret._starts, ret._stops = cls._collapse(
+                                      np.asarray(starts, dtype=np.float64),
+                                      np.asarray(stops,  dtype=np.float64))
+        return ret
+
+
+    # --------------------------------------------------------------------------
+    #
+    @staticmethod
+    def _collapse(starts, stops):
+
+        if not len(starts):
+            return np.zeros(0), np.zeros(0)
+
+        # sort by start time.  A range starts a new group of overlapping
+        # ranges if it starts after all previous ranges stopped.
+        order  = np.argsort(starts, kind='mergesort')
+        starts = starts[order]
+        ends   = np.maximum.accumulate(stops[order])
+
+        first  = np.ones(len(starts), dtype=bool)
+        first[1:] = starts[1:] > ends[:-1]
+
+        last   = np.ones(len(starts), dtype=bool)
+        last[:-1] = first[1:]
+
+        return starts[first], ends[last]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _sweep(self, other, keep):
+        '''
+        Sweep over the edges of `self` and `other`, and return the `RangeSet`
+        of all times at which `keep(in_self, in_other)` is true, where both
+        arguments are boolean arrays.
+        '''
+
+        other = RangeSet(other)
+        n_a   = len(self._starts)
+        n_b   = len(other._starts)
+
+        times = np.concatenate([self._starts,  self._stops,
+                                other._starts, other._stops])
+        kinds = np.concatenate([np.full(n_a, _A_START), np.full(n_a, _A_STOP),
+                                np.full(n_b, _B_START), np.full(n_b, _B_STOP)])
+
+        order = np.lexsort((kinds, times))
+        times = times[order]
+        kinds = kinds[order]
+
+        # both operands are disjoint, so their coverage is either 0 or 1
+        in_a  = np.cumsum((kinds == _A_START).astype(np.int8)
+                        - (kinds == _A_STOP ).astype(np.int8)) > 0
+        in_b  = np.cumsum((kinds == _B_START).astype(np.int8)
+                        - (kinds == _B_STOP ).astype(np.int8)) > 0
+
+        inside = np.concatenate([[False], keep(in_a, in_b), [False]])
+        change = np.diff(inside.astype(np.int8))
+
+        return RangeSet.from_arrays(times[np.flatnonzero(change ==  1)],
+                                    times[np.flatnonzero(change == -1)])
+
+
+    # --------------------------------------------------------------------------
+    #
+    def union(self, other):
+        '''
+        Return the times contained in `self` or in `other`.
+        '''
+
+        other = RangeSet(other)
+        return RangeSet.from_arrays(np.concatenate([self._starts, other._starts]),
+                                    np.concatenate([self._stops,  other._stops]))
+
+
+    def intersection(self, other):
+        '''
+        Return the times contained in both `self` and `other`.  Ranges which
+        touch in a single point intersect in a range of zero length.
+        '''
+
+        return self._sweep(other, lambda a, b: a & b)
+
+
+    def difference(self, other):
+        '''
+        Return the times contained in `self` but not in `other`.  As ranges
+        are closed, the resulting ranges include the edges of `other`.
+        '''
+
+        return self._sweep(other, lambda a, b: a & ~b)
+
+
+    def clip(self, t_start, t_stop):
+        '''
+        Return the part of `self` which is within `[t_start, t_stop]`.
+        '''
+
+        if t_stop < t_start:
+            return RangeSet()
+
+        starts = np.maximum(self._starts, t_start)
+        stops  = np.minimum(self._stops,  t_stop)
+        mask   = starts <= stops
+
+        return RangeSet.from_arrays(starts[mask], stops[mask])
+
+
+    __or__  = union
+    __and__ = intersection
+    __sub__ = difference
+
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def starts(self):
+        return self._starts
+
+    @property
+    def stops(self):
+        return self._stops
+
+    @property
+    def lengths(self):
+        return self._stops - self._starts
+
+    @property
+    def length(self):
+        '''
+        The total length of all ranges
+        '''
+        return float(np.sum(self._stops - self._starts))
+
+    @property
+    def t_range(self):
+        if not len(self._starts):
+            return None
+        return [float(self._starts[0]), float(self._stops[-1])]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def contains(self, times):
+        '''
+        For a single time, return `True` if that time is contained in any range,
+        and `False` otherwise.  For a list or array of times, return a boolean
+        array with that information per time.
+        '''
+
+        t   = np.asarray(times, dtype=np.float64)
+        idx = np.searchsorted(self._starts, t, side='right') - 1
+        ret = (idx >= 0) & (t <= self._stops[np.maximum(idx, 0)]
+                            if len(self._stops) else False)
+
+        if np.ndim(times) == 0:
+            return bool(ret)
+        return ret
+
+
+    # --------------------------------------------------------------------------
+    #
+    def tolist(self):
+        '''
+        Return the ranges as list of `[start, stop]` lists.
+        '''
+
+        return [list(r) for r in zip(self._starts.tolist(),
+                                     self._stops.tolist())]
+
+
+    def __len__(self):
+        return len(self._starts)
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __getitem__(self, idx):
+        return [float(self._starts[idx]), float(self._stops[idx])]
+
+    def __eq__(self, other):
+        if isinstance(other, RangeSet):
+            return np.array_equal(self._starts, other._starts) and \
+                   np.array_equal(self._stops,  other._stops)
+        try:
+            return self.tolist() == [list(r) for r in other]
+        except TypeError:
+            return False
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'RangeSet(%s)' % self.tolist()
+
+
+# ------------------------------------------------------------------------------
+
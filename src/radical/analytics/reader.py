@@ -0,0 +1,598 @@
+
+import os
+import csv
+import heapq
+import shutil
+import tarfile
+import tempfile
+import contextlib
+import multiprocessing as mp
+
+import numpy         as np
+import pandas        as pd
+import radical.utils as ru
+
+
+# ------------------------------------------------------------------------------
+#
+# Session sources can be tarballs of a session directory.  Profiles are read
+# from such tarballs without extracting them to disk: the tarball is opened in
+# streaming mode (with auto-detected compression), and the profile members are
+# parsed while the archive is read.  Session types whose parsers need
+# a directory only get the profiles and JSON files extracted (`session_dir()`).
+#
+TARBALL_SUFFIXES = ['.tar.gz', '.tar.bz2', '.tar.bz', '.tgz', '.tbz', '.tar']
+
+# the members of a session tarball which are read by the session parsers
+SESSION_FILES = ('.prof', '.json')
+
+# clock offset differences (in seconds) between profiles of the same host which
+# we tolerate without warning (as in `ru.combine_profiles()`)
+NTP_DIFF_WARN_LIMIT = 1.0
+
+# events which are used to synchronize the clocks of different profiles
+SYNC_EVENTS = ['sync_abs', 'sync_rel']
+
+
+# ------------------------------------------------------------------------------
+#
+def is_tarball(src):
+    '''
+    return `True` if the given source name looks like a tarball
+    '''
+
+    return any(src.endswith(suffix) for suffix in TARBALL_SUFFIXES)
+
+
+# ------------------------------------------------------------------------------
+#
+def strip_suffix(src):
+    '''
+    return the given source name without any tarball suffix
+    '''
+
+    for suffix in TARBALL_SUFFIXES:
+        if src.endswith(suffix):
+            return src[:-len(suffix)]
+
+    return src
+
+
+# ------------------------------------------------------------------------------
+#
+def read_profile(lines, name, sid=None):
+    '''
+    Parse the lines of a single profile into a time sorted list of event rows,
+    in the same way as `ru.read_profiles()` parses profile files: the entity
+    type is derived from the uid, and events without uid are assigned to the
+    session `sid`.  `lines` can be any iterable over profile lines, such as an
+    open file or a tarball member.
+    '''
+
+    legacy = os.environ.get('RADICAL_ANALYTICS_LEGACY_PROFILES', False)
+    legacy = bool(legacy) and legacy.lower() not in ['no', 'false']
+
+    ret  = list()
+    last = None
+
+    for raw in csv.reader(lines):
+
+        row = list(raw)
+
+        # skip empty lines
+        if not row:
+            continue
+
+        # legacy profiles have 6 fields, which are converted to the current
+        # format.  Otherwise, missing trailing fields are read as empty
+        # strings, and rows with more fields than a trailing empty one are
+        # skipped (see `read_frame()`).
+        if legacy and len(row) == 6:
+            comp, tid = (row[1].split(':', 1) + [''])[:2]
+            row = [row[0], row[4], comp, tid, row[2], row[3], row[5]]
+
+        elif len(row) > ru.PROF_KEY_MAX - 1:
+            if len(row) > ru.PROF_KEY_MAX or row[-1]:
+                print 'row invalid [%s]: %s' % (name, raw)
+                continue
+            row = row[:-1]
+
+        # make room in the row for missing fields and the entity type
+        row.extend([''] * (ru.PROF_KEY_MAX - 1 - len(row)))
+        row.append(None)
+
+        # skip headers, i.e., rows without valid timestamp
+        try:
+            row[ru.TIME] = float(row[ru.TIME])
+        except ValueError:
+            continue
+        if row[ru.TIME] != row[ru.TIME]:
+            continue
+
+        # we derive entity type from the uid -- but funnel some cases into
+        # 'session' as a catch-all type
+        if row[ru.UID]:
+            row[ru.ENTITY] = row[ru.UID].split('.', 1)[0]
+        else:
+            row[ru.ENTITY] = 'session'
+            row[ru.UID]    = sid
+
+        # fix rp issue 1117 (see `ru.read_profiles()`)
+        if row[ru.TIME] == 1.0 and last:
+            row[ru.TIME] = last[ru.TIME]
+
+        ret.append(row)
+        last = row
+
+    # profiles are written in time order, but we make sure
+    for i in xrange(1, len(ret)):
+        if ret[i][ru.TIME] < ret[i - 1][ru.TIME]:
+            ret.sort(key=lambda x: x[ru.TIME])
+            break
+
+    return ret
+
+
+# ------------------------------------------------------------------------------
+#
+def _empty_frame():
+
+    return pd.DataFrame(columns=range(ru.PROF_KEY_MAX))
+
+
+# ------------------------------------------------------------------------------
+#
+def read_frame(src, name, sid=None):
+    '''
+    Parse a profile (a file name, or an open file) into a time sorted
+    `pandas.DataFrame` with one column per event field, labeled by the field
+    indices (`ru.TIME`, `ru.EVENT`, ...).  The profile is parsed by the pandas
+    C parser in one go, and no Python objects are created per line.  The
+    fields are derived as in `read_profile()`: missing trailing fields of
+    incomplete lines are read as empty strings, and lines with too many fields
+    (but for one trailing empty field) or without valid timestamp are dropped.
+    '''
+
+    legacy = os.environ.get('RADICAL_ANALYTICS_LEGACY_PROFILES', False)
+    if legacy and legacy.lower() not in ['no', 'false']:
+        # the legacy format is only supported by the line based parser
+        if isinstance(src, basestring):
+            with open(src, 'r') as f:
+                rows = read_profile(f, name, sid)
+        else:
+            rows = read_profile(src, name, sid)
+        return pd.DataFrame(rows, columns=range(ru.PROF_KEY_MAX))
+
+    # all fields but the entity type are in the profile, plus possibly one
+    # trailing empty field.  Missing fields of shorter lines are read as empty
+    # strings, and longer lines are dropped by the parser.  If the first line
+    # is longer, pandas moves its leading fields into the index, and we move
+    # them back.
+    n_fields = ru.PROF_KEY_MAX - 1
+    try:
+        frame = pd.read_csv(src, header=None, names=range(n_fields + 1),
+                            dtype=object, na_filter=False, engine='c',
+                            error_bad_lines=False, warn_bad_lines=False)
+    except pd.errors.EmptyDataError:
+        return _empty_frame()
+
+    if not isinstance(frame.index, pd.RangeIndex):
+        frame = frame.reset_index()
+        frame.columns = range(frame.shape[1])
+
+    # drop lines with too many (non-empty) fields
+    valid = (frame.iloc[:, n_fields:] == '').all(axis=1).values
+    if not valid.all():
+        frame = frame[valid]
+    frame = frame.iloc[:, :n_fields].reset_index(drop=True)
+
+    # skip headers, i.e., lines without valid timestamp
+    time  = pd.to_numeric(frame[ru.TIME], errors='coerce')
+    valid = time.notnull().values
+    if not valid.all():
+        frame = frame[valid].reset_index(drop=True)
+        time  = time[valid].reset_index(drop=True)
+
+    if not len(frame):
+        return _empty_frame()
+
+    # fix rp issue 1117 (see `ru.read_profiles()`): a timestamp of 1.0 is
+    # replaced by the previous timestamp
+    fix     = (time == 1.0).values
+    fix[:1] = False
+    frame[ru.TIME] = time.astype(np.float64).mask(fix).ffill()
+
+    # derive the entity type from the uid, once per uid.  Events without uid
+    # belong to the session.
+    codes, uids = pd.factorize(frame[ru.UID].values)
+    etypes = np.array([uid.split('.', 1)[0] if uid else 'session'
+                       for uid in uids], dtype=object)
+    uids   = np.array([uid or sid for uid in uids], dtype=object)
+    frame[ru.UID]    = uids[codes]
+    frame[ru.ENTITY] = etypes[codes]
+
+    if not frame[ru.TIME].is_monotonic_increasing:
+        frame = frame.iloc[np.argsort(frame[ru.TIME].values, kind='mergesort')]
+        frame = frame.reset_index(drop=True)
+
+    return frame
+
+
+# ------------------------------------------------------------------------------
+#
+def _read_file(args):
+
+    path, sid, columnar = args
+
+    if columnar:
+        return path, read_frame(path, path, sid)
+
+    with open(path, 'r') as f:
+        return path, read_profile(f, path, sid)
+
+
+# ------------------------------------------------------------------------------
+#
+def read_profiles(paths, sid=None, workers=None, columnar=False):
+    '''
+    Read the given profile files, and return a dict of file names to time
+    sorted event rows, like `ru.read_profiles()`, or to data frames (see
+    `read_frame()`) if `columnar` is set.  The files are parsed in a pool of
+    `workers` processes (default: number of cores), unless we run in a worker
+    process ourself (such as in an `ra.SessionSet`).
+    '''
+
+    args = [[path, sid, columnar] for path in paths]
+
+    if not workers:
+        workers = mp.cpu_count()
+    workers = min(workers, len(args))
+
+    if workers < 2 or mp.current_process().daemon:
+        return dict(_read_file(arg) for arg in args)
+
+    pool = mp.Pool(workers)
+    try:
+        return dict(pool.imap_unordered(_read_file, args))
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+# ------------------------------------------------------------------------------
+#
+def _parse_sync(event):
+
+    # a `sync_abs` message has the form `host:ip:t_sys:t_ntp:t_mode`
+    elems = (event[ru.MSG] or '').split(':')
+    if len(elems) != 5:
+        return None
+
+    host, ip, t_sys, t_ntp, t_mode = elems
+    return '%s:%s' % (host, ip), float(t_sys), float(t_ntp), t_mode
+
+
+# ------------------------------------------------------------------------------
+#
+def _decorate(idx, rows):
+
+    # sort key for the merge: ties are broken by profile and position, so
+    # that rows are never compared, and the merge is stable
+    for pos, row in enumerate(rows):
+        yield (row[ru.TIME], idx, pos), row
+
+
+# ------------------------------------------------------------------------------
+#
+def _synchronize(events):
+    '''
+    Determine the clock corrections for a set of profiles, given as dict of
+    profile names to lists of `sync_abs` and `sync_rel` event rows, in the same
+    way as `ru.combine_profiles()` does:
+
+      - a profile without `sync_abs` event is shifted to match the `sync_rel`
+        event with the same message in a profile which has a `sync_abs` event,
+        and then uses that `sync_abs` event,
+      - all timestamps are shifted to be relative to the first `sync_abs`
+        event, and are corrected by the NTP offset of their host,
+      - profiles which cannot be synchronized are dropped.
+
+    Returns a dict of profile names to time shifts (for those profiles which
+    can be synchronized), and the clock accuracy.
+    '''
+
+    names  = sorted(events.keys())
+    syncs  = dict()   # name -> sync_abs event to use
+    shifts = dict()   # name -> sync_rel offset
+    rels   = dict()   # sync_rel message -> [time, sync_abs event]
+
+    for name in names:
+        for event in events[name]:
+            if event[ru.EVENT] == 'sync_abs':
+                syncs[name]  = event
+                shifts[name] = 0.0
+                break
+
+    absolute = [name for name in names if name in syncs]
+
+    for name in absolute:
+        for event in events[name]:
+            if event[ru.EVENT] == 'sync_rel':
+                rels[event[ru.MSG]] = [event[ru.TIME], syncs[name]]
+
+    for name in names:
+        if name in syncs:
+            continue
+        for event in events[name]:
+            if event[ru.EVENT] == 'sync_rel' and event[ru.MSG] in rels:
+                t_rel, sync  = rels[event[ru.MSG]]
+                syncs[name]  = sync
+                shifts[name] = t_rel - event[ru.TIME]
+                break
+        else:
+            print 'no rel sync  %s' % name
+
+    # determine the session start and the clock offset per host
+    t_min    = None
+    t_host   = dict()
+    accuracy = 0.0
+
+    for name in absolute:
+
+        for event in events[name]:
+
+            if event[ru.EVENT] != 'sync_abs':
+                continue
+
+            sync = _parse_sync(event)
+            if not sync:
+                continue
+
+            if t_min is None: t_min = event[ru.TIME]
+            else            : t_min = min(t_min, event[ru.TIME])
+
+            host_id, t_sys, t_ntp, t_mode = sync
+            if t_mode == 'sys':
+                continue
+
+            t_off = t_sys - t_ntp
+            if host_id in t_host and t_host[host_id] != t_off:
+                diff     = t_off - t_host[host_id]
+                accuracy = max(accuracy, diff)
+                if diff > NTP_DIFF_WARN_LIMIT:
+                    print 'conflicting time sync for %-45s (%15s): ' \
+                          % (name.split('/')[-1], host_id) \
+                        + '%10.2f - %10.2f = %5.2f' \
+                          % (t_off, t_host[host_id], diff)
+                    continue
+
+            t_host[host_id] = t_off
+
+    if t_min is None:
+        t_min = 0.0
+
+    # the total time shift for each profile which can be synchronized
+    ret = dict()
+    for name in syncs:
+        sync      = _parse_sync(syncs[name])
+        t_off     = t_host.get(sync[0], 0.0) if sync else 0.0
+        ret[name] = shifts[name] - t_min - t_off
+
+    return ret, accuracy
+
+
+# ------------------------------------------------------------------------------
+#
+def combine_profiles(profiles):
+    '''
+    Combine a dict of profile names to time sorted event rows (as returned by
+    `read_profiles()`) into one time sorted profile, and return it together
+    with the clock accuracy.  Timestamps are synchronized as described in
+    `_synchronize()`.  As this shifts all events of a profile by the same
+    offset, the profiles remain time sorted, and are combined in a streaming
+    k-way merge.
+    '''
+
+    events = {name: [e for e in rows if e[ru.EVENT] in SYNC_EVENTS]
+              for name, rows in profiles.iteritems() if rows}
+
+    shifts, accuracy = _synchronize(events)
+
+    chunks = list()
+    for name in sorted(shifts.keys()):
+
+        shift = shifts[name]
+        rows  = profiles[name]
+
+        for row in rows:
+            row[ru.TIME] += shift
+
+        if rows[-1][ru.EVENT] != 'END':
+            print 'WARNING: profile "%s" not correctly closed.' % name
+
+        chunks.append(_decorate(len(chunks), rows))
+
+    return [row for _, row in heapq.merge(*chunks)], accuracy
+
+
+# ------------------------------------------------------------------------------
+#
+def combine_frames(frames):
+    '''
+    Same as `combine_profiles()`, but for a dict of profile names to data
+    frames (as returned by `read_profiles(columnar=True)`).  Returns a single
+    time sorted data frame, and the clock accuracy.
+    '''
+
+    events = dict()
+    for name, frame in frames.iteritems():
+        if len(frame):
+            sync = frame[frame[ru.EVENT].isin(SYNC_EVENTS)]
+            events[name] = sync.values.tolist()
+
+    shifts, accuracy = _synchronize(events)
+
+    chunks = list()
+    for name in sorted(shifts.keys()):
+
+        frame = frames[name]
+        frame[ru.TIME] += shifts[name]
+
+        if frame[ru.EVENT].iat[-1] != 'END':
+            print 'WARNING: profile "%s" not correctly closed.' % name
+
+        chunks.append(frame)
+
+    if not chunks:
+        return _empty_frame(), accuracy
+
+    # the chunks are time sorted, and a stable sort merges them
+    ret = pd.concat(chunks, ignore_index=True)
+    ret = ret.iloc[np.argsort(ret[ru.TIME].values, kind='mergesort')]
+
+    return ret.reset_index(drop=True), accuracy
+
+
+# ------------------------------------------------------------------------------
+#
+def clean_profile(profile):
+    '''
+    Prepare a combined profile for consumption, like `ru.clean_profile()`:
+    `advance` events are renamed to `state`, and repeated transitions of an
+    entity into the same state are dropped.  Like `ru.clean_profile()`, each
+    remaining state transition is contained twice in the returned profile:
+    once as event, and once as state transition, where the second copy
+    follows all events with the same timestamp.  Other than
+    `ru.clean_profile()`, this does not group events by entity, but only
+    merges the state transitions back into the time sorted profile.
+    '''
+
+    ret    = list()
+    states = list()
+    seen   = set()
+
+    for event in profile:
+
+        if event[ru.EVENT] == 'advance':
+
+            event[ru.EVENT] = 'state'
+
+            key = (event[ru.UID], event[ru.STATE])
+            if key in seen:
+                continue
+            seen.add(key)
+            states.append(event)
+
+        ret.append(event)
+
+    # both lists are time sorted, and a stable sort merges them
+    ret += states
+    ret.sort(key=lambda event: event[ru.TIME])
+
+    return ret
+
+
+# ------------------------------------------------------------------------------
+#
+def clean_frame(frame):
+    '''
+    Same as `clean_profile()`, but for a combined profile frame.
+    '''
+
+    is_state = (frame[ru.EVENT] == 'advance').values
+    frame.loc[is_state, ru.EVENT] = 'state'
+
+    # keep the first transition of each entity into each state
+    keep = np.ones(len(frame), dtype=bool)
+    keep[is_state] = ~frame[is_state].duplicated([ru.UID, ru.STATE]).values
+    if not keep.all():
+        frame    = frame[keep]
+        is_state = is_state[keep]
+
+    # both parts are time sorted, and a stable sort merges them
+    frame = pd.concat([frame, frame[is_state]], ignore_index=True)
+    frame = frame.iloc[np.argsort(frame[ru.TIME].values, kind='mergesort')]
+
+    return frame.reset_index(drop=True)
+
+
+# ------------------------------------------------------------------------------
+#
+def read_tarball(src, sid=None, columnar=False):
+    '''
+    Read all profiles (`*.prof` members) from the given tarball, and return
+    a dict of member names to event rows or data frames, as `read_profiles()`
+    does for profile files.  The tarball is read as a stream, so it is never
+    extracted, and is read only once.
+    '''
+
+    ret = dict()
+    tf  = tarfile.open(name=src, mode='r|*')
+
+    try:
+        for member in tf:
+            if not member.isfile() or not member.name.endswith('.prof'):
+                continue
+            if columnar:
+                ret[member.name] = read_frame(tf.extractfile(member),
+                                              member.name, sid)
+            else:
+                ret[member.name] = read_profile(tf.extractfile(member),
+                                                member.name, sid)
+    finally:
+        tf.close()
+
+    return ret
+
+
+# ------------------------------------------------------------------------------
+#
+@contextlib.contextmanager
+def session_dir(src):
+    '''
+    Context manager which yields a directory for the given session source.  If
+    the source is a tarball, the profiles and JSON files of the session are
+    extracted into a temporary directory (see `tempfile.gettempdir()`, i.e.,
+    `$TMPDIR`), which is removed again when the context is left.  Other
+    members of the tarball, like sandboxes and logs, are skipped.
+
+    This is used for the `radical.pilot` and `radical.entk` session types:
+    their profile and description readers (`get_session_profile()` and
+    `get_session_description()` in `rp.utils` and `re.utils`) only accept
+    a directory, and open the files in it by name, so the members cannot be
+    passed to them as streams from the tarball.
+    '''
+
+    if not os.path.isfile(src) or not is_tarball(src):
+        yield src
+        return
+
+    tmp = tempfile.mkdtemp(prefix='ra.')
+
+    try:
+        # the tarball is read as a stream, and only once
+        tf = tarfile.open(name=src, mode='r|*')
+        try:
+            for member in tf:
+                if not member.isfile()                     or \
+                   not member.name.endswith(SESSION_FILES) or \
+                   os.path.isabs(member.name)              or \
+                   '..' in member.name.split('/'):
+                    continue
+                tf.extract(member, path=tmp)
+        finally:
+            tf.close()
+
+        # the tarball usually contains the session directory
+        tgt = os.path.join(tmp, os.path.basename(strip_suffix(src)))
+        if not os.path.isdir(tgt):
+            tgt = tmp
+
+        yield tgt
+
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,298 @@
+import numbers
+
+import numpy as np
+
+from . import sweep
+
+
+# ------------------------------------------------------------------------------
+#
+class TimeSeries(object):
+
+    def __init__(self, times=None, values=None):
+        '''
+        A `TimeSeries` is a piecewise constant function of time (a step
+        function), stored as two NumPy arrays of sorted, unique `times` and of
+        `values`: the series has the value `values[i]` from `times[i]` up to
+        (but excluding) `times[i+1]`, and keeps the last value after the last
+        time.  Before the first time, the series is zero.  Series which
+        describe a finite process, like the concurrency of a set of ranges,
+        thus end with a value of zero.
+
+        A series is created from two arrays of times and values, or from a list
+        of `[time, value]` pairs as returned by `Session.concurrency()`.  If
+        a time is given more than once, the last value for that time is used.
+
+        Series can be added and subtracted (`+`, `-`), and can be scaled by
+        numbers (`*`, `/`).  The operands are evaluated on the union of their
+        times, so that combining the utilization of many pilots is
+
+            total = ra.TimeSeries.sum([u['utilization']
+                                       for u in util.values()])
+
+        which does not iterate over the series points in Python.
+
+        A `TimeSeries` is a (read-only) sequence of `[time, value]` lists, and
+        can thus be used where such lists are expected.
+        '''
+
+        if isinstance(times, TimeSeries):
+            self._times  = times._times
+            self._values = times._values
+            return
+
+        if values is None:
+            if times is None or not len(times):
+                times  = np.zeros(0)
+                values = np.zeros(0)
+            else:
+                pairs  = np.asarray(times, dtype=np.float64).reshape(-1, 2)
+                times  = pairs[:, 0]
+                values = pairs[:, 1]
+
+        times  = np.asarray(times, dtype=np.float64)
+        values = np.asarray(values)
+
+        if len(times) != len(values):
+            raise ValueError('times and values differ in length')
+
+        # sort by time, and keep the last value for each time
+        if len(times) and np.any(times[1:] <= times[:-1]):
+            order  = np.argsort(times, kind='mergesort')
+            times  = times[order]
+            values = values[order]
+            last   = np.ones(len(times), dtype=bool)
+            last[:-1] = times[1:] != times[:-1]
+            times  = times[last]
+            values = values[last]
+
+        self._times  = times
+        self._values = values
+
+
+    # --------------------------------------------------------------------------
+    #
+    @classmethod
+    def sum(cls, series):
+        '''
+        Return the sum of a list of series.  All series are evaluated on the
+        union of their times at once.
+        '''
+
+        series = [s for s in series if len(s)]
+        if not series:
+            return cls()
+
+        times  = np.unique(np.concatenate([s._times for s in series]))
+        values = np.sum([s.at(times) for s in series], axis=0)
+
+        return cls(times, values)
+
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def times(self):
+        return self._times
+
+    @property
+    def values(self):
+        return self._values
+
+    @property
+    def t_range(self):
+        if not len(self._times):
+            return None
+        return [float(self._times[0]), float(self._times[-1])]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def at(self, times):
+        '''
+        Return the values of the series at the given times.
+        '''
+
+        t   = np.asarray(times, dtype=np.float64)
+        idx = np.searchsorted(self._times, t, side='right') - 1
+
+        if not len(self._times):
+            ret = np.zeros(t.shape, dtype=self._values.dtype)
+        else:
+            ret = np.where(idx >= 0, self._values[np.maximum(idx, 0)], 0)
+
+        if np.ndim(times) == 0:
+            return ret[()]
+        return ret
+
+
+    # --------------------------------------------------------------------------
+    #
+    def resample(self, sampling=None, times=None):
+        '''
+        Return the series sampled at regular intervals of `sampling` seconds
+        over its time range (see `sweep.sample_times()`), or at the given
+        `times`.
+        '''
+
+        if times is None:
+            if not len(self._times) or not sampling:
+                return TimeSeries(self)
+            times = sweep.sample_times(self._times[0], self._times[-1],
+                                       sampling)
+
+        times = np.unique(np.asarray(times, dtype=np.float64))
+
+        return TimeSeries(times, self.at(times))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def window(self, t_start=None, t_stop=None):
+        '''
+        Return the part of the series in `[t_start, t_stop)`: the returned
+        series starts at `t_start` and returns to zero at `t_stop`.  Both
+        default to the time range of the series.
+        '''
+
+        if not len(self._times):
+            return TimeSeries()
+
+        if t_start is None: t_start = self._times[0]
+        if t_stop  is None: t_stop  = self._times[-1]
+
+        if t_stop <= t_start:
+            return TimeSeries()
+
+        inner  = self._times[(self._times > t_start) & (self._times < t_stop)]
+        times  = np.concatenate([[t_start], inner, [t_stop]])
+        values = self.at(times)
+        values[-1] = 0
+
+        return TimeSeries(times, values)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def integrate(self, t_start=None, t_stop=None):
+        '''
+        Return the integral of the series over `[t_start, t_stop)`, which
+        default to the time range of the series.  For example, the integral of
+        a core utilization series yields the used core-seconds.
+        '''
+
+        if t_start is not None or t_stop is not None:
+            return self.window(t_start, t_stop).integrate()
+
+        if len(self._times) < 2:
+            return 0.0
+
+        return float(np.dot(self._values[:-1], np.diff(self._times)))
+
+
+    def max(self):
+        '''
+        Return the maximum value of the series, or zero for an empty series.
+        '''
+
+        if not len(self._values):
+            return 0
+        return self._values.max()
+
+
+    def mean(self, t_start=None, t_stop=None):
+        '''
+        Return the time weighted mean value of the series over
+        `[t_start, t_stop)`, which default to the time range of the series.
+        '''
+
+        if not len(self._times):
+            return 0.0
+
+        if t_start is None: t_start = self._times[0]
+        if t_stop  is None: t_stop  = self._times[-1]
+
+        if t_stop <= t_start:
+            return float(self.at(t_start))
+
+        return self.integrate(t_start, t_stop) / (t_stop - t_start)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _combine(self, other, sign):
+
+        if isinstance(other, numbers.Number) and other == 0:
+            return TimeSeries(self)
+
+        if not isinstance(other, TimeSeries):
+            return NotImplemented
+
+        times = np.union1d(self._times, other._times)
+
+        return TimeSeries(times, self.at(times) + sign * other.at(times))
+
+
+    def __add__(self, other):
+        return self._combine(other, 1)
+
+    def __sub__(self, other):
+        return self._combine(other, -1)
+
+    def __neg__(self):
+        return TimeSeries(self._times, -self._values)
+
+    def __mul__(self, factor):
+        if not isinstance(factor, numbers.Number):
+            return NotImplemented
+        return TimeSeries(self._times, self._values * factor)
+
+    def __div__(self, divisor):
+        if not isinstance(divisor, numbers.Number):
+            return NotImplemented
+        return TimeSeries(self._times, self._values / float(divisor))
+
+    # `sum()` starts with `0 + series`
+    __radd__    = __add__
+    __rmul__    = __mul__
+    __truediv__ = __div__
+
+
+    # --------------------------------------------------------------------------
+    #
+    def tolist(self):
+        '''
+        Return the series as list of `[time, value]` lists.
+        '''
+
+        return [list(p) for p in zip(self._times.tolist(),
+                                     self._values.tolist())]
+
+
+    def __len__(self):
+        return len(self._times)
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __getitem__(self, idx):
+        return [self._times[idx].item(), self._values[idx].item()]
+
+    def __eq__(self, other):
+        if isinstance(other, TimeSeries):
+            return np.array_equal(self._times,  other._times) and \
+                   np.array_equal(self._values, other._values)
+        try:
+            return self.tolist() == [list(p) for p in other]
+        except TypeError:
+            return False
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'TimeSeries(%s)' % self.tolist()
+
+
+# ------------------------------------------------------------------------------
+
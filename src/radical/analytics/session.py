@@ -3,89 +3,123 @@ import os
 import sys
 import copy
 import glob
-import tarfile
 
+import numpy         as np
+import pandas        as pd
 import radical.utils as ru
 
-from .entity import Entity
+from .entity  import Entity
+from .store   import EventStore
+from .index   import EntityIndex
+from .matcher import get_event_matcher, get_range_matcher, TableMatcher
+from .ranges  import RangeSet
+from .series  import TimeSeries
+from .        import sweep
+from .        import cache  as rac
+from .        import reader as rar
 
 
 # ------------------------------------------------------------------------------
 #
 class Session(object):
 
-    def __init__(self, src, stype, sid=None, _entities=None, _init=True):
+    def __init__(self, src, stype, sid=None, columnar=False, cache=False,
+                 mmap=False, _entities=None, _init=True):
         '''
         Create a radical.analytics session for analysis.
 
         The session is created from a set of profiles, which usually have been
         produced from some other session object in the RCT stack, such as
         radical.pilot. Profiles are accepted in two forms: in a directory, or in
-        a tarball (of such a directory).  In the latter case, the tarball are
-        extracted into `$TMP`, and then handled just as the directory case.
+        a tarball (of such a directory, with any compression supported by
+        `tarfile`).  For `radical.prof` sessions, the profiles are read from
+        the tarball directly.  Other session types need a directory, and the
+        profiles and JSON files of the tarball are extracted into a temporary
+        directory for parsing, which is removed afterwards.  In combination
+        with `cache`, a tarball thus only needs to be read once.
 
         If no `sid` (session ID) is specified, that ID is derived from the
         directory name.
+
+        If `columnar` is set to `True`, the session events are not kept as
+        event tuples, but are stored in an `ra.EventStore`, i.e., in a set of
+        NumPy arrays, and all entities refer to slices of that store.  This
+        significantly reduces the memory consumption for large sessions.  The
+        API remains the same, but `entity.events` and `entity.states` are then
+        recreated from the store on each access.
+
+        If `cache` is set to `True`, the parsed profile and session description
+        are stored in a binary cache file next to the session source, and are
+        loaded from there on the next session construction, as long as the
+        source files did not change.  Loading from the cache does not require
+        radical.pilot or radical.entk to be installed.  `cache` can also be set
+        to a path name, to specify the location of the cache file.
+
+        If `mmap` is set to `True`, the session is columnar and cached, and the
+        event store columns are memory mapped from the cache file instead of
+        being read into memory.  Entities remain slices of the store, and only
+        those pages of the cache file which are needed by a query are actually
+        read.  This allows to analyze sessions which are larger than the
+        available memory.  A session which is not yet cached is parsed first,
+        and is then mapped from the newly written cache file.
         '''
 
         if not os.path.exists(src):
             raise ValueError('src [%s] does not exist' % src)
 
-        if os.path.isdir(src):
-            pass
-
-        elif os.path.isfile(src):
-
-            # src is afile - we assume its a tarball and extract it
-            if  src.endswith('.prof'):
-                # use as is
-                tgt = src
-
-            elif src.endswith('.tgz') or \
-                 src.endswith('.tbz')    :
-                tgt = src[:-4]
+        # tarballs are not extracted, but are read as they are.  If a tarball
+        # was extracted before, we use the extracted data dir though.
+        tarball = False
 
-            elif src.endswith('.tar.gz') or \
-                 src.endswith('.tar.bz')    :
-                tgt = src[:-7]
+        if os.path.isfile(src) and not src.endswith('.prof'):
 
-            else:
+            if not rar.is_tarball(src):
                 raise ValueError('src does not look like a tarball or profile')
 
+            tgt = rar.strip_suffix(src)
+            if os.path.isdir(tgt):
+                src = tgt
+            else:
+                tarball = True
 
-            if not os.path.exists(tgt):
-
-                # need to extract
-                print 'extract tarball to %s' % tgt
-                try:
-                    tf = tarfile.open(name=src, mode='r:bz2')
-                    tf.extractall(path=os.path.dirname(tgt))
-
-                except Exception as e:
-                    raise RuntimeError('Cannot extract tarball: %s' % repr(e))
-
-            # switch to the extracted data dir
-            src = tgt
-
+        # memory mapping works on the columns of a cache file
+        if mmap:
+            columnar = True
+            if not cache:
+                cache = True
 
         # if no sid is given, we assume its the directory name
         if not sid:
             if src.endswith('/'):
                 src = src[:-1]
-            sid = os.path.basename(src)
+            sid = os.path.basename(rar.strip_suffix(src))
 
-        self._sid   = sid
-        self._src   = src
-        self._stype = stype
+        self._sid      = sid
+        self._src      = src
+        self._stype    = stype
+        self._columnar = columnar
+        self._store    = None
 
       # print 'sid: %s [%s]' % (sid, stype)
       # print 'src: %s'      % src
 
-        if stype == 'radical.pilot':
+        cached = None
+        if cache:
+            if cache is True: cache_path = rac.get_path(src, sid)
+            else            : cache_path = cache
+            cache_key = rac.get_key(src, stype, sid)
+            cached    = rac.load(cache_path, cache_key, mapped=mmap)
+
+        if cached:
+            self._store, self._description = cached
+            self._profile = None
+
+        elif stype == 'radical.pilot':
             import radical.pilot as rp
-            self._profile, accuracy, hostmap \
-                              = rp.utils.get_session_profile(sid=sid, src=self._src)
-            self._description = rp.utils.get_session_description(sid=sid, src=self._src)
+            with rar.session_dir(self._src) as path:
+                self._profile, accuracy, hostmap \
+                                  = rp.utils.get_session_profile(sid=sid, src=path)
+                self._description = rp.utils.get_session_description(sid=sid, src=path)
 
             self._description['accuracy'] = accuracy
             self._description['hostmap']  = hostmap
@@ -94,8 +128,9 @@ class Session(object):
         elif stype == 'radical.entk':
             import radical.entk as re
 
-            self._profile, accuracy, hostmap = re.utils.get_session_profile(sid=sid, src=self._src)
-            self._description = re.utils.get_session_description(sid=sid, src=self._src)
+            with rar.session_dir(self._src) as path:
+                self._profile, accuracy, hostmap = re.utils.get_session_profile(sid=sid, src=path)
+                self._description = re.utils.get_session_description(sid=sid, src=path)
 
             self._description['accuracy'] = accuracy
             self._description['hostmap']  = hostmap
@@ -103,12 +138,25 @@ class Session(object):
 
         elif stype == 'radical.prof':
 
-            if os.path.isdir(src): profiles = glob.glob("%s/*.prof")
-            else                 : profiles = [src]
+            # profiles are parsed in parallel, and merged by time.  Columnar
+            # sessions parse the profiles into columns, and skip the event
+            # tuples altogether.
+            columnar = self._columnar
 
-            profiles          = ru.read_profiles(profiles, src)
-            profile, accuracy = ru.combine_profiles(profiles)
-            self._profile     = ru.clean_profile(profile, src)
+            if tarball:
+                profiles = rar.read_tarball(src, src, columnar=columnar)
+            else:
+                if os.path.isdir(src): paths = glob.glob('%s/*.prof' % src)
+                else                 : paths = [src]
+                profiles = rar.read_profiles(paths, src, columnar=columnar)
+
+            if columnar:
+                frame, accuracy = rar.combine_frames(profiles)
+                self._store     = EventStore.from_frame(rar.clean_frame(frame))
+                self._profile   = None
+            else:
+                profile, accuracy = rar.combine_profiles(profiles)
+                self._profile     = rar.clean_profile(profile)
 
             self._description = {'tree'     : dict(), 
                                  'entities' : list()}
@@ -123,6 +171,37 @@ class Session(object):
         self._ttc     = None
         self._log     = None
 
+        # in columnar mode, the profile is converted into an event store, and
+        # the event tuples are dropped.
+        if self._columnar and self._store is None:
+            self._store   = EventStore(self._profile)
+            self._profile = None
+
+        if cache and not cached:
+            if self._store is not None: store = self._store
+            else                      : store = EventStore(self._profile)
+            try:
+                rac.save(cache_path, cache_key, store, self._description)
+            except (IOError, OSError) as e:
+                print 'cannot write session cache %s: %s' % (cache_path, e)
+            else:
+                # replace the parsed store by the mapped one, so that the
+                # parsed columns can be freed
+                if mmap:
+                    mapped = rac.load(cache_path, cache_key, mapped=True)
+                    if mapped:
+                        self._store = mapped[0]
+
+        # a profile based session loaded from the cache recreates the profile
+        # from the store, which shares the names from the store's symbol
+        # tables.  Otherwise we intern the names of the parsed profile.
+        if not self._columnar:
+            if self._store is not None:
+                self._profile = self._store.events(slice(0, len(self._store)))
+                self._store   = None
+            else:
+                self._profile = EventStore.intern(self._profile)
+
         # internal state is represented by a dict of entities:
         # dict keys are entity uids (which are assumed to be unique per
         # session), dict values are ra.Entity instances.
@@ -130,11 +209,22 @@ class Session(object):
         if _init:
             self._initialize_entities(self._profile)
 
+        # the entity index is created on the first query, and is shared with
+        # all sessions derived by filtering.  `self._eids` holds the sorted
+        # index IDs of the entities in `self._entities`.
+        self._index = None
+        self._eids  = None
+
+        # state timestamp matrices are created on demand, per entity type
+        self._matrices = dict()
+
         # we do some bookkeeping in self._properties where we keep a list of
-        # property values around which we encountered in self._entities.
-        self._properties = dict()
+        # property values around which we encountered in self._entities.  Those
+        # are only collected on the first query which needs them (see
+        # `_get_properties()`), but session times are always kept up to date.
+        self._properties = None
         if _init:
-            self._initialize_properties()
+            self._initialize_times()
 
         # FIXME: we should do a sanity check that all encountered states and
         #        events are part of the respective state and event models
@@ -157,17 +247,45 @@ class Session(object):
 
     # --------------------------------------------------------------------------
     #
-    def _reinit(self, entities):
+    def _view(self, entities, eids=None):
+        '''
+        Create a lightweight clone of this session which shares profile, store,
+        description and entity index with this session, but holds the given set
+        of entities.  No data are reloaded from disk.
+        '''
+
+        ret = self.__class__.__new__(self.__class__)
+        ret.__dict__.update(self.__dict__)
+        ret._reinit(entities, eids)
+
+        return ret
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _reinit(self, entities, eids=None):
         '''
         After creating a session clone, we have identical sets of descriptions,
         profiles, and entities.  However, if we apply a filter during the clone
         creation, we end up with a deep copy which should have a *different* set
         of entities.  This method applies that new entity set to such a cloned
-        session.
+        session.  If the index IDs for the new entities are not given, they are
+        looked up in the shared entity index.
         '''
 
         self._entities = entities
 
+        if self._index is not None:
+            if eids is None:
+                eids = self._index.lookup('uid', entities.keys())
+            self._eids = eids
+
+        self._filter_matrices()
+
+        # the property counters are recollected on demand
+        self._properties = None
+        self._initialize_times()
+
         # FIXME: we may want to filter the session description etc. wrt. to the
         #        entity types remaining after a filter.
 
@@ -217,6 +335,18 @@ class Session(object):
         first part of any dot-separated uid to signify an entity type.
         '''
 
+        if self._store is not None:
+            # the store already grouped all events by uid
+            for uid, etype, rng in self._store.entities():
+                details = self._description['tree'].get(uid, dict())
+                details['hostid'] = self._description['hostmap'].get(uid)
+                self._entities[uid] = Entity(_uid=uid,
+                                             _etype=etype,
+                                             _profile=rng,
+                                             _details=details,
+                                             _store=self._store)
+            return
+
         # create entities from the profile events:
         entity_events = dict()
 
@@ -267,10 +397,6 @@ class Session(object):
           - state (state identifiers)
         '''
 
-        # FIXME: initializing properties can be expensive, and we might not
-        #        always need them anyway.  So we can lazily defer this
-        #        initialization stop until the first query which requires them.
-
         # we do *not* look at profile and descriptions anymore, those are only
         # evaluated once on construction, in `_initialize_entities()`.  Now we
         # don't parse all that stuff again, but only re-initialize after
@@ -280,15 +406,8 @@ class Session(object):
                             'event' : dict(),
                             'state' : dict()}
 
-        if self._entities:
-            self._t_start = sys.float_info.max
-            self._t_stop  = sys.float_info.min
-
         for euid,e in self._entities.iteritems():
 
-            self._t_start = min(self._t_start, e.t_start)
-            self._t_stop  = max(self._t_stop,  e.t_stop )
-
             if euid in self._properties['uid']:
                 raise RuntimeError('duplicated uid %s' % euid)
             self._properties['uid'][euid] = 1
@@ -297,30 +416,78 @@ class Session(object):
                 self._properties['etype'][e.etype] = 0
             self._properties['etype'][e.etype] += 1
 
-            for state in e.states:
+            for state in e.list_states():
                 if state not in self._properties['state']:
                     self._properties['state'][state] = 0
                 self._properties['state'][state] += 1
 
-            for event in e.events:
-                name = event[ru.EVENT]
+            for name in e._event_names():
                 if name not in self._properties['event']:
                     self._properties['event'][name] = 0
                 self._properties['event'][name] += 1
 
 
-        if self._entities:
-            self._ttc = self._t_stop - self._t_start
+    # --------------------------------------------------------------------------
+    #
+    def _get_properties(self):
+        '''
+        return self._properties, and collect them on first use
+        '''
+
+        if self._properties is None:
+            self._initialize_properties()
+
+        return self._properties
 
 
     # --------------------------------------------------------------------------
     #
-    def _apply_filter(self, etype=None, uid=None, state=None,
-                            event=None, time=None):
+    def _initialize_times(self):
+        '''
+        derive t_start, t_stop and ttc from the entity times, which are known
+        after entity construction.  This does not touch any events, so it is
+        cheap enough to be repeated after each in-place filter.
+        '''
+
+        self._t_start = None
+        self._t_stop  = None
+        self._ttc     = None
+
+        if not self._entities:
+            return
+
+        self._t_start = sys.float_info.max
+        self._t_stop  = sys.float_info.min
+
+        for e in self._entities.itervalues():
+            self._t_start = min(self._t_start, e.t_start)
+            self._t_stop  = max(self._t_stop,  e.t_stop )
+
+        self._ttc = self._t_stop - self._t_start
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _get_index(self):
+
+        if self._index is None:
+            self._index = EntityIndex(self._entities, self._store)
+            self._eids  = self._index.eids
+
+        return self._index
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _select(self, etype=None, uid=None, state=None, event=None, time=None):
+        '''
+        Return the sorted array of index IDs of all entities which match the
+        given set of filters.  The etype, uid, state and event filters are
+        resolved by intersecting the respective entity index entries.  Only if
+        a time filter is given, the matching entities are checked for states
+        and events in the given time ranges.
+        '''
 
-        # iterate through all self._entities and collect UIDs of all entities
-        # which match the given set of filters (after removing all events which
-        # are not in the given time ranges)
         if not etype: etype = list()
         if not uid  : uid   = list()
         if not state: state = list()
@@ -332,40 +499,51 @@ class Session(object):
         if state and not isinstance(state, list): state = [state]
         if event and not isinstance(event, list): event = [event]
 
-        if time and len(time) and not isinstance(time[0], list): time = [time]
-
-        ret = list()
-        for eid,entity in self._entities.iteritems():
+        if time and len(time) and not isinstance(time, RangeSet) \
+                              and not isinstance(time[0], list): time = [time]
+
+        index = self._get_index()
+        ret   = self._eids
+
+        for prop, values in [['etype', etype],
+                             ['uid',   uid  ],
+                             ['state', state],
+                             ['event', event]]:
+            if values:
+                ret = np.intersect1d(ret, index.lookup(prop, values),
+                                     assume_unique=True)
+
+        if time and (state or event):
+            window  = RangeSet(time)
+            matcher = get_event_matcher([{ru.EVENT: e} for e in event])
+            matches = list()
+            for eid, uid in zip(ret.tolist(), index.uids(ret)):
+                entity = self._entities[uid]
+                if state:
+                    states = entity.states
+                    tstamps = [states[s][ru.TIME] for s in state if s in states]
+                    if not window.contains(tstamps).any():
+                        continue
+                if event:
+                    tstamps = entity.timestamps(event=matcher)
+                    if not window.contains(tstamps).any():
+                        continue
+                matches.append(eid)
+            ret = np.array(matches, dtype=np.int64)
 
-            if etype and entity.etype not in etype: continue
-            if uid   and entity.uid   not in uid  : continue
+        return ret
 
-            if state:
-                match = False
-                for s,stuple in entity.states.iteritems():
-                    if time and not ru.in_range(stuple[ru.TIME], time):
-                        continue
-                    if s in state:
-                        match = True
-                        break
-                if not match:
-                    continue
 
-            if event:
-                match = False
-                for e,etuple in entity.events.iteritems():
-                    if time and not ru.in_range(etuple[ru.TIME], time):
-                        continue
-                    if e in event:
-                        match = True
-                        break
-                if not match:
-                    continue
+    # --------------------------------------------------------------------------
+    #
+    def _apply_filter(self, etype=None, uid=None, state=None,
+                            event=None, time=None):
 
-            # all existing filters have been passed - this is a match!
-            ret.append(eid)
+        # collect UIDs of all entities which match the given set of filters
+        eids = self._select(etype=etype, uid=uid, state=state,
+                            event=event, time=time)
 
-        return ret
+        return self._index.uids(eids)
 
 
     # --------------------------------------------------------------------------
@@ -387,7 +565,7 @@ class Session(object):
 
         if not pname:
             # return the name of all known properties
-            return self._properties.keys()
+            return self._get_properties().keys()
 
         if isinstance(pname, list):
             return_list = True
@@ -396,17 +574,30 @@ class Session(object):
             return_list = False
             pnames = [pname]
 
+        properties = self._get_properties()
+
         ret = list()
         for _pname in pnames:
-            if _pname not in self._properties:
+            if _pname not in properties:
                 raise KeyError('no such property known (%s) / %s'
-                        % (_pname, self._properties.keys()))
-            ret.append(self._properties[_pname].keys())
+                        % (_pname, properties.keys()))
+            ret.append(properties[_pname].keys())
 
         if return_list: return ret
         else          : return ret[0]
 
 
+    # --------------------------------------------------------------------------
+    #
+    def entity(self, uid):
+        '''
+        Return the session entity with the given uid.  A `KeyError` is raised
+        if this session does not contain such an entity.
+        '''
+
+        return self._entities[uid]
+
+
     # --------------------------------------------------------------------------
     #
     def get(self, etype=None, uid=None, state=None, event=None, time=None):
@@ -421,24 +612,22 @@ class Session(object):
     def filter(self, etype=None, uid=None, state=None, event=None, time=None,
                inplace=True):
 
-        uids = self._apply_filter(etype=etype, uid=uid, state=state,
-                                  event=event, time=time)
+        eids = self._select(etype=etype, uid=uid, state=state,
+                            event=event, time=time)
+        uids = self._index.uids(eids)
 
         if inplace:
             # filter our own entity list, and refresh the entity based on
-            # the new list
-            if uids != self._entities.keys():
-                self._entities = {uid:self._entities[uid] for uid in uids}
-                self._initialize_properties()
+            # the new list.  The result is always a subset of the current
+            # entities, so we only need to compare sizes.
+            if len(uids) != len(self._entities):
+                self._reinit({uid:self._entities[uid] for uid in uids}, eids)
             return self
 
         else:
-            # create a new session with the resulting entity list
-            ret = Session(sid=self._sid, stype=self._stype, src=self._src,
-                          _init=False)
-            ret._reinit(entities={uid:self._entities[uid] for uid in uids})
-            ret._initialize_properties()
-            return ret
+            # create a session view with the resulting entity list
+            return self._view(entities={uid:self._entities[uid] for uid in uids},
+                              eids=eids)
 
 
     # --------------------------------------------------------------------------
@@ -446,7 +635,7 @@ class Session(object):
     def describe(self, mode=None, etype=None):
 
         if mode not in [None, 'state_model', 'state_values',
-                              'event_model', 'relations',
+                              'event_model', 'relations', 'parents',
                               'statistics']:
             raise ValueError('describe parameter "mode" invalid')
 
@@ -455,7 +644,7 @@ class Session(object):
             return self._description
 
         if mode == 'statistics':
-            return self._properties
+            return self._get_properties()
 
         if not etype:
             etype = self.list('etype')
@@ -493,6 +682,20 @@ class Session(object):
             elif mode == 'event_model':
                 ret[et] = {'event_model'  : event_model}
 
+        if mode == 'parents':
+            # the inverse of the relations: map all child entities of
+            # etype[1] to their parent entity of etype[0].
+            if len(etype) != 2:
+                raise ValueError('parents expect an etype *tuple*')
+
+            ret = dict()
+            rel = self.describe('relations', etype)
+            for p in sorted(rel.keys(), reverse=True):
+                for c in rel[p]:
+                    ret[c] = p
+
+            return ret
+
         if not mode or mode == 'relations':
             if len(etype) != 2:
                 raise ValueError('relations expect an etype *tuple*')
@@ -503,7 +706,7 @@ class Session(object):
             # returned as a dict.
 
             parent_uids = self._apply_filter(etype=etype[0])
-            child_uids  = self._apply_filter(etype=etype[1])
+            child_uids  = set(self._apply_filter(etype=etype[1]))
 
             rel = self._description['tree']
             for p in parent_uids:
@@ -520,6 +723,128 @@ class Session(object):
         return ret
 
 
+    # --------------------------------------------------------------------------
+    #
+    def state_matrix(self, etype, states=None):
+        '''
+        For all session entities of the given type, return the times at which
+        those entities entered their states, as a `pandas.DataFrame` of floats
+        with one row per entity (indexed by uid) and one column per state.
+        Missing state transitions are represented as `NaN`.  As for
+        `Entity.states`, the last transition into a state is used.
+
+        The columns are ordered by the state values of the entity's state model
+        (if known), followed by all other states in alphabetical order.  If
+        `states` is given, the returned columns are exactly those states.
+
+        The matrix is created once per entity type, and is reused (and, after
+        filtering, subsetted) in later calls.  State durations of all entities
+        can thus be computed as column differences, for example
+
+            m = session.state_matrix('unit')
+            t = m[rp.AGENT_STAGING_OUTPUT_PENDING] - m[rp.AGENT_EXECUTING]
+        '''
+
+        if etype not in self._matrices:
+            self._matrices[etype] = self._initialize_matrix(etype)
+
+        ret = self._matrices[etype]
+
+        if states is not None:
+            if not isinstance(states, list):
+                states = [states]
+            ret = ret.reindex(columns=states)
+
+        return ret
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _initialize_matrix(self, etype):
+
+        uids = sorted(self._apply_filter(etype=etype))
+
+        if self._store is not None:
+            rows, names, times = self._matrix_entries_store(uids)
+        else:
+            rows  = list()
+            names = list()
+            times = list()
+            for row, uid in enumerate(uids):
+                for state, event in self._entities[uid].states.iteritems():
+                    rows.append(row)
+                    names.append(state)
+                    times.append(event[ru.TIME])
+
+        # order states by their value in the state model, then by name
+        order = dict()
+        if etype in self._description['entities']:
+            values = self._description['entities'][etype]['state_values']
+            for v, s in sorted((values or dict()).items()):
+                if not isinstance(s, list):
+                    s = [s]
+                for _s in s:
+                    order.setdefault(_s, [0, v])
+        cols = sorted(set(names), key=lambda s: order.get(s, [1, s]))
+        cidx = {s: c for c, s in enumerate(cols)}
+
+        ret = np.full((len(uids), len(cols)), np.nan)
+        if len(times):
+            ret[np.asarray(rows), [cidx[s] for s in names]] = times
+
+        return pd.DataFrame(ret, columns=cols,
+                            index=pd.Index(uids, name='uid'))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _matrix_entries_store(self, uids):
+
+        # collect the state transitions of the given entities directly from the
+        # store columns.  Events are time sorted per entity, so for repeated
+        # transitions into the same state we keep the last one.
+        store = self._store
+        code  = store.code(ru.EVENT, 'state')
+
+        if code is None:
+            return [], [], []
+
+        uid2row = np.full(len(store.symbols(ru.UID)), -1, dtype=np.int64)
+        for row, uid in enumerate(uids):
+            uid2row[store.code(ru.UID, uid)] = row
+
+        # scan the store chunk by chunk, to limit the size of temporary arrays
+        idx = [np.zeros(0, dtype=np.int64)]
+        for rng in store.chunks():
+            pos = np.flatnonzero(store.column(ru.EVENT)[rng] == code) \
+                + rng.start
+            idx.append(pos[uid2row[store.column(ru.UID)[pos]] >= 0])
+
+        idx   = np.concatenate(idx)
+        rows  = uid2row[store.column(ru.UID)[idx]]
+        codes = store.column(ru.STATE)[idx].astype(np.int64)
+
+        n_states = len(store.symbols(ru.STATE))
+        keys     = (rows * n_states + codes)[::-1]
+        _, last  = np.unique(keys, return_index=True)
+        last     = len(keys) - 1 - last
+
+        sym = store.symbols(ru.STATE)
+        return rows[last].tolist(), \
+               [sym[c] for c in codes[last].tolist()], \
+               store.time[idx[last]].tolist()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _filter_matrices(self):
+
+        # after filtering, only keep the rows of the remaining entities
+        uids = self._entities.keys()
+        self._matrices = {etype: m[m.index.isin(uids)]
+                          for etype, m in self._matrices.iteritems()}
+
+
     # --------------------------------------------------------------------------
     #
     def ranges(self, state=None, event=None, time=None, collapse=True):
@@ -530,16 +855,21 @@ class Session(object):
         set of ranges covering the same set of times.
 
         Please refer to the `Entity.ranges()` documentation on detail on the
-        constrain parameters.
+        constrain parameters.  The conditions are compiled into an
+        `ra.RangeMatcher` once, and are then applied to all entities.
 
         Setting 'collapse' to 'True' (default) will prompt the method to
-        collapse the resulting set of ranges.
+        collapse the resulting set of ranges.  The collapsed ranges are
+        computed as `ra.RangeSet`, and are returned as list sorted by time.
         '''
 
+        # compile the conditions once for all entities
+        matcher = get_range_matcher(state, event)
+
         ranges = list()
         for uid,entity in self._entities.iteritems():
             try:
-                tmp = entity.ranges(state, event, time, collapse=False)
+                tmp = entity.ranges(event=matcher, time=time, collapse=False)
                 ranges += tmp
             except ValueError:
                 print 'no ranges for %s' % uid
@@ -550,12 +880,10 @@ class Session(object):
             return []
 
         if collapse:
-            ret = ru.collapse_ranges(ranges)
-        else:
-            ret = ranges
+            return RangeSet(ranges).tolist()
 
-        # sort ranges by start time and return
-        return sorted(ret, key=lambda r: r[1])
+        # sort ranges by stop time and return
+        return sorted(ranges, key=lambda r: r[1])
 
 
     # --------------------------------------------------------------------------
@@ -580,9 +908,12 @@ class Session(object):
         The returned list will be sorted.
         '''
 
+        # compile the conditions once for all entities
+        matcher = get_event_matcher(event)
+
         ret = list()
         for uid,entity in self._entities.iteritems():
-            tmp = entity.timestamps(state=state, event=event, time=time)
+            tmp = entity.timestamps(state=state, event=matcher, time=time)
             if tmp and first:
                 ret.append(tmp[0])
             else:
@@ -604,26 +935,66 @@ class Session(object):
            session.duration(state=[rp.NEW, rp.FINAL]))
 
         where `rp.FINAL` is a list of final unit states.
+
+        Instead of conditions, a list of ranges or an `ra.RangeSet` can be
+        passed as `ranges` parameter.  Either way, the duration is the length
+        of the `ra.RangeSet` of all ranges.
         '''
 
-        if not ranges:
-            ranges = self.ranges(state, event, time)
+        if ranges is None:
+            ranges = self.ranges(state, event, time, collapse=False)
 
         else:
             assert(not state)
             assert(not event)
             assert(not time)
-            
-            # make sure the ranges are collapsed (although they likely are
-            # already...)
-            ranges = ru.collapse_ranges(ranges)
 
-        return sum(r[1] - r[0] for r in ranges) 
+        # make sure the ranges are collapsed (although they likely are
+        # already...)
+        return RangeSet(ranges).length
+
+
+    # --------------------------------------------------------------------------
+    #
+    def durations(self, table):
+        '''
+        This method accepts a table of named duration definitions, i.e., a dict
+        which maps names to `event` parameters as accepted by `duration()`:
+
+            session.durations({'exec' : [{ru.EVENT: 'exec_start'},
+                                         {ru.EVENT: 'exec_stop' }],
+                               'run'  : [{ru.EVENT: 'state',
+                                          ru.STATE: rp.AGENT_EXECUTING},
+                                         {ru.EVENT: 'state',
+                                          ru.STATE: rp.DONE}]})
+
+        All definitions are evaluated for all session entities, in a single pass
+        over the events of each entity.  The result is a `pandas.DataFrame` with
+        one row per entity (indexed by uid) and one column per definition.  The
+        values are the durations as returned by `Entity.duration()`, or `NaN`
+        where a definition does not apply to an entity.
+        '''
+
+        matcher = TableMatcher(table)
+        uids    = sorted(self._entities.keys())
+        ret     = np.full((len(uids), len(matcher.names)), np.nan)
+
+        for row, uid in enumerate(uids):
+            entity = self._entities[uid]
+            for col, ranges in enumerate(entity._table_ranges(matcher)):
+                if len(ranges) == 1:
+                    ret[row, col] = ranges[0][1] - ranges[0][0]
+                elif ranges:
+                    ret[row, col] = RangeSet(ranges).length
+
+        return pd.DataFrame(ret, columns=matcher.names,
+                            index=pd.Index(uids, name='uid'))
 
 
     # --------------------------------------------------------------------------
     #
-    def concurrency(self, state=None, event=None, time=None, sampling=None):
+    def concurrency(self, state=None, event=None, time=None, sampling=None,
+                    series=False):
         '''
         This method accepts the same set of parameters as the `ranges()` method,
         and will use the `ranges()` method to obtain a set of ranges.  It will
@@ -647,62 +1018,42 @@ class Session(object):
 
         where `time_n` is represented as `float`, and `concurrency_n` as `int`.
 
+        If `series` is set to `True`, an `ra.TimeSeries` is returned instead:
+        a step function which changes at the range edges, where a range is
+        counted from its start up to (but excluding) its end, so that the
+        integral of the series is the summed duration of all ranges.  With
+        `sampling`, that step function is sampled at the regular intervals.
+
         Example:
 
            session.filter(etype='unit').concurrency(state=[rp.AGENT_EXECUTING,
                                         rp.AGENT_STAGING_OUTPUT_PENDING])
         '''
 
+        # compile the conditions once for all entities
+        matcher = get_range_matcher(state, event)
+
         ranges = list()
         for uid,e in self._entities.iteritems():
-            ranges += e.ranges(state, event, time)
-
-        if not ranges:
-            # nothing to do
-            return []
+            ranges += e.ranges(event=matcher, time=time)
 
+        if series:
+            times, values = sweep.steps(np.zeros(len(ranges)),
+                                        [r[0] for r in ranges],
+                                        [r[1] for r in ranges],
+                                        np.ones(len(ranges), dtype=np.int64),
+                                        1)[0]
+            return TimeSeries(times, values).resample(sampling)
 
-        ret   = list()
-        times = list()
-        if sampling:
-            # get min and max of ranges, and add create timestamps at regular
-            # intervals
-            r_min = ranges[0][0]
-            r_max = ranges[0][1]
-            for r in ranges:
-                r_min = min(r_min, r[0])
-                r_max = max(r_max, r[1])
-
-            t = r_min
-            while t < r_max:
-                times.append(t)
-                t += sampling
-            times.append(t)
-
-        else:
-            # get all start and end times for all ranges, and use the resulting
-            # set as time sequence
-            for r in ranges:
-                times.append(r[0])
-                times.append(r[1])
-            times.sort()
-
-        # we have the time sequence, now compute concurrency at those points
-        for t in times:
-            cnt = 0
-            for r in ranges:
-                if t >= r[0] and t <= r[1]:
-                    cnt += 1
-
-            ret.append([t, cnt])
-
-        return ret
+        # the concurrency at any point in time is derived from the sorted range
+        # edges (sweep line), instead of checking all ranges for each point
+        return sweep.concurrency(ranges, sampling)
 
 
     # --------------------------------------------------------------------------
     #
     def rate(self, state=None, event=None, time=None, sampling=None,
-            first=False):
+            first=False, series=False):
         '''
         This method accepts the same parameters as the `timestamps()` method: it
         will count all matching events and state transitions as given, and will
@@ -734,6 +1085,11 @@ class Session(object):
         The 'first' is defined, only the first matching event fir the selected
         entities is considered viable.
 
+        If `series` is set to `True`, an `ra.TimeSeries` is returned instead,
+        which holds the rate of each sampling window from the start of that
+        window, and which returns to zero at the last sampling point.  The
+        integral of that series is the number of counted events.
+
         Example:
 
            session.filter(etype='unit').rate(state=[rp.AGENT_EXECUTING])
@@ -742,80 +1098,57 @@ class Session(object):
         timestamps = self.timestamps(event=event, state=state, time=time,
                                      first=first)
 
-        if not timestamps:
-            # nothing to do
-            return []
-
-
-        times = list()
-        if sampling:
-            # get min and max timestamp, and add create sampling points at regular
-            # intervals
-            r_min = timestamps[0]
-            r_max = timestamps[-1]
-
-            t = r_min
-            while t < r_max:
-                times.append(t)
-                t += sampling
-          # times.append(t)
-            times.append(r_max)
-
-        else:
-            # we create an entry at all timestamps
-            times = timestamps[:]
-
-        if not times:
-            # nothing to do
-            return []
-
-        # we need to make sure that no two consecutive timestamps are the same,
-        # as that would lead to a division by zero later on
-        times = sorted(set(times))
-
-      # import pprint
-      # pprint.pprint(times)
-
-        # make sure we start in correct state, and first data point does not
-        # occur before sampling starts
-        timestamps[0] >= times[0]
+        # the sampling points are unique, and the events per sampling window
+        # are counted by binary search over the sorted timestamps
+        times = sweep.rate_times(timestamps, sampling)
+        rates = sweep.rate(timestamps, times)
 
-        # we have the time sequence, now compute event rate at those points
-        ts_idx  = 0                # index into the list of timestamps
-        ts_len  = len(timestamps)  # number of timestamps
-        ret     = list()           # our rate time series
-        t_start = times[0]         # current samplint window
-        t_stop  = times[0]
+        if series:
+            if len(times) < 2:
+                return TimeSeries()
+            return TimeSeries(times, np.append(rates, 0.0))
 
-        for t in times[1:]:
-            t_start = t_stop       # slide sampling window to next sample time
-            t_stop  = t
-            cnt     = 0            # reset event counter
+        return [[t, r] for t, r in zip(times[1:].tolist(), rates.tolist())]
 
 
-            while ts_idx < ts_len:
-                if timestamps[ts_idx] <= t_stop:
-                    # timestamp is in range, count event
-                    cnt += 1
-                else:
-                    # we need to slide the sampling window
-                    break
-                # go to next timestamp
-                ts_idx += 1
+    # --------------------------------------------------------------------------
+    #
+    def rates(self, selectors, time=None, sampling=None, first=False):
+        '''
+        This method computes the rates for several sets of conditions at once,
+        over a common set of sampling points.  `selectors` is a dict which maps
+        names to dicts of `state` and/or `event` conditions, as accepted by
+        `rate()`:
+
+            times, rates = session.rates(
+                    {'exec' : {'event': {ru.EVENT: 'exec_start'}},
+                     'done' : {'state': rp.DONE}}, sampling=1.0)
+
+        The `time`, `sampling` and `first` parameters are interpreted as in
+        `rate()`, but the sampling points are derived from the timestamps of
+        all selectors.  Returned is a tuple of a NumPy array of sampling points
+        (the end of the sampling windows), and a dict mapping the selector
+        names to NumPy arrays with the rates in the respective windows.
+        '''
 
-          # print 'window: %f - %f (%f) : %5d' % \
-          #         (t_start, t_stop, t_stop - t_start, cnt)
+        timestamps = dict()
+        for name, sel in selectors.iteritems():
+            timestamps[name] = np.array(self.timestamps(state=sel.get('state'),
+                                                        event=sel.get('event'),
+                                                        time=time, first=first))
 
-            # sampling window completed - store rate of events in sample
-            ret.append([t_stop, cnt / (t_stop - t_start)])
+        times = sweep.rate_times(np.sort(np.concatenate(
+                                 [np.zeros(0)] + timestamps.values())),
+                                 sampling)
 
-        return ret
+        return times[1:], {name: sweep.rate(ts, times)
+                           for name, ts in timestamps.iteritems()}
 
 
     #-------------------------------------------------------------------------------------
     #
     def utilization(self, owner, consumer, resource, 
-        owner_events=None,consumer_events=None):
+        owner_events=None,consumer_events=None, series=False):
         '''
         This method accepts as parameters :
         owner           : The entity name of the owner of the resources
@@ -864,6 +1197,13 @@ class Session(object):
         where `time_n` is represented as `float`, `resource_utilization_n` as
         `int`, and resource_size is the total resources the owner has.
 
+        If `series` is set to `True`, the utilization of each owner is returned
+        as `ra.TimeSeries` instead, i.e., as step function of the used
+        resources, where consumer ranges include their start but not their end
+        time.  The integral of that series is the amount of used resources
+        over time, e.g. in core-seconds.  Owners without consumers have an
+        empty series.
+
 
         Example:
 
@@ -874,85 +1214,182 @@ class Session(object):
                                         {ru.EVENT: 'exec_stop' }])
         '''
         ret = dict()
-        
-        # Filter the session to get a session of the owners. If that is empty return an
-        # empty dict
-        
-        relations = self .describe('relations', [owner, consumer])
+
+        # Get the owner / consumer relations.  If there are none, return an
+        # empty dict.
+        relations = self.describe('relations', [owner, consumer])
         if not relations:
             return dict()
 
-        owners = self.filter(etype=owner, inplace=False)
+        owners = self.get(etype=owner)
         if not owners:
             return dict()
 
-        # Filter the self to get the consumers. If none are found, return an
-        # empty dict.
+        # Collect the ranges of all consumers of all owners, together with the
+        # index of the owner and the consumer's resources, so that the
+        # utilization for all owners can be computed in one sweep.
         #
-        # FIXME: this should return an dict with zero utilization over the full
-        #        time range the resource exist.
+        # FIXME: owners without consumers get a zero utilization, it should
+        #        be over the full time range the resource exist.
         #
-        for owner_entity in owners.get():
-            owner_id        = owner_entity.uid
-            owner_resources = owner_entity.description.get(resource)
-            owner_range     = owner_entity.ranges(event=owner_events)
+        owner_events    = get_range_matcher(event=owner_events)
+        consumer_events = get_range_matcher(event=consumer_events)
 
-            consumers = self.filter(etype=consumer, uid=relations[owner_id],
-                                    inplace=False)
-            if not consumers:
-                util = [0]
+        groups  = list()
+        starts  = list()
+        stops   = list()
+        weights = list()
 
-            else:
-                # Go through the consumer entities and create two dictionaries.
-                # The first keeps track of how many resources each consumer
-                # consumes, and the second has the ranges based on the events.
-                consumer_resources = dict()
-                consumer_ranges    = dict()
-
-                for consumer_entity in consumers.get():
-
-                    ranges  = consumer_entity.ranges(event=consumer_events)
-                    cons_id = consumer_entity.uid
-
-                    consumer_resources[cons_id] = consumer_entity.description.get(resource)
-
-                    # Update consumer_ranges if there is at least one range
-                    consumer_ranges.update({cons_id: ranges}) if len(ranges) != 0 else None
-
-                # Sort consumer_ranges based on their values. This command
-                # returns a dictionary, which is sorted based on the first value
-                # of each entry. In the end the key, are out of order but the
-                # values are.
-                consumer_ranges = sorted(consumer_ranges.iteritems(),
-                                         key=lambda (k,v): (v[0],k))
-
-                # Create a timeseries that contains all moments in consumer
-                # ranges and sort. This way we have a list that has time any
-                # change has happened.
-                times = list()
-                for cons_id,ranges in consumer_ranges:
-                    for r in ranges:
-                        times.append(r[0])
-                        times.append(r[1])
-                times.sort()
-
-                # we have the time sequence, now compute utilization at those points
-                util = list()
-                for t in times:
-                    cnt = 0
-                    for cons_id,ranges in consumer_ranges:
-                        for r in ranges:
-                            if t >= r[0] and t <= r[1]:
-                                cnt += consumer_resources[cons_id]
-
-                    util.append([t, cnt])
-
-            ret[owner_id] = {'range'      : owner_range,
-                             'resources'  : owner_resources,
+        for idx, owner_entity in enumerate(owners):
+
+            for cons_id in relations[owner_entity.uid]:
+
+                consumer_entity = self._entities[cons_id]
+                cons_resources  = consumer_entity.description.get(resource)
+
+                for r in consumer_entity.ranges(event=consumer_events):
+                    groups.append(idx)
+                    starts.append(r[0])
+                    stops.append(r[1])
+                    weights.append(cons_resources)
+
+        if series:
+            utils = [TimeSeries(t, v) for t, v
+                     in sweep.steps(groups, starts, stops, weights, len(owners))]
+        else:
+            utils = sweep.weighted(groups, starts, stops, weights, len(owners))
+
+        for idx, owner_entity in enumerate(owners):
+
+            owner_id = owner_entity.uid
+
+            if relations[owner_id] or series: util = utils[idx]
+            else                            : util = [0]
+
+            ret[owner_id] = {'range'      : owner_entity.ranges(event=owner_events),
+                             'resources'  : owner_entity.description.get(resource),
                              'utilization': util}
         return ret
 
 
+    # --------------------------------------------------------------------------
+    #
+    def resource_accounting(self, owner, consumer, resource,
+                            owner_events=None, consumer_events=None):
+        '''
+        This method accepts the same parameters as `utilization()`, and
+        accounts for the resources of each owner over time, e.g. for the
+        core-seconds of each pilot:
+
+          - available : the resources of the owner, times the length of the
+                        owner's ranges
+          - used      : the integral of the utilization of the owner's
+                        resources by its consumers, limited to the owner's
+                        ranges
+          - idle      : available minus used resources
+
+        If `owner_events` or `consumer_events` are not given, the full time
+        range of the respective entities is used.
+
+        The utilization of all owners is integrated in a single sweep over the
+        range edges of all consumers and owners.  Returned is a dictionary of
+        the form:
+
+            {'owners': {'owner_0': {'range'     : owner_ranges,
+                                    'resources' : resource_size,
+                                    'available' : available,
+                                    'used'      : used,
+                                    'idle'      : idle},
+                        ...},
+             'total' : {'resources' : total_resource_size,
+                        'available' : available,
+                        'used'      : used,
+                        'idle'      : idle}}
+
+        Example:
+
+            p_evt = [{ru.STATE: rp.PMGR_ACTIVE}, {ru.STATE: rp.DONE}]
+            u_evt = [{ru.EVENT: 'exec_start'},   {ru.EVENT: 'exec_stop'}]
+            acc   = session.resource_accounting(owner='pilot', consumer='unit',
+                                                resource='cores',
+                                                owner_events=p_evt,
+                                                consumer_events=u_evt)
+            print 'idle core-hours: %.1f' % (acc['total']['idle'] / 3600)
+        '''
+
+        ret = {'owners': dict(),
+               'total' : {'resources' : 0,
+                          'available' : 0.0,
+                          'used'      : 0.0,
+                          'idle'      : 0.0}}
+
+        owners = self.get(etype=owner)
+        if not owners:
+            return ret
+
+        relations = self.describe('relations', [owner, consumer])
+
+        if owner_events:    owner_events    = get_range_matcher(event=owner_events)
+        if consumer_events: consumer_events = get_range_matcher(event=consumer_events)
+
+        def get_ranges(entity, matcher):
+            if matcher:
+                return entity.ranges(event=matcher, collapse=False)
+            if entity.t_start is None:
+                return []
+            return [entity.t_range]
+
+        # collect the consumer ranges (weighted by the consumer resources) and
+        # the owner ranges (as masks) of all owners, by owner index
+        groups  = list()
+        starts  = list()
+        stops   = list()
+        weights = list()
+        masks   = [list(), list(), list()]
+        ranges  = list()
+        sizes   = list()
+
+        for idx, owner_entity in enumerate(owners):
+
+            rs = RangeSet(get_ranges(owner_entity, owner_events))
+            ranges.append(rs)
+            sizes.append(owner_entity.description.get(resource) or 0)
+
+            masks[0].extend([idx] * len(rs))
+            masks[1].extend(rs.starts.tolist())
+            masks[2].extend(rs.stops.tolist())
+
+            for cons_id in relations.get(owner_entity.uid, []):
+
+                consumer_entity = self._entities[cons_id]
+                cons_resources  = consumer_entity.description.get(resource) or 0
+
+                for r in get_ranges(consumer_entity, consumer_events):
+                    groups.append(idx)
+                    starts.append(r[0])
+                    stops.append(r[1])
+                    weights.append(cons_resources)
+
+        used      = sweep.integrals(groups, starts, stops, weights, len(owners),
+                                    masks=masks)
+        available = np.array([rs.length for rs in ranges]) * np.array(sizes)
+
+        for idx, owner_entity in enumerate(owners):
+            ret['owners'][owner_entity.uid] = {
+                    'range'     : ranges[idx].tolist(),
+                    'resources' : sizes[idx],
+                    'available' : float(available[idx]),
+                    'used'      : float(used[idx]),
+                    'idle'      : float(available[idx] - used[idx])}
+
+        ret['total'] = {'resources' : sum(sizes),
+                        'available' : float(available.sum()),
+                        'used'      : float(used.sum()),
+                        'idle'      : float(available.sum() - used.sum())}
+
+        return ret
+
+
     # --------------------------------------------------------------------------
     #
     def consistency(self, mode=None):
@@ -1028,7 +1465,7 @@ class Session(object):
                 if not sv:
                     if es:
                         self._rep.warn('  %-30s : %s' % (et, es.keys()))
-                        e._consistency['state_model'] = None
+                        e._get_consistency()['state_model'] = None
                     continue
 
                 self._rep.info('  %-30s :' % e.uid)
@@ -1088,8 +1525,9 @@ class Session(object):
 
                     self._rep.ok('+')
 
-                e._consistency['state_model'] = sm_ok
-                e._consistency['log'].extend(sm_log)
+                consistency = e._get_consistency()
+                consistency['state_model'] = sm_ok
+                consistency['log'].extend(sm_log)
 
                 if not sm_ok:
                     ret.append(e.uid)
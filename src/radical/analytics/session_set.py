@@ -0,0 +1,323 @@
+
+import os
+import time
+import psutil
+import multiprocessing as mp
+import multiprocessing.queues
+
+import radical.utils as ru
+
+from .session import Session
+from .        import cache  as rac
+from .        import reader as rar
+
+
+# ------------------------------------------------------------------------------
+#
+# The memory needed to parse a session is estimated as a multiple of the size of
+# its profiles on disk: the event tuples created from the profile lines are
+# considerably larger than the lines themselves.
+#
+MEMORY_FACTOR = 10
+
+# interval (in seconds) in which the parent polls for completed sessions
+POLL_INTERVAL = 0.1
+
+# queue on which the workers report which session they parse in which process
+_started = None
+
+
+# ------------------------------------------------------------------------------
+#
+def _init_worker(started):
+
+    global _started
+    _started = started
+
+
+# ------------------------------------------------------------------------------
+#
+def _is_alive(pid):
+    '''
+    Return `True` if the process with the given pid exists and has not exited.
+    A worker which has exited, but which was not yet reaped by the pool, is
+    a zombie process.
+    '''
+
+    try:
+        return psutil.Process(pid).status() != psutil.STATUS_ZOMBIE
+    except psutil.NoSuchProcess:
+        return False
+
+
+# ------------------------------------------------------------------------------
+#
+def _prepare(src, stype, sid, path):
+    '''
+    Worker side of `SessionSet`: parse a session and write its cache file.  The
+    session entities are not created.  Returns a tuple `[sid, path, error]`.
+    '''
+
+    if _started is not None:
+        _started.put([sid, os.getpid()])
+
+    try:
+        Session(src, stype, sid=sid, columnar=True, cache=path, _init=False)
+
+        if not os.path.isfile(path):
+            return [sid, None, 'no cache written to %s' % path]
+
+        return [sid, path, None]
+
+    except Exception as e:
+        return [sid, None, '%s: %s' % (e.__class__.__name__, e)]
+
+
+# ------------------------------------------------------------------------------
+#
+class SessionSet(object):
+
+    def __init__(self, srcs, stype, workers=None, memory=None, columnar=False,
+                 mmap=False):
+        '''
+        A SessionSet loads a set of sessions of the same type in parallel.
+        `srcs` is a list of session sources as accepted by `ra.Session`, or a
+        dict mapping session IDs to such sources.  For a list, the session IDs
+        are the source names without any tarball suffix.
+
+        The sessions are parsed in a pool of at most `workers` worker processes
+        (default: number of physical cores).  Each worker parses one session
+        and stores it in a session cache file (see the `cache` parameter of
+        `ra.Session`), which is then loaded by the parent process.  Only the
+        cache path is sent back to the parent, and sessions for which a valid
+        cache already exists are not parsed again.
+
+        The number of concurrently parsed sessions is also limited by a memory
+        budget `memory` (in bytes, default: half of the available memory),
+        where the memory needed per session is estimated from the size of its
+        profiles.  One session is always parsed, even if it exceeds the budget.
+
+        `columnar` and `mmap` are passed on to the sessions loaded from the
+        cache files: with `mmap`, those sessions map their columns from the
+        cache files instead of reading them into memory.
+
+        Example:
+
+            sessions = ra.SessionSet(glob.glob('exp1/rp.session.*'),
+                                     'radical.pilot', workers=8)
+            for sid, session in sessions:
+                print sid, session.ttc
+        '''
+
+        if isinstance(srcs, dict):
+            self._srcs = dict(srcs)
+        else:
+            self._srcs = dict()
+            for src in srcs:
+                # as in `ra.Session`, a tarball is named after its session
+                sid = os.path.basename(rar.strip_suffix(src.rstrip('/')))
+                self._srcs[sid] = src
+
+        if not workers:
+            workers = psutil.cpu_count(logical=False) or mp.cpu_count()
+
+        if not memory:
+            memory = psutil.virtual_memory().available / 2
+
+        self._stype    = stype
+        self._workers  = max(1, int(workers))
+        self._memory   = memory
+        self._columnar = columnar
+        self._mmap     = mmap
+        self._caches   = dict()   # sid -> cache path
+        self._errors   = dict()   # sid -> error message
+        self._log      = ru.get_logger('radical.analytics')
+
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def sids(self):
+        return sorted(self._srcs.keys())
+
+    @property
+    def errors(self):
+        return self._errors
+
+    def __len__(self):
+        return len(self._srcs)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _estimate(self, sid):
+
+        src = self._srcs[sid]
+        if not os.path.exists(src):
+            # this will fail in the worker
+            return 0
+
+        if not os.path.isdir(src):
+            return os.path.getsize(src) * MEMORY_FACTOR
+
+        size = 0
+        for root, _, fnames in os.walk(src):
+            for fname in fnames:
+                if fname.endswith('.prof'):
+                    size += os.path.getsize(os.path.join(root, fname))
+
+        return size * MEMORY_FACTOR
+
+
+    # --------------------------------------------------------------------------
+    #
+    def prepare(self):
+        '''
+        Parse all sessions which have not been parsed before, and return a dict
+        of session IDs to cache paths, in the order in which the sessions were
+        completed.  Sessions which failed to parse are listed in `errors`.
+        '''
+
+        for sid, path in self._prepare():
+            pass
+
+        return self._caches
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _prepare(self):
+
+        # largest sessions first, so that the memory budget is used early
+        todo = sorted(self.sids, key=self._estimate, reverse=True)
+        todo = [sid for sid in todo if sid not in self._caches
+                                   and sid not in self._errors]
+        if not todo:
+            return
+
+        sizes   = {sid: self._estimate(sid) for sid in todo}
+        running = dict()  # sid -> [estimated memory, async result]
+        pids    = dict()  # sid -> pid of the worker parsing it
+        started = mp.queues.SimpleQueue()
+        pool    = mp.Pool(min(self._workers, len(todo)),
+                          initializer=_init_worker, initargs=(started,))
+
+        try:
+            while todo or running:
+
+                # start as many sessions as workers and memory budget allow
+                while todo and len(running) < self._workers:
+                    used = sum(size for size, _ in running.values())
+                    sid  = todo[0]
+                    if running and used + sizes[sid] > self._memory:
+                        # pick a smaller session which fits, if any
+                        fits = [s for s in todo
+                                  if used + sizes[s] <= self._memory]
+                        if not fits:
+                            break
+                        sid = fits[0]
+
+                    todo.remove(sid)
+                    src  = self._srcs[sid]
+                    path = rac.get_path(src, sid)
+                    running[sid] = [sizes[sid],
+                                    pool.apply_async(_prepare, (src,
+                                                     self._stype, sid, path))]
+
+                for sid, path, error in self._wait(running, pids, started):
+                    del(running[sid])
+
+                    if error:
+                        self._log.error('cannot load session %s: %s',
+                                        sid, error)
+                        self._errors[sid] = error
+                    else:
+                        self._caches[sid] = path
+                        yield sid, path
+
+        finally:
+            pool.terminate()
+            pool.join()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _wait(self, running, pids, started):
+        '''
+        Wait for at least one of the running sessions to complete, and return
+        the list of `[sid, path, error]` results of all completed sessions.  If
+        the worker process parsing a session died (for example because it was
+        killed when running out of memory), the session can never complete and
+        is returned with an error instead.
+        '''
+
+        while True:
+
+            while not started.empty():
+                sid, pid = started.get()
+                pids[sid] = pid
+
+            # the worker processes are checked before the results, so that
+            # a result which arrives in the meantime is not missed
+            dead = set(sid for sid in running
+                           if sid in pids and not _is_alive(pids[sid]))
+            ret  = list()
+
+            for sid, (_, result) in running.items():
+                if result.ready():
+                    ret.append(result.get())
+                elif sid in dead:
+                    ret.append([sid, None, 'worker process %d died'
+                                           % pids[sid]])
+
+            if ret:
+                return ret
+
+            time.sleep(POLL_INTERVAL)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _load(self, sid, path):
+
+        return Session(self._srcs[sid], self._stype, sid=sid,
+                       columnar=self._columnar, cache=path, mmap=self._mmap)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def get(self, sid):
+        '''
+        Return the session with the given ID, loading it in this process if it
+        has not been prepared yet.
+        '''
+
+        if sid not in self._srcs:
+            raise KeyError('unknown session %s' % sid)
+
+        path = self._caches.get(sid)
+        if not path:
+            path = rac.get_path(self._srcs[sid], sid)
+            self._caches[sid] = path
+
+        return self._load(sid, path)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def __iter__(self):
+        '''
+        Iterate over `[sid, session]` pairs.  Sessions are yielded as soon as
+        they have been parsed by a worker, so that the parent process only ever
+        holds the session it is working on.
+        '''
+
+        for sid, path in self._caches.items():
+            yield sid, self._load(sid, path)
+
+        for sid, path in self._prepare():
+            yield sid, self._load(sid, path)
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,384 @@
+
+import numpy  as np
+import pandas as pd
+
+import radical.utils as ru
+
+
+# ------------------------------------------------------------------------------
+#
+def code_dtype(n):
+    '''
+    return the smallest signed integer type which can hold `n` codes
+    '''
+
+    for dtype in [np.int8, np.int16, np.int32]:
+        if n <= np.iinfo(dtype).max + 1:
+            return dtype
+
+    return np.int64
+
+
+# ------------------------------------------------------------------------------
+#
+class EventStore(object):
+
+    # all event fields but the timestamp are stored as integer codes into
+    # per-field symbol tables
+    CODED = [ru.EVENT, ru.COMP, ru.TID, ru.UID, ru.STATE, ru.MSG, ru.ENTITY]
+
+    # number of events processed at once by operations over all events, which
+    # bounds the size of temporary arrays (see `chunks()`)
+    CHUNK = 1 << 20
+
+    def __init__(self, profile):
+        '''
+        This is a private constructor for a columnar RA event store: it gets
+        a profile (a list of event tuples) and stores it as a set of columns:
+
+          - a `float64` time column
+          - an integer column for every other event field, holding codes into
+            a per-field symbol table.  The columns use the smallest integer
+            type which fits the symbol table, so that names like event and
+            state names take one or two bytes per event.
+
+        Events are grouped by entity uid, and are time sorted within each
+        group.  The uid codes are assigned in group order, so that the events
+        for the entity with uid code `n` are found in the index range
+        `[bounds[n], bounds[n+1])`.
+        '''
+
+        self._symbols = dict()  # field -> list of values
+        self._codes   = dict()  # field -> dict of value -> code
+        self._cols    = dict()  # field -> column array
+        self._bounds  = None    # entity offsets into the columns
+
+        for key in self.CODED:
+            self._symbols[key] = list()
+            self._codes[key]   = dict()
+
+        self._initialize(profile)
+
+
+    # --------------------------------------------------------------------------
+    #
+    @classmethod
+    def from_columns(cls, cols, symbols, bounds):
+        '''
+        Recreate an event store from its columns, symbol tables and entity
+        bounds, as returned by `time`, `column()`, `symbols()` and `bounds`.
+        This is used to restore a store from a session cache.
+        '''
+
+        ret = cls.__new__(cls)
+        ret._cols    = cols
+        ret._symbols = symbols
+        ret._bounds  = bounds
+
+        # the code maps are only recreated when needed
+        ret._codes   = dict()
+
+        return ret
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _initialize(self, profile):
+
+        # encode all events in profile order, so that uid codes are assigned in
+        # order of first appearance
+        for key in self.CODED:
+            encode = self._encode
+            codes  = [encode(key, event[key]) for event in profile]
+            dtype  = code_dtype(len(self._symbols[key]))
+            self._cols[key] = np.array(codes, dtype=dtype)
+
+        self._group(np.array([event[ru.TIME] for event in profile],
+                             dtype=np.float64))
+
+
+    # --------------------------------------------------------------------------
+    #
+    @classmethod
+    def from_frame(cls, frame):
+        '''
+        Create an event store from a `pandas.DataFrame` with one column per
+        event field, labeled by the field indices (`ru.TIME`, `ru.EVENT`, ...),
+        as returned by `reader.read_frames()`.  The columns are encoded with
+        `pandas.factorize()`, so that no event tuples are created.  Missing
+        values (`None` or `NaN`) are stored as empty strings.
+        '''
+
+        ret = cls.__new__(cls)
+        ret._symbols = dict()
+        ret._codes   = dict()
+        ret._cols    = dict()
+        ret._bounds  = None
+
+        # like `_encode()`, `factorize()` assigns codes in order of appearance
+        for key in cls.CODED:
+            codes, symbols = pd.factorize(frame[key].values)
+            symbols        = symbols.tolist()
+
+            # `factorize()` assigns the code `-1` to missing values
+            missing = codes < 0
+            if missing.any():
+                if '' not in symbols:
+                    symbols.append('')
+                codes[missing] = symbols.index('')
+
+            ret._symbols[key] = symbols
+            ret._cols[key]    = codes.astype(code_dtype(len(symbols)))
+
+        ret._group(frame[ru.TIME].values.astype(np.float64))
+
+        return ret
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _group(self, times):
+
+        # group events by uid code, and sort them by time within each group,
+        # in a single stable sort.  Profiles are usually time sorted already,
+        # and then grouping is all we need to do.
+        uids = self._cols[ru.UID]
+        if np.all(times[1:] >= times[:-1]):
+            order = np.argsort(uids, kind='mergesort')
+        else:
+            order = np.lexsort((times, uids))
+
+        self._cols[ru.TIME] = times[order]
+        for key in self.CODED:
+            self._cols[key] = self._cols[key][order]
+
+        n_uids       = len(self._symbols[ru.UID])
+        self._bounds = np.searchsorted(self._cols[ru.UID],
+                                       np.arange(n_uids + 1)).astype(np.int64)
+
+
+    # --------------------------------------------------------------------------
+    #
+    @classmethod
+    def intern(cls, profile):
+        '''
+        Return the given profile, where all equal values of the coded fields
+        are replaced by one and the same object, taken from a per-field symbol
+        table.  This is used for sessions which keep event tuples: repeated
+        names are then only stored once, and comparing a name with its symbol
+        is an identity check.  Events which are lists are changed in place.
+        '''
+
+        symbols = [dict() for _ in range(ru.PROF_KEY_MAX)]
+        ret     = list()
+
+        for event in profile:
+
+            fields = event if isinstance(event, list) else list(event)
+
+            for key in cls.CODED:
+                val = fields[key]
+                try:
+                    fields[key] = symbols[key].setdefault(val, val)
+                except TypeError:
+                    # unhashable values are kept as they are
+                    pass
+
+            if fields is event: ret.append(event)
+            else              : ret.append(tuple(fields))
+
+        return ret
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _encode(self, key, value):
+
+        codes = self._code_map(key)
+        code  = codes.get(value)
+        if code is None:
+            code = len(self._symbols[key])
+            codes[value] = code
+            self._symbols[key].append(value)
+        return code
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _code_map(self, key):
+
+        if key not in self._codes:
+            self._codes[key] = {v: c for c, v in enumerate(self._symbols[key])}
+        return self._codes[key]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def __len__(self):
+
+        return len(self._cols[ru.TIME])
+
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def time(self):
+        return self._cols[ru.TIME]
+
+    def column(self, key):
+        return self._cols[key]
+
+    def symbols(self, key):
+        return self._symbols[key]
+
+    @property
+    def bounds(self):
+        return self._bounds
+
+    def code(self, key, value):
+        '''
+        return the code for a field value, or `None` if that value never
+        occurs in the store.
+        '''
+        try:
+            return self._code_map(key).get(value)
+        except TypeError:
+            # unhashable values never match anything
+            return None
+
+
+    # --------------------------------------------------------------------------
+    #
+    def chunks(self):
+        '''
+        Iterate over slices of at most `CHUNK` events which cover the store.
+        Operations over all events work chunk by chunk, so that they need
+        little memory for temporary arrays, and, for a store backed by
+        a memory mapped cache file, only map a part of the file at a time.
+        '''
+
+        for start in xrange(0, len(self), self.CHUNK):
+            yield slice(start, min(start + self.CHUNK, len(self)))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def entities(self):
+        '''
+        Iterate over all entities in the store, yielding tuples of
+
+            (uid, etype, slice)
+
+        where `slice` selects the entity's events in all columns.
+        '''
+
+        uids    = self._symbols[ru.UID]
+        etypes  = self._symbols[ru.ENTITY]
+        ecol    = self._cols[ru.ENTITY]
+        bounds  = self._bounds.tolist()
+
+        for code, uid in enumerate(uids):
+            start = bounds[code]
+            stop  = bounds[code + 1]
+            yield uid, etypes[ecol[start]], slice(start, stop)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def events(self, rng):
+        '''
+        return the events in the given slice as list of event tuples
+        '''
+
+        cols = [self._cols[ru.TIME][rng].tolist()]
+        for key in range(1, ru.PROF_KEY_MAX):
+            sym = self._symbols[key]
+            cols.append([sym[c] for c in self._cols[key][rng].tolist()])
+
+        return zip(*cols)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def event(self, idx):
+        '''
+        return the event at the given index as event tuple
+        '''
+
+        ret = [float(self._cols[ru.TIME][idx])]
+        for key in range(1, ru.PROF_KEY_MAX):
+            ret.append(self._symbols[key][self._cols[key][idx]])
+
+        return tuple(ret)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def names(self, key, rng):
+        '''
+        return the decoded values of a field for the given slice
+        '''
+
+        sym = self._symbols[key]
+        return [sym[c] for c in self._cols[key][rng].tolist()]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def states(self, rng):
+        '''
+        return a dict of state names to state transition events for the given
+        slice.  Like in `Entity._initialize()`, a later transition into the same
+        state overwrites an earlier one.
+        '''
+
+        ret  = dict()
+        code = self.code(ru.EVENT, 'state')
+        if code is None:
+            return ret
+
+        sym  = self._symbols[ru.STATE]
+        scol = self._cols[ru.STATE]
+        mask = self._cols[ru.EVENT][rng] == code
+        for idx in (np.flatnonzero(mask) + rng.start).tolist():
+            ret[sym[scol[idx]]] = self.event(idx)
+
+        return ret
+
+
+    # --------------------------------------------------------------------------
+    #
+    def match(self, cond, rng):
+        '''
+        Return a boolean mask over the given slice, marking all events which
+        match the given condition.  The condition is an event tuple where all
+        fields which are `None` are ignored.
+        '''
+
+        size = rng.stop - rng.start
+        ret  = np.ones(size, dtype=bool)
+
+        if not isinstance(cond, (tuple, list)):
+            # conditions which are not event tuples never match
+            return np.zeros(size, dtype=bool)
+
+        for key, val in enumerate(cond[:ru.PROF_KEY_MAX]):
+
+            if val is None:
+                continue
+
+            if key == ru.TIME:
+                ret &= self._cols[ru.TIME][rng] == val
+                continue
+
+            code = self.code(key, val)
+            if code is None:
+                return np.zeros(size, dtype=bool)
+
+            ret &= self._cols[key][rng] == code
+
+        return ret
+
+
+# ------------------------------------------------------------------------------
+
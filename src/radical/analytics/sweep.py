@@ -0,0 +1,300 @@
+
+import numpy as np
+
+
+# ------------------------------------------------------------------------------
+#
+# Sweep-line helpers for time series over sets of ranges.  A range `[start,
+# stop]` is considered to contain all times `t` with `start <= t <= stop`.
+# Instead of checking every time point against every range, the range edges
+# are sorted once, and the number of ranges containing `t` is derived from the
+# number of edges before `t`:
+#
+#     count(t) = #(starts <= t) - #(stops < t)
+#
+# ------------------------------------------------------------------------------
+#
+def to_edges(ranges):
+    '''
+    split a list of `[start, stop]` pairs into two sorted arrays of start and
+    stop times.
+    '''
+
+    if not len(ranges):
+        return np.zeros(0), np.zeros(0)
+
+    ranges = np.asarray(ranges, dtype=np.float64).reshape(-1, 2)
+
+    return np.sort(ranges[:, 0]), np.sort(ranges[:, 1])
+
+
+# ------------------------------------------------------------------------------
+#
+def sample_times(t_min, t_max, sampling):
+    '''
+    Return a regular grid of sampling points, starting at `t_min`, with the last
+    point being the first one at or after `t_max`.  The grid is computed from an
+    integer sample index, so that no rounding errors accumulate.
+    '''
+
+    n = int(np.ceil((t_max - t_min) / float(sampling)))
+
+    return t_min + np.arange(max(n, 0) + 1) * float(sampling)
+
+
+# ------------------------------------------------------------------------------
+#
+def count(starts, stops, times):
+    '''
+    For sorted arrays of range start and stop times, return an array holding the
+    number of ranges which contain each of the given times.
+    '''
+
+    times = np.asarray(times, dtype=np.float64)
+
+    return np.searchsorted(starts, times, side='right') \
+         - np.searchsorted(stops,  times, side='left')
+
+
+# ------------------------------------------------------------------------------
+#
+def concurrency(ranges, sampling=None):
+    '''
+    Return a `[[time, count], ...]` time series for the given ranges.  Without
+    `sampling`, the series contains one entry for each range edge, otherwise
+    the ranges are sampled at regular intervals (see `sample_times()`).
+    '''
+
+    if not len(ranges):
+        return []
+
+    starts, stops = to_edges(ranges)
+
+    if sampling:
+        times = sample_times(starts[0], stops[-1], sampling)
+    else:
+        times = np.sort(np.concatenate([starts, stops]))
+
+    counts = count(starts, stops, times)
+
+    return [[t, c] for t, c in zip(times.tolist(), counts.tolist())]
+
+
+# ------------------------------------------------------------------------------
+#
+def weighted(groups, starts, stops, weights, n_groups):
+    '''
+    Compute weighted concurrency time series for several independent groups of
+    ranges in a single pass.  Range `i` belongs to group `groups[i]` (an integer
+    in `[0, n_groups)`), spans `[starts[i], stops[i]]`, and contributes
+    `weights[i]` while active.  For each group, the series is evaluated at all
+    edges of the group's ranges, and a list of `[[time, value], ...]` series is
+    returned, one per group.
+
+    All range edges and sampling points are sorted by group, time and edge type
+    at once, where starts sort before sampling points at the same time, and
+    stops after them.  A cumulative sum over the edge weights then yields the
+    (inclusive) value at each sampling point.  As the sum for each group
+    returns to zero at the end of the group, one global sum serves all groups.
+    '''
+
+    groups  = np.asarray(groups,  dtype=np.int64)
+    starts  = np.asarray(starts,  dtype=np.float64)
+    stops   = np.asarray(stops,   dtype=np.float64)
+    weights = np.asarray(weights)
+
+    n     = len(starts)
+    zeros = np.zeros(n, dtype=weights.dtype)
+
+    group = np.concatenate([groups,  groups, groups, groups])
+    time  = np.concatenate([starts,  starts, stops,  stops ])
+    kind  = np.concatenate([np.zeros(n), np.ones(n), np.ones(n), np.ones(n) * 2])
+    delta = np.concatenate([weights, zeros,  zeros,  -weights])
+
+    order  = np.lexsort((kind, time, group))
+    values = np.cumsum(delta[order])
+    query  = kind[order] == 1
+
+    group  = group[order][query]
+    time   = time[order][query].tolist()
+    values = values[query].tolist()
+
+    bounds = np.searchsorted(group, np.arange(n_groups + 1)).tolist()
+
+    return [[[t, v] for t, v in zip(time[bounds[g]:bounds[g + 1]],
+                                     values[bounds[g]:bounds[g + 1]])]
+            for g in range(n_groups)]
+
+
+# ------------------------------------------------------------------------------
+#
+def steps(groups, starts, stops, weights, n_groups):
+    '''
+    Like `weighted()`, but return the weighted concurrency of each group as
+    step function: a list of `[times, values]` array pairs, one per group,
+    where `values[i]` is the summed weight of the group's ranges with
+    `start <= t < stop` for all `t` in `[times[i], times[i+1])`.  The last
+    value of each group is zero.
+
+    All range edges are sorted by group and time at once, and a cumulative sum
+    over the edge weights yields the values, where only the last value per
+    group and time is kept.
+    '''
+
+    groups  = np.asarray(groups,  dtype=np.int64)
+    starts  = np.asarray(starts,  dtype=np.float64)
+    stops   = np.asarray(stops,   dtype=np.float64)
+    weights = np.asarray(weights)
+
+    group  = np.concatenate([groups,  groups  ])
+    time   = np.concatenate([starts,  stops   ])
+    delta  = np.concatenate([weights, -weights])
+
+    if not len(time):
+        return [[np.zeros(0), np.zeros(0, dtype=weights.dtype)]
+                for g in range(n_groups)]
+
+    order  = np.lexsort((time, group))
+    group  = group[order]
+    time   = time[order]
+    values = _group_cumsum(group, delta[order])
+
+    last   = np.ones(len(time), dtype=bool)
+    last[:-1] = (group[1:] != group[:-1]) | (time[1:] != time[:-1])
+
+    group  = group[last]
+    time   = time[last]
+    values = values[last]
+
+    bounds = np.searchsorted(group, np.arange(n_groups + 1)).tolist()
+
+    return [[time[bounds[g]:bounds[g + 1]], values[bounds[g]:bounds[g + 1]]]
+            for g in range(n_groups)]
+
+
+# ------------------------------------------------------------------------------
+#
+def integrals(groups, starts, stops, weights, n_groups, masks=None):
+    '''
+    Return an array with the integral of the weighted concurrency of each group
+    (see `steps()`), e.g. the core-seconds used by the units of each pilot.
+
+    If `masks` is given as a tuple of `(groups, starts, stops)` arrays, the
+    integral of each group is limited to the union of the mask ranges of the
+    same group, e.g. to the times when each pilot was active.
+
+    The range edges and mask edges of all groups are sorted at once, and the
+    cumulative sums over the edge weights and the mask edges yield the
+    weighted concurrency and the mask state between any two consecutive edges.
+    The integrals are then summed up per group.
+    '''
+
+    if masks is None:
+        masks = [[], [], []]
+
+    groups  = np.asarray(groups,  dtype=np.int64)
+    starts  = np.asarray(starts,  dtype=np.float64)
+    stops   = np.asarray(stops,   dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+
+    m_groups = np.asarray(masks[0], dtype=np.int64)
+    m_starts = np.asarray(masks[1], dtype=np.float64)
+    m_stops  = np.asarray(masks[2], dtype=np.float64)
+
+    n      = len(starts)
+    m      = len(m_starts)
+
+    group  = np.concatenate([groups,  groups,   m_groups, m_groups])
+    time   = np.concatenate([starts,  stops,    m_starts, m_stops ])
+    delta  = np.concatenate([weights, -weights, np.zeros(2 * m)])
+    mask   = np.concatenate([np.zeros(2 * n, dtype=np.int64),
+                             np.ones(m, dtype=np.int64),
+                             -np.ones(m, dtype=np.int64)])
+
+    if not len(time):
+        return np.zeros(n_groups)
+
+    order  = np.lexsort((time, group))
+    group  = group[order]
+    time   = time[order]
+    values = _group_cumsum(group, delta[order])
+
+    # the value after each edge holds until the next edge of the same group
+    dt     = np.diff(time)
+    dt[group[1:] != group[:-1]] = 0.0
+
+    if m: active = np.cumsum(mask[order])[:-1] > 0
+    else: active = True
+
+    return np.bincount(group[:-1], weights=values[:-1] * dt * active,
+                       minlength=n_groups)
+
+
+# ------------------------------------------------------------------------------
+#
+def _group_cumsum(group, delta):
+    '''
+    Return the cumulative sum over `delta`, restarted for each group in the
+    sorted `group` array.  The deltas of each group sum up to zero, but for
+    float weights rounding errors would carry over to the next group, so the
+    sum before each group is subtracted.
+    '''
+
+    values = np.cumsum(delta)
+    first  = np.flatnonzero(np.append(True, group[1:] != group[:-1]))
+    base   = values[first - 1]
+    base[0] = 0
+
+    return values - np.repeat(base, np.diff(np.append(first, len(group))))
+
+
+# ------------------------------------------------------------------------------
+#
+def rate_times(timestamps, sampling=None):
+    '''
+    Return the sorted, unique sampling points for a rate over the given sorted
+    timestamps.  Without `sampling`, those are the timestamps themselves.
+    Otherwise, the sampling points are a regular grid starting at the first
+    timestamp, where the last point is replaced by the last timestamp.
+    '''
+
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+
+    if not len(timestamps):
+        return timestamps
+
+    if not sampling:
+        return np.unique(timestamps)
+
+    t_min = timestamps[0]
+    t_max = timestamps[-1]
+    times = sample_times(t_min, t_max, sampling)
+
+    return np.unique(np.append(times[times < t_max], t_max))
+
+
+# ------------------------------------------------------------------------------
+#
+def rate(timestamps, times):
+    '''
+    For sorted timestamps and sorted, unique sampling points `times`, return
+    the rate of timestamps in each sampling window `(times[i-1], times[i]]`,
+    as array of length `len(times) - 1`.  The first window also counts all
+    timestamps at or before `times[0]`.
+    '''
+
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    times      = np.asarray(times,      dtype=np.float64)
+
+    if len(times) < 2:
+        return np.zeros(0)
+
+    counts     = np.searchsorted(timestamps, times, side='right')
+    cnt        = np.diff(counts)
+    cnt[0]    += counts[0]
+
+    return cnt / np.diff(times)
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,13 @@
+import os
+
+
+# The module VERSION file is created by setup.py on installation, and is needed
+# by `radical.analytics` to determine its version at import time.  When testing
+# from a source tree, create it from the top level VERSION file.
+root    = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+version = '%s/src/radical/analytics/VERSION' % root
+
+if not os.path.isfile(version):
+    with open('%s/VERSION' % root, 'r') as f_in:
+        with open(version, 'w') as f_out:
+            f_out.write(f_in.readline().strip() + '\n')
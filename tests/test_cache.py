@@ -0,0 +1,104 @@
+import os
+import pytest
+import radical.utils as ru
+import radical.analytics.cache as rac
+from radical.analytics import Session, EventStore
+
+from .test_session import PROFILE
+
+
+@pytest.fixture
+def profile(tmpdir):
+    """Fixture to write the example profile into a temporary directory"""
+    path = tmpdir.join('agent_0.prof')
+    path.write(PROFILE)
+    return str(path)
+
+
+def no_parsing(*args, **kwargs):
+    raise AssertionError('profile should not be parsed')
+
+
+class TestCache(object):
+
+    def test_path(self, profile):
+        """Test the default cache location"""
+        assert (rac.get_path(profile, 'agent_0.prof') ==
+                '%s%s' % (profile, rac.SUFFIX))
+
+        path = os.path.dirname(profile)
+        assert (rac.get_path(path, 'rp.session.0000') ==
+                '%s/rp.session.0000%s' % (os.path.dirname(path), rac.SUFFIX))
+
+    @pytest.mark.parametrize('columnar', [False, True])
+    def test_reload(self, profile, monkeypatch, columnar):
+        """Test that a session is restored from the cache"""
+        s1 = Session(profile, 'radical.prof', columnar=columnar, cache=True)
+        assert (os.path.isfile(rac.get_path(profile, s1.uid)))
+
+        monkeypatch.setattr(ru, 'read_profiles', no_parsing)
+        s2 = Session(profile, 'radical.prof', columnar=columnar, cache=True)
+
+        assert (s2.describe() == s1.describe())
+        assert (s2.describe('statistics') == s1.describe('statistics'))
+        for uid in s1.list('uid'):
+            e1 = s1.get(uid=uid)[0]
+            e2 = s2.get(uid=uid)[0]
+            assert ([tuple(e) for e in e2.events] ==
+                    [tuple(e) for e in e1.events])
+            assert (e2.etype == e1.etype)
+
+    def test_invalidate(self, profile, monkeypatch):
+        """Test that a changed source invalidates the cache"""
+        Session(profile, 'radical.prof', cache=True)
+
+        with open(profile, 'a') as f:
+            f.write('110.0,exec_start,agent_0,MainThread,unit.000002,,\n')
+
+        key = rac.get_key(profile, 'radical.prof', 'agent_0.prof')
+        assert (rac.load(rac.get_path(profile, 'agent_0.prof'), key) is None)
+
+        s = Session(profile, 'radical.prof', cache=True)
+        assert ('unit.000002' in s.list('uid'))
+
+    def test_explicit_path(self, profile, tmpdir):
+        """Test a cache at a given location"""
+        path = str(tmpdir.join('cache', 'session.cache'))
+        os.makedirs(os.path.dirname(path))
+
+        Session(profile, 'radical.prof', cache=path)
+        assert (os.path.isfile(path))
+        assert (not os.path.isfile(rac.get_path(profile, 'agent_0.prof')))
+
+    def test_mmap(self, profile, monkeypatch):
+        """Test that a mapped session behaves like a columnar one"""
+        # use small chunks, so that store scans span several chunks
+        monkeypatch.setattr(EventStore, 'CHUNK', 3)
+
+        s_col = Session(profile, 'radical.prof', columnar=True)
+        for _ in range(2):
+            s_map = Session(profile, 'radical.prof', mmap=True)
+            assert (os.path.isfile(rac.get_path(profile, s_map.uid)))
+            assert (not s_map._store.time.flags.owndata)
+            assert (not s_map._store.time.flags.writeable)
+
+            assert (s_map.describe('statistics') ==
+                    s_col.describe('statistics'))
+            for uid in s_col.list('uid'):
+                assert (s_map.entity(uid).events == s_col.entity(uid).events)
+
+            event = [{ru.EVENT: 'exec_start'}, {ru.EVENT: 'exec_stop'}]
+            assert (s_map.duration(event=event) == s_col.duration(event=event))
+            assert (s_map.concurrency(event=event) ==
+                    s_col.concurrency(event=event))
+            assert (s_map.rate(state='DONE', sampling=1.0) ==
+                    s_col.rate(state='DONE', sampling=1.0))
+            assert (s_map.ranges(state=['AGENT_EXECUTING', 'DONE']) ==
+                    s_col.ranges(state=['AGENT_EXECUTING', 'DONE']))
+            assert (sorted(e.uid for e in s_map.get(event='exec_start')) ==
+                    ['unit.000000', 'unit.000001'])
+            assert (s_map.state_matrix('unit').equals(
+                    s_col.state_matrix('unit')))
+
+            units = s_map.filter(etype='unit', inplace=False)
+            assert (units.t_range == [2.0, 7.0])
@@ -1,5 +1,7 @@
 import os
+import sys
 import json
+import pickle
 import pytest
 import radical.utils as ru
 from radical.analytics.entity import Entity
@@ -176,6 +178,19 @@ class TestEntity(object):
         assert (type(e.cfg) is dict)
         assert (e.cfg == pilot_entity['details']['cfg'])
 
+    def test_cfg_shared_details(self, pilot_entity):
+        """Test that details without cfg are not modified"""
+        details = dict(pilot_entity['details'])
+        del(details['cfg'])
+        e = Entity(_uid=pilot_entity['uid'],
+                   _etype=pilot_entity['etype'],
+                   _profile=pilot_entity['events'],
+                   _details=details
+                   )
+
+        assert (e.cfg == {'hostid': details['hostid']})
+        assert ('cfg' not in details)
+
     def test_consistency(self, pilot_entity):
         """Test a valid consistency"""
         e = Entity(_uid=pilot_entity['uid'],
@@ -205,6 +220,55 @@ class TestEntity(object):
         # as the order seen above...
         assert (e.as_dict() == expected)
 
+    def test_compact(self, pilot_entity):
+        """Test that entities have no instance dict, and can be pickled"""
+        e = Entity(_uid=pilot_entity['uid'],
+                   _etype=pilot_entity['etype'],
+                   _profile=pilot_entity['events'],
+                   _details=pilot_entity['details']
+                   )
+
+        assert (not hasattr(e, '__dict__'))
+        assert (e._consistency is None)
+        assert (e._state_dict  is None)
+
+        # compare against the former representation: an instance dict, an
+        # eagerly built states dict, and an eagerly allocated consistency
+        # dict.  The event list itself is the same in both.
+        class OldEntity(object):
+            pass
+        old = OldEntity()
+        old.__dict__.update({
+            '_uid'        : e._uid,
+            '_etype'      : e._etype,
+            '_details'    : e._details,
+            '_description': e._description,
+            '_cfg'        : e._cfg,
+            '_states'     : get_states(pilot_entity['events']),
+            '_events'     : e._events,
+            '_consistency': {'log'        : list(),
+                             'state_model': None,
+                             'event_model': None,
+                             'timestamps' : None},
+            '_t_start'    : e._t_start,
+            '_t_stop'     : e._t_stop,
+            '_ttc'        : e.ttc})
+
+        old_size = sys.getsizeof(old) + sys.getsizeof(old.__dict__) \
+                 + sys.getsizeof(old._states) \
+                 + sys.getsizeof(old._consistency) \
+                 + sys.getsizeof(old._consistency['log'])
+        new_size = sys.getsizeof(e) + sys.getsizeof(e._states)
+
+        assert (new_size * 8 < old_size)
+
+        # the state dict is built once, on first use
+        assert (e.states is e.states)
+
+        e2 = pickle.loads(pickle.dumps(e))
+        assert (e2.as_dict() == e.as_dict())
+        assert (e2.ttc == e.ttc)
+
 
 ##############################################################
 # Test Ranges Method: expand=False, collapse=True
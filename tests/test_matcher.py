@@ -0,0 +1,56 @@
+import pytest
+import radical.utils as ru
+from radical.analytics import EventMatcher, RangeMatcher
+
+from .test_store import range_entity, make_entities
+
+
+def brute_match(cond, event):
+    """Match an event against a condition dict field by field"""
+    return all(event[k] == v for k, v in cond.items() if v is not None)
+
+
+class TestMatcher(object):
+
+    def test_match(self, range_entity):
+        """Test that compiled conditions match like field-wise comparison"""
+        events = range_entity['events']
+        conds  = [{ru.EVENT: 'put'},
+                  {ru.EVENT: 'state', ru.STATE: 'PMGR_LAUNCHING'},
+                  {ru.EVENT: 'sync_rel', ru.STATE: None},
+                  {ru.STATE: 'PMGR_ACTIVE_PENDING'},
+                  {ru.EVENT: 'no_such_event'}]
+
+        for cond in conds:
+            matcher = EventMatcher(cond)
+            assert (bool(matcher))
+            assert ([matcher.match(e) for e in events] ==
+                    [brute_match(cond, e) for e in events])
+
+        matcher = EventMatcher(conds)
+        assert ([matcher.match(e) for e in events] ==
+                [any(brute_match(c, e) for c in conds) for e in events])
+
+        assert (not EventMatcher())
+        assert (not EventMatcher(['AAA']))
+
+    def test_entity(self, range_entity):
+        """Test precompiled matchers on profile and store based entities"""
+        e_prof, e_store = make_entities(range_entity)
+
+        state   = ['PMGR_LAUNCHING', 'PMGR_ACTIVE_PENDING']
+        event   = [{ru.EVENT: 'put'}, {ru.EVENT: 'sync_rel'}]
+        r_state = RangeMatcher(state=state)
+        r_event = RangeMatcher(event=event)
+        e_event = EventMatcher(event)
+
+        for entity in [e_prof, e_store]:
+            assert (entity.ranges(event=r_state) ==
+                    e_prof.ranges(state=state))
+            assert (entity.ranges(event=r_event, expand=True) ==
+                    e_prof.ranges(event=event, expand=True))
+            assert (entity.timestamps(event=e_event) ==
+                    e_prof.timestamps(event=event))
+
+        with pytest.raises(ValueError):
+            e_store.ranges(event=RangeMatcher())
@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+import radical.utils as ru
+from radical.analytics import Session, RangeSet
+
+from .test_session import PROFILE, profile
+
+
+@pytest.fixture
+def random_ranges():
+    """Fixture to create a set of random, overlapping ranges"""
+    rng    = np.random.RandomState(42)
+    starts = rng.uniform(0, 100, 200).round(1)
+    stops  = starts + rng.uniform(0.1, 5, 200).round(1)
+    return np.column_stack([starts, stops]).tolist()
+
+
+def covered(ranges, times):
+    """Check a list of times against a list of ranges, one by one"""
+    return [ru.in_range(t, ranges) for t in times]
+
+
+class TestRangeSet(object):
+
+    def test_collapse(self, random_ranges):
+        """Test collapsing against ru.collapse_ranges"""
+        rs = RangeSet(random_ranges)
+        expected = sorted(ru.collapse_ranges([list(r) for r in random_ranges]))
+
+        assert (rs.tolist() == expected)
+        assert (np.all(rs.starts[1:] > rs.stops[:-1]))
+        assert (RangeSet([[3, 4], [1, 2], [2, 3], [6, 6]]) ==
+                [[1.0, 4.0], [6.0, 6.0]])
+        assert (RangeSet([[1, 2], [1.5, 1.5]]) == [[1.0, 2.0]])
+        assert (not RangeSet())
+
+    def test_sequence(self):
+        """Test that a range set can be used as list of ranges"""
+        rs = RangeSet([[1.0, 2.0], [3.0, 5.0]])
+
+        assert (len(rs) == 2)
+        assert (rs[1] == [3.0, 5.0])
+        assert (list(rs) == [[1.0, 2.0], [3.0, 5.0]])
+        assert (RangeSet(rs) == rs)
+        assert (rs.length == 3.0)
+        assert (rs.t_range == [1.0, 5.0])
+        assert (rs.lengths.tolist() == [1.0, 2.0])
+
+    def test_algebra(self, random_ranges):
+        """Test set operations against point wise containment"""
+        a = RangeSet(random_ranges[:100])
+        b = RangeSet(random_ranges[100:])
+        t = np.linspace(-1, 110, 5001)
+
+        in_a = covered(a.tolist(), t)
+        in_b = covered(b.tolist(), t)
+
+        union = a | b
+        inter = a & b
+        diff  = a - b
+
+        assert (union.contains(t).tolist() ==
+                [x or y for x, y in zip(in_a, in_b)])
+        assert (inter.contains(t).tolist() ==
+                [x and y for x, y in zip(in_a, in_b)])
+
+        # differences keep the edges of the subtracted ranges
+        on_edge = np.isin(t, np.concatenate([b.starts, b.stops]))
+        assert ((diff.contains(t) | on_edge).tolist() ==
+                [(x and not y) or e
+                 for x, y, e in zip(in_a, in_b, on_edge)])
+
+        assert (abs(union.length + inter.length - a.length - b.length) < 1e-9)
+        assert (abs(diff.length + inter.length - a.length) < 1e-9)
+
+    def test_edges(self):
+        """Test operations on touching and empty ranges"""
+        a = RangeSet([[0.0, 2.0], [4.0, 6.0]])
+
+        assert ((a & [[2.0, 4.0]]) == [[2.0, 2.0], [4.0, 4.0]])
+        assert ((a - [[2.0, 4.0]]) == [[0.0, 2.0], [4.0, 6.0]])
+        assert ((a - [[1.0, 5.0]]) == [[0.0, 1.0], [5.0, 6.0]])
+        assert ((a - a) == [])
+        assert ((a - [[1.0, 1.0]]) == a)
+        assert ((a | []) == a)
+        assert ((a & []) == [])
+        assert (a.clip(1.0, 5.0) == [[1.0, 2.0], [4.0, 5.0]])
+        assert (a.clip(2.5, 3.5) == [])
+        assert (a.contains(2.0) and not a.contains(3.0))
+        assert (not RangeSet().contains(1.0))
+
+    def test_session(self, profile):
+        """Test range sets as parameters of session methods"""
+        session = Session(profile, 'radical.prof')
+        event   = [{ru.EVENT: 'exec_start'}, {ru.EVENT: 'exec_stop'}]
+        ranges  = RangeSet(session.ranges(event=event))
+
+        assert (ranges == [[2.5, 6.0]])
+        assert (session.duration(ranges=ranges) == 3.5)
+        assert (session.duration(event=event, time=RangeSet([[3.0, 4.0]])) ==
+                1.0)
+        assert (session.get(uid='unit.000000')[0].duration(
+                ranges=[[2.5, 4.0], [3.0, 3.5]]) == 1.5)
+
+        # explicit empty ranges have no duration
+        unit = session.get(uid='unit.000000')[0]
+        for empty in [[], RangeSet()]:
+            assert (session.duration(ranges=empty) == 0.0)
+            assert (unit.duration(ranges=empty) == 0.0)
+        with pytest.raises(ValueError):
+            unit.duration(event=[{ru.EVENT: 'no_such_event'},
+                                 {ru.EVENT: 'exec_stop'}])
+        assert (session.timestamps(state='DONE', time=[[5.0, 7.0]]) ==
+                [5.0, 7.0])
+        assert (sorted(e.uid for e in session.get(event='exec_stop',
+                                                  time=RangeSet([[0, 5]]))) ==
+                ['unit.000000'])
@@ -0,0 +1,276 @@
+import os
+import tarfile
+import pytest
+import pandas as pd
+import radical.utils as ru
+import radical.analytics.reader as rar
+from radical.analytics import Session
+
+from .test_session import PROFILE, profile
+
+
+# A session with profiles in the legacy format, with 6 fields per line
+BARRIER = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       'barrier_data', 'rp.session.two.jdakka.017395.0000')
+
+# A profile with short, long and invalid lines
+RAGGED = """\
+#time,event,comp,thread,uid,state,msg
+100.0,sync_abs,agent_0,MainThread,,,host:1.2.3.4:100.0:100.0:ntp
+101.0,advance,agent_0,MainThread,pilot.0000,PMGR_ACTIVE,
+102.0,exec_start,agent_0,MainThread,unit.000000,,,too,many
+102.5,exec_stop,agent_0,MainThread,unit.000000,,msg,
+nan,exec_start,agent_0,MainThread,unit.000000,,
+103.0,exec_stop,agent_0
+104.0,advance,agent_0,MainThread,pilot.0000,DONE
+"""
+
+
+# Two profiles of the same session: the second one is synchronized via
+# a `sync_rel` event to the first one
+PROFILES = {'agent_0.prof': """\
+#time,event,comp,thread,uid,state,msg
+100.0,sync_abs,agent_0,MainThread,,,host:1.2.3.4:100.0:99.5:ntp
+100.5,sync_rel,agent_0,MainThread,,,rel1
+101.0,advance,agent_0,MainThread,pilot.0000,PMGR_ACTIVE,
+108.0,advance,agent_0,MainThread,pilot.0000,DONE,
+109.0,END,agent_0,MainThread,,,
+""", 'exec.prof': """\
+#time,event,comp,thread,uid,state,msg
+10.0,sync_rel,exec,MainThread,,,rel1
+12.0,advance,exec,MainThread,unit.000000,AGENT_EXECUTING,
+11.0,exec_start,exec,MainThread,unit.000000,,
+14.0,advance,exec,MainThread,unit.000000,DONE,
+15.0,END,exec,MainThread,,,
+"""}
+
+
+@pytest.fixture
+def profiles(tmpdir):
+    """Fixture to write the example profiles into a session directory"""
+    sdir = tmpdir.mkdir('rp.session.0001')
+    for name, content in PROFILES.items():
+        sdir.join(name).write(content)
+    return str(sdir)
+
+
+@pytest.fixture(params=['gz', 'bz2'])
+def tarball(request, tmpdir):
+    """Fixture to write the example profile into a session tarball"""
+    sdir = tmpdir.mkdir('src').mkdir('rp.session.0000')
+    sdir.join('agent_0.prof').write(PROFILE)
+
+    suffix = {'gz': 'tgz', 'bz2': 'tbz'}[request.param]
+    path   = str(tmpdir.mkdir('tgt').join('rp.session.0000.%s' % suffix))
+    with tarfile.open(path, 'w:%s' % request.param) as tf:
+        tf.add(str(sdir), arcname='rp.session.0000')
+
+    return path
+
+
+class TestReader(object):
+
+    def test_suffix(self):
+        """Test detection and removal of tarball suffixes"""
+        assert (rar.is_tarball('a/b.tar.bz2'))
+        assert (rar.is_tarball('b.tgz'))
+        assert (not rar.is_tarball('b.prof'))
+        assert (rar.strip_suffix('a/b.tar.gz') == 'a/b')
+        assert (rar.strip_suffix('a/b.prof') == 'a/b.prof')
+
+    def test_read_profile(self):
+        """Test that profile lines are parsed like ru.read_profiles does"""
+        rows = rar.read_profile(PROFILE.splitlines(), 'agent_0', 'sid')
+
+        assert (len(rows) == 12)
+        assert (rows[0][ru.UID] == 'sid')
+        assert (rows[0][ru.ENTITY] == 'session')
+        assert (rows[1][ru.TIME] == 101.0)
+        assert (rows[1][ru.ENTITY] == 'pilot')
+
+    def test_short_rows(self):
+        """Test that short rows are padded, and long rows are skipped"""
+        lines = ['#time,event,comp,thread,uid,state,msg',
+                 '101.0,advance,agent_0,MainThread,pilot.0000,PMGR_ACTIVE',
+                 '102.0,exec_start,agent_0',
+                 '103.0,exec_stop,agent_0,MainThread,pilot.0000,,,,long',
+                 '104.0,exec_stop,agent_0,MainThread,pilot.0000,,,']
+        rows  = rar.read_profile(lines, 'agent_0', 'sid')
+
+        assert ([r[ru.TIME] for r in rows] == [101.0, 102.0, 104.0])
+        assert (rows[0][ru.MSG] == '')
+        assert (rows[0][ru.ENTITY] == 'pilot')
+        assert (rows[1][ru.UID] == 'sid')
+        assert (rows[1][ru.ENTITY] == 'session')
+        assert (rows[1][ru.STATE] == '')
+        assert (None not in rows[1])
+
+    def test_read_frame(self, profile):
+        """Test that the columnar parser yields the same events"""
+        with open(profile) as f:
+            rows = rar.read_profile(f, profile, 'sid')
+        frame = rar.read_frame(profile, profile, 'sid')
+
+        assert (frame.columns.tolist() == range(ru.PROF_KEY_MAX))
+        assert (frame.values.tolist() == rows)
+
+    @pytest.mark.parametrize('first', ['', '1.0,a,b,c,d,e,f,g\n',
+                                       '1.0,a,b,c,d,e,f,g,h,i\n'])
+    def test_ragged(self, tmpdir, first):
+        """Test that both parsers pad short lines and drop invalid ones"""
+        path = tmpdir.join('ragged.prof')
+        path.write(first + RAGGED)
+        path = str(path)
+
+        with open(path) as f:
+            rows = rar.read_profile(f, path, 'sid')
+        frame = rar.read_frame(path, path, 'sid')
+
+        assert (frame.values.tolist() == rows)
+        assert ([r[ru.TIME] for r in rows] ==
+                [100.0, 101.0, 102.5, 103.0, 104.0])
+        assert (rows[2][ru.MSG] == 'msg')
+        assert (rows[3][ru.UID] == 'sid')
+        assert (rows[3][ru.STATE] == '')
+        assert (rows[4][ru.STATE] == 'DONE')
+        assert (rows[4][ru.MSG] == '')
+
+    def test_legacy(self):
+        """Test that legacy profiles are read by both parsers"""
+        path = os.path.join(BARRIER, 'umgr.0000.prof')
+        with open(path) as f:
+            rows = rar.read_profile(f, path, 'sid')
+        frame = rar.read_frame(path, path, 'sid')
+
+        assert (len(rows) > 0)
+        assert (frame.values.tolist() == rows)
+
+        s_prof  = Session(BARRIER, 'radical.prof')
+        s_store = Session(BARRIER, 'radical.prof', columnar=True)
+        assert (s_store.describe('statistics') ==
+                s_prof.describe('statistics'))
+        assert (s_store.list('uid') == s_prof.list('uid'))
+
+    @pytest.mark.parametrize('workers', [1, 2])
+    def test_combine(self, profiles, workers):
+        """Test parallel reading and merging against ru.combine_profiles"""
+        paths    = sorted(str(p) for p in os.listdir(profiles))
+        paths    = [os.path.join(profiles, p) for p in paths]
+        p_ru, _  = ru.combine_profiles(ru.read_profiles(paths, 'sid'))
+        p_ra, _  = rar.combine_profiles(rar.read_profiles(paths, 'sid',
+                                                          workers=workers))
+
+        # ru duplicates the sync_abs event transplanted to `exec.prof`
+        p_ru = [e for e in p_ru if e[ru.EVENT] != 'sync_abs']
+        p_ra = [e for e in p_ra if e[ru.EVENT] != 'sync_abs']
+
+        assert (sorted(p_ra) == sorted(p_ru))
+        assert ([e[ru.TIME] for e in p_ra] == sorted(e[ru.TIME] for e in p_ra))
+
+    def test_clean(self, profiles):
+        """Test that cleaned profiles contain the events of ru.clean_profile"""
+        paths      = [os.path.join(profiles, p) for p in os.listdir(profiles)]
+        profile, _ = rar.combine_profiles(rar.read_profiles(paths, 'sid'))
+        frame, _   = rar.combine_frames(rar.read_profiles(paths, 'sid',
+                                                          columnar=True))
+
+        # repeat the first state transition at the end of the profile
+        idx    = [e[ru.EVENT] for e in profile].index('advance')
+        repeat = list(profile[idx])
+        repeat[ru.TIME] = profile[-1][ru.TIME]
+        profile.append(repeat)
+        frame = frame.append(pd.DataFrame([repeat]), ignore_index=True)
+
+        # ru.clean_profile assigns the session uid itself
+        p_ru = ru.clean_profile([e[:ru.UID] + [''] + e[ru.UID + 1:]
+                                 if e[ru.ENTITY] == 'session' else list(e)
+                                 for e in profile], 'sid')
+        p_ra = rar.clean_profile([list(e) for e in profile])
+        f_ra = rar.clean_frame(frame)
+
+        # ru groups events by entity, so only the order per entity matches
+        def by_uid(events):
+            return {uid: [e for e in events if e[ru.UID] == uid]
+                    for uid in set(e[ru.UID] for e in events)}
+
+        assert (len(p_ra) == len(p_ru) == len(profile) - 1 + 4)
+        assert (by_uid(p_ra) == by_uid(p_ru))
+        assert (f_ra.values.tolist() == p_ra)
+
+    @pytest.mark.parametrize('columnar', [False, True])
+    def test_directory(self, profiles, columnar):
+        """Test that all profiles of a session directory are read"""
+        session = Session(profiles, 'radical.prof', columnar=columnar)
+
+        assert (session.uid == 'rp.session.0001')
+        assert (sorted(e.uid for e in session.get(etype=['pilot', 'unit'])) ==
+                ['pilot.0000', 'unit.000000'])
+        assert (session.get(uid='unit.000000')[0].t_range == [1.0, 4.0])
+
+    def test_columnar(self, profiles):
+        """Test that columnar parsing yields the same session"""
+        s_prof  = Session(profiles, 'radical.prof')
+        s_store = Session(profiles, 'radical.prof', columnar=True)
+
+        assert (s_store.describe('statistics') ==
+                s_prof.describe('statistics'))
+        for uid in s_prof.list('uid'):
+            assert (s_store.entity(uid).events ==
+                    [tuple(e) for e in s_prof.entity(uid).events])
+
+    @pytest.mark.parametrize('columnar', [False, True])
+    def test_tarball(self, tarball, tmpdir, columnar):
+        """Test that tarballs are read without extracting them"""
+        profile = str(tmpdir.join('src', 'rp.session.0000', 'agent_0.prof'))
+        s_prof  = Session(profile, 'radical.prof')
+        s_tar   = Session(tarball, 'radical.prof', columnar=columnar)
+
+        assert (s_tar.uid == 'rp.session.0000')
+        assert (os.listdir(os.path.dirname(tarball)) ==
+                [os.path.basename(tarball)])
+        assert (s_tar.t_range == s_prof.t_range)
+        assert (sorted(e.uid for e in s_tar.get(etype=['pilot', 'unit'])) ==
+                sorted(e.uid for e in s_prof.get(etype=['pilot', 'unit'])))
+        assert (s_tar.describe('statistics')['state'] ==
+                s_prof.describe('statistics')['state'])
+
+    def test_tarball_cache(self, tarball, monkeypatch):
+        """Test that a cached tarball session is not read again"""
+        s1 = Session(tarball, 'radical.prof', cache=True)
+
+        def no_reading(*args, **kwargs):
+            raise AssertionError('tarball should not be read')
+        monkeypatch.setattr(rar, 'read_tarball', no_reading)
+
+        s2 = Session(tarball, 'radical.prof', cache=True)
+        assert (s2.t_range == s1.t_range)
+
+    def test_session_dir(self, tarball):
+        """Test temporary extraction for directory based session types"""
+        with rar.session_dir(tarball) as path:
+            assert (os.path.basename(path) == 'rp.session.0000')
+            assert (os.listdir(path) == ['agent_0.prof'])
+        assert (not os.path.exists(path))
+
+    def test_session_dir_members(self, tmpdir):
+        """Test that only profiles and JSON files are extracted"""
+        sdir = tmpdir.mkdir('src').mkdir('rp.session.0000')
+        sdir.join('rp.session.0000.json').write('{}')
+        sdir.join('agent_0.prof').write(PROFILE)
+        sdir.mkdir('pilot.0000').join('agent_0.log').write('log')
+        sdir.join('pilot.0000', 'agent_1.prof').write(PROFILE)
+
+        path = str(tmpdir.join('rp.session.0000.tgz'))
+        with tarfile.open(path, 'w:gz') as tf:
+            tf.add(str(sdir), arcname='rp.session.0000')
+            tf.add(str(sdir.join('agent_0.prof')), arcname='../escape.prof')
+
+        with rar.session_dir(path) as tgt:
+            found = sorted(os.path.relpath(os.path.join(root, fname), tgt)
+                           for root, _, fnames in os.walk(tgt)
+                           for fname in fnames)
+            assert (found == ['agent_0.prof', 'pilot.0000/agent_1.prof',
+                              'rp.session.0000.json'])
+            assert (not os.path.exists(os.path.join(os.path.dirname(tgt),
+                                                    '..', 'escape.prof')))
+        assert (not os.path.exists(tgt))
@@ -0,0 +1,153 @@
+import numpy as np
+import pytest
+import radical.utils as ru
+from radical.analytics import Session, TimeSeries
+import radical.analytics.sweep as sweep
+
+from .test_session import PROFILE, profile
+
+
+@pytest.fixture
+def session(profile):
+    """Fixture to create a session with a pilot owning two units"""
+    session = Session(profile, 'radical.prof')
+    session._description['tree'] = {
+        'pilot.0000' : {'children': ['unit.000000', 'unit.000001']}}
+    for uid, cores in [['pilot.0000', 8], ['unit.000000', 2],
+                       ['unit.000001', 4]]:
+        session.get(uid=uid)[0]._description = {'cores': cores}
+    return session
+
+
+class TestTimeSeries(object):
+
+    def test_create(self):
+        """Test series creation from pairs and arrays"""
+        ts = TimeSeries([[2.0, 1], [1.0, 3], [2.0, 2], [4.0, 0]])
+
+        assert (ts.times.tolist()  == [1.0, 2.0, 4.0])
+        assert (ts.values.tolist() == [3, 2, 0])
+        assert (ts == [[1.0, 3], [2.0, 2], [4.0, 0]])
+        assert (TimeSeries(ts.times, ts.values) == ts)
+        assert (ts[1] == [2.0, 2])
+        assert (ts.t_range == [1.0, 4.0])
+        assert (not TimeSeries())
+
+        with pytest.raises(ValueError):
+            TimeSeries([1.0, 2.0], [1])
+
+    def test_evaluate(self):
+        """Test values, integrals and statistics"""
+        ts = TimeSeries([1.0, 2.0, 4.0], [3, 2, 0])
+
+        assert (ts.at([0.0, 1.0, 1.5, 2.0, 5.0]).tolist() == [0, 3, 3, 2, 0])
+        assert (ts.at(2.0) == 2)
+        assert (ts.integrate() == 7.0)
+        assert (ts.integrate(1.5, 3.0) == 3.5)
+        assert (ts.max() == 3)
+        assert (ts.mean() == 7.0 / 3)
+        assert (ts.window(1.5, 3.0) == [[1.5, 3], [2.0, 2], [3.0, 0]])
+        assert (ts.resample(1.0) == [[1.0, 3], [2.0, 2], [3.0, 2], [4.0, 0]])
+        assert (TimeSeries().integrate() == 0.0)
+
+    def test_arithmetic(self):
+        """Test adding and subtracting of series"""
+        a = TimeSeries([1.0, 3.0], [2, 0])
+        b = TimeSeries([2.0, 4.0], [1, 0])
+
+        assert ((a + b) == [[1.0, 2], [2.0, 3], [3.0, 1], [4.0, 0]])
+        assert ((a - b) == [[1.0, 2], [2.0, 1], [3.0, -1], [4.0, 0]])
+        assert (sum([a, b]) == a + b)
+        assert (TimeSeries.sum([a, b, TimeSeries()]) == a + b)
+        assert ((a * 2).integrate() == 8.0)
+        assert ((a / 4).values.tolist() == [0.5, 0.0])
+        assert ((a + b).integrate() == a.integrate() + b.integrate())
+
+    def test_sum(self):
+        """Test the sum of many random series against pairwise addition"""
+        rng    = np.random.RandomState(42)
+        series = [TimeSeries(np.sort(rng.uniform(0, 100, 20)),
+                             rng.randint(0, 10, 20)) for _ in range(64)]
+        total  = TimeSeries.sum(series)
+
+        pairwise = series[0]
+        for ts in series[1:]:
+            pairwise = pairwise + ts
+
+        assert (total == pairwise)
+
+    def test_session(self, session):
+        """Test series returned by session methods"""
+        event = [{ru.EVENT: 'exec_start'}, {ru.EVENT: 'exec_stop'}]
+        conc  = session.concurrency(event=event, series=True)
+
+        assert (conc == [[2.5, 1], [3.5, 2], [4.0, 1], [6.0, 0]])
+        assert (conc.integrate() == session.filter(etype='unit', inplace=False)
+                                           .durations({'e': event})['e'].sum())
+        assert (session.concurrency(event=event, sampling=1.0, series=True) ==
+                [[2.5, 1], [3.5, 2], [4.5, 1], [5.5, 1], [6.5, 0]])
+
+        rate = session.rate(state='DONE', sampling=1.0, series=True)
+        assert (rate.integrate() == 3.0)
+        assert (rate.times[1:].tolist() ==
+                [t for t, _ in session.rate(state='DONE', sampling=1.0)])
+
+        p_evt = [{ru.STATE: 'PMGR_ACTIVE'}, {ru.STATE: 'DONE'}]
+        util  = session.utilization(owner='pilot', consumer='unit',
+                                    resource='cores', owner_events=p_evt,
+                                    consumer_events=event, series=True)
+        used  = util['pilot.0000']['utilization']
+
+        assert (used == [[2.5, 2], [3.5, 6], [4.0, 4], [6.0, 0]])
+        assert (used.integrate() == 2 * 1.5 + 4 * 2.5)
+        assert (used.max() == 6)
+
+    def test_accounting(self, session):
+        """Test resource accounting against utilization integrals"""
+        p_evt = [{ru.STATE: 'PMGR_ACTIVE'}, {ru.STATE: 'DONE'}]
+        u_evt = [{ru.EVENT: 'exec_start'}, {ru.EVENT: 'exec_stop'}]
+        acc   = session.resource_accounting(owner='pilot', consumer='unit',
+                                            resource='cores',
+                                            owner_events=p_evt,
+                                            consumer_events=u_evt)
+        util  = session.utilization(owner='pilot', consumer='unit',
+                                    resource='cores', owner_events=p_evt,
+                                    consumer_events=u_evt, series=True)
+
+        pilot = acc['owners']['pilot.0000']
+        assert (pilot['range']     == [[1.0, 8.0]])
+        assert (pilot['resources'] == 8)
+        assert (pilot['available'] == 8 * 7.0)
+        assert (pilot['used']      ==
+                util['pilot.0000']['utilization'].integrate())
+        assert (pilot['idle']      == pilot['available'] - pilot['used'])
+        assert (acc['total']       == {'resources': 8,
+                                       'available': 56.0,
+                                       'used'     : 13.0,
+                                       'idle'     : 43.0})
+
+        # without events, the full entity time ranges are accounted
+        acc = session.resource_accounting(owner='pilot', consumer='unit',
+                                          resource='cores')
+        assert (acc['total']['available'] == 8 * 7.0)
+        assert (acc['total']['used'] == 2 * 3.0 + 4 * 4.0)
+
+    def test_integrals(self):
+        """Test batched integrals against single series integrals"""
+        rng     = np.random.RandomState(42)
+        n       = 1000
+        groups  = rng.randint(0, 50, n)
+        starts  = rng.uniform(0, 100, n)
+        stops   = starts + rng.uniform(0, 10, n)
+        weights = rng.uniform(0, 4, n)
+        masks   = [range(50), rng.uniform(0, 50, 50), rng.uniform(50, 110, 50)]
+
+        ret = sweep.integrals(groups, starts, stops, weights, 51, masks=masks)
+
+        assert (len(ret) == 51 and ret[50] == 0.0)
+        for g in range(50):
+            sel = groups == g
+            ts  = TimeSeries(*sweep.steps(np.zeros(sel.sum()), starts[sel],
+                                          stops[sel], weights[sel], 1)[0])
+            assert (abs(ret[g] - ts.integrate(masks[1][g], masks[2][g]))
+                    < 1e-9)
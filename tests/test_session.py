@@ -1,7 +1,9 @@
 import os
 import json
+import numpy as np
 import pytest
 import radical.utils as ru
+import radical.analytics.reader as rar
 from radical.analytics import Session
 
 
@@ -9,8 +11,242 @@ from radical.analytics import Session
 directory = "{}/example-data".format(
     os.path.dirname(os.path.abspath(__file__)))
 
+
+# A small profile in `radical.prof` format: one pilot executing two units
+PROFILE = """\
+#time,event,comp,thread,uid,state,msg
+100.0,sync_abs,agent_0,MainThread,,,host:1.2.3.4:100.0:100.0:ntp
+101.0,advance,agent_0,MainThread,pilot.0000,PMGR_ACTIVE,
+102.0,advance,agent_0,MainThread,unit.000000,AGENT_EXECUTING,
+102.5,exec_start,agent_0,MainThread,unit.000000,,
+103.0,advance,agent_0,MainThread,unit.000001,AGENT_EXECUTING,
+103.5,exec_start,agent_0,MainThread,unit.000001,,
+104.0,exec_stop,agent_0,MainThread,unit.000000,,
+105.0,advance,agent_0,MainThread,unit.000000,DONE,
+106.0,exec_stop,agent_0,MainThread,unit.000001,,
+107.0,advance,agent_0,MainThread,unit.000001,DONE,
+108.0,advance,agent_0,MainThread,pilot.0000,DONE,
+109.0,END,agent_0,MainThread,,,
+"""
+
+
+@pytest.fixture
+def profile(tmpdir):
+    """Fixture to write the example profile into a temporary directory"""
+    path = tmpdir.join('agent_0.prof')
+    path.write(PROFILE)
+    return str(path)
+
+
 class TestSession(object):
 
     def test_example(self):
         """do some test here"""
         assert True
+
+    def test_columnar(self, profile):
+        """Test that a columnar session behaves like a profile based one"""
+        s_prof  = Session(profile, 'radical.prof')
+        s_store = Session(profile, 'radical.prof', columnar=True)
+
+        assert (s_store._profile is None)
+        assert (s_store.describe('statistics') ==
+                s_prof.describe('statistics'))
+        assert (s_store.t_range == s_prof.t_range)
+
+        for uid in s_prof.list('uid'):
+            e_prof  = s_prof.get(uid=uid)[0]
+            e_store = s_store.get(uid=uid)[0]
+            assert (e_store.events == [tuple(e) for e in e_prof.events])
+            assert (e_store.list_states() == e_prof.list_states())
+
+        assert (sorted(e.uid for e in s_store.get(etype='unit')) ==
+                ['unit.000000', 'unit.000001'])
+        assert (len(s_store.get(state='DONE')) == 3)
+
+        event = [{ru.EVENT: 'exec_start'}, {ru.EVENT: 'exec_stop'}]
+        assert (s_store.concurrency(event=event) ==
+                s_prof.concurrency(event=event))
+        assert (s_store.duration(event=event) == 3.5)
+
+    def test_filter_view(self, profile, monkeypatch):
+        """Test that non-inplace filters do not reload the session"""
+        session = Session(profile, 'radical.prof')
+
+        def no_parsing(*args, **kwargs):
+            raise AssertionError('profile should not be parsed')
+        for name in ['read_profiles', 'read_tarball', 'read_profile',
+                     'read_frame']:
+            monkeypatch.setattr(rar, name, no_parsing)
+
+        # make sure that parsing is actually guarded
+        with pytest.raises(AssertionError):
+            Session(profile, 'radical.prof')
+
+        units = session.filter(etype='unit', inplace=False)
+
+        assert (units is not session)
+        assert (units.describe() is session.describe())
+        assert (sorted(units.list('uid')) == ['unit.000000', 'unit.000001'])
+        assert (units.get(uid='unit.000000')[0] is
+                session.get(uid='unit.000000')[0])
+        assert (len(session.get()) == 4)
+        assert (units.t_range == [2.0, 7.0])
+
+    def test_lazy_properties(self, profile, monkeypatch):
+        """Test that property counters are only collected when queried"""
+        session = Session(profile, 'radical.prof')
+
+        def no_counting(*args, **kwargs):
+            raise AssertionError('properties should not be collected')
+        monkeypatch.setattr(Session, '_initialize_properties', no_counting)
+
+        session.filter(etype='unit')
+        assert (session.t_range == [2.0, 7.0])
+        assert (session.ttc == 5.0)
+
+        session.filter(uid='unit.000001')
+        assert (session.t_range == [3.0, 7.0])
+
+        monkeypatch.undo()
+        assert (session.list('uid') == ['unit.000001'])
+        assert (session.describe('statistics')['state'] ==
+                {'AGENT_EXECUTING': 1, 'DONE': 1})
+
+    @pytest.mark.parametrize('columnar', [False, True])
+    def test_index(self, profile, columnar):
+        """Test that index based filters match the expected entities"""
+        session = Session(profile, 'radical.prof', columnar=columnar)
+
+        def uids(**kwargs):
+            return sorted(e.uid for e in session.get(**kwargs))
+
+        assert (uids(etype='pilot') == ['pilot.0000'])
+        assert (uids(uid=['unit.000001', 'no_such_uid']) == ['unit.000001'])
+        assert (uids(event='exec_start') == ['unit.000000', 'unit.000001'])
+        assert (uids(etype='unit', state='DONE') ==
+                ['unit.000000', 'unit.000001'])
+        assert (uids(etype='pilot', event='exec_start') == [])
+        assert (uids(state='DONE', time=[6.5, 9.0]) ==
+                ['pilot.0000', 'unit.000001'])
+        assert (uids(event='exec_stop', time=[0.0, 5.0]) == ['unit.000000'])
+
+        session.filter(uid=['unit.000000', 'pilot.0000'])
+        assert (uids() == ['pilot.0000', 'unit.000000'])
+        assert (uids(state='DONE') == ['pilot.0000', 'unit.000000'])
+        assert (session.filter(etype='unit', inplace=False).list('uid') ==
+                ['unit.000000'])
+
+    def test_utilization(self, profile):
+        """Test core utilization of a pilot by its units"""
+        session = Session(profile, 'radical.prof')
+
+        session._description['tree'] = {
+            'pilot.0000' : {'children': ['unit.000000', 'unit.000001']}}
+        for uid, cores in [['pilot.0000', 8], ['unit.000000', 2],
+                           ['unit.000001', 4]]:
+            session.get(uid=uid)[0]._description = {'cores': cores}
+
+        p_evt = [{ru.STATE: 'PMGR_ACTIVE'}, {ru.STATE: 'DONE'}]
+        u_evt = [{ru.EVENT: 'exec_start'}, {ru.EVENT: 'exec_stop'}]
+        ret   = session.utilization(owner='pilot', consumer='unit',
+                                    resource='cores', owner_events=p_evt,
+                                    consumer_events=u_evt)
+
+        assert (ret.keys() == ['pilot.0000'])
+        assert (ret['pilot.0000']['resources'] == 8)
+        assert (ret['pilot.0000']['range'] == [[1.0, 8.0]])
+        assert (ret['pilot.0000']['utilization'] ==
+                [[2.5, 2], [3.5, 6], [4.0, 6], [6.0, 4]])
+
+    @pytest.mark.parametrize('columnar', [False, True])
+    def test_durations(self, profile, columnar):
+        """Test batch durations against single entity durations"""
+        session = Session(profile, 'radical.prof', columnar=columnar)
+        table   = {'exec' : [{ru.EVENT: 'exec_start'},
+                             {ru.EVENT: 'exec_stop'}],
+                   'run'  : [{ru.EVENT: 'state', ru.STATE: 'AGENT_EXECUTING'},
+                             {ru.EVENT: 'state', ru.STATE: 'DONE'}],
+                   'none' : [{ru.EVENT: 'exec_start'},
+                             {ru.EVENT: 'no_such_event'}],
+                   'life' : [{ru.EVENT: 'state', ru.STATE: 'PMGR_ACTIVE'},
+                             {ru.EVENT: 'state', ru.STATE: 'DONE'}]}
+
+        df = session.durations(table)
+
+        assert (sorted(df.columns) == sorted(table.keys()))
+        assert (sorted(df.index)   == sorted(session.list('uid')))
+
+        for uid in df.index:
+            entity = session.get(uid=uid)[0]
+            for name in table:
+                try:
+                    expected = entity.duration(event=table[name])
+                except ValueError:
+                    assert (np.isnan(df.loc[uid, name]))
+                else:
+                    assert (df.loc[uid, name] == expected)
+
+        assert (df.loc['unit.000001', 'exec'] == 2.5)
+        assert (df.loc['pilot.0000', 'life'] == 7.0)
+        assert (df['none'].isnull().all())
+
+    @pytest.mark.parametrize('columnar', [False, True])
+    def test_state_matrix(self, profile, columnar):
+        """Test the state timestamp matrix against entity states"""
+        session = Session(profile, 'radical.prof', columnar=columnar)
+        matrix  = session.state_matrix('unit')
+
+        assert (list(matrix.index) == ['unit.000000', 'unit.000001'])
+        assert (list(matrix.columns) == ['AGENT_EXECUTING', 'DONE'])
+
+        for uid in matrix.index:
+            entity = session.get(uid=uid)[0]
+            for state in matrix.columns:
+                assert (matrix.loc[uid, state] ==
+                        entity.timestamps(state=state)[0])
+
+        assert ((matrix['DONE'] - matrix['AGENT_EXECUTING']).tolist() ==
+                [3.0, 4.0])
+        assert (session.state_matrix('unit') is matrix)
+
+        pilot = session.state_matrix('pilot', states=['NEW', 'DONE'])
+        assert (np.isnan(pilot.loc['pilot.0000', 'NEW']))
+        assert (pilot.loc['pilot.0000', 'DONE'] == 8.0)
+
+        view = session.filter(uid='unit.000001', inplace=False)
+        assert (list(view.state_matrix('unit').index) == ['unit.000001'])
+
+        session.filter(uid=['unit.000000', 'pilot.0000'])
+        assert (list(session.state_matrix('unit').index) == ['unit.000000'])
+
+    def test_relations(self, profile):
+        """Test entity lookup and parent relations"""
+        session = Session(profile, 'radical.prof')
+        session._description['tree'] = {
+            'pilot.0000' : {'children': ['unit.000000', 'unit.000001']}}
+
+        assert (session.entity('unit.000001').uid == 'unit.000001')
+        with pytest.raises(KeyError):
+            session.entity('unit.000002')
+
+        assert (session.describe('relations', ['pilot', 'unit']) ==
+                {'pilot.0000': ['unit.000000', 'unit.000001']})
+        assert (session.describe('parents', ['pilot', 'unit']) ==
+                {'unit.000000': 'pilot.0000', 'unit.000001': 'pilot.0000'})
+
+    def test_rates(self, profile):
+        """Test rates for several selectors against single rates"""
+        session = Session(profile, 'radical.prof')
+        start   = {'event': {ru.EVENT: 'exec_start'}}
+        done    = {'state': 'DONE'}
+
+        assert (session.rate(sampling=1.0, **done) ==
+                [[6.0, 1.0], [7.0, 1.0], [8.0, 1.0]])
+
+        times, rates = session.rates({'start': start, 'done': done},
+                                     sampling=1.0)
+
+        assert (times.tolist() == [3.5, 4.5, 5.5, 6.5, 7.5, 8.0])
+        assert (rates['start'].tolist() == [2.0, 0.0, 0.0, 0.0, 0.0, 0.0])
+        assert (rates['done'].tolist()  == [0.0, 0.0, 1.0, 0.0, 1.0, 2.0])
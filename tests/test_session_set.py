@@ -0,0 +1,94 @@
+import os
+import signal
+import pytest
+from radical.analytics import Session, SessionSet
+import radical.analytics.reader      as rar
+import radical.analytics.session_set as rass
+
+from .test_session import PROFILE
+
+
+@pytest.fixture
+def profiles(tmpdir):
+    """Fixture to write a set of session profiles into a temporary directory"""
+    ret = dict()
+    for i in range(3):
+        path = tmpdir.mkdir('session.%d' % i).join('agent_0.prof')
+        path.write(PROFILE)
+        ret['session.%d' % i] = str(path)
+    return ret
+
+
+class TestSessionSet(object):
+
+    @pytest.mark.parametrize('columnar', [False, True])
+    def test_iterate(self, profiles, columnar):
+        """Test that all sessions are loaded, and equal direct loading"""
+        sessions = SessionSet(profiles, 'radical.prof', workers=2,
+                              columnar=columnar)
+        expected = Session(profiles['session.0'], 'radical.prof')
+
+        assert (len(sessions) == 3)
+        assert (sessions.sids == sorted(profiles.keys()))
+
+        found = list()
+        for sid, session in sessions:
+            found.append(sid)
+            assert (session._sid == sid)
+            assert (session.ttc == expected.ttc)
+            assert (sorted(e.uid for e in session.get(etype=['pilot', 'unit']))
+                    == ['pilot.0000', 'unit.000000', 'unit.000001'])
+            assert (os.path.isfile('%s.ra.cache' % profiles[sid]))
+
+        assert (sorted(found) == sessions.sids)
+        assert (sessions.errors == dict())
+
+    def test_prepare(self, profiles, monkeypatch):
+        """Test cache creation, and loading from caches in the parent"""
+        caches = SessionSet(profiles, 'radical.prof', workers=3,
+                            memory=1).prepare()
+
+        assert (sorted(caches.keys()) == sorted(profiles.keys()))
+
+        def no_parsing(*args, **kwargs):
+            raise AssertionError('profile should not be parsed')
+        monkeypatch.setattr(rar, 'read_profiles', no_parsing)
+
+        sessions = SessionSet(profiles, 'radical.prof')
+        assert (len(sessions.get('session.1').get()) == 4)
+
+    def test_errors(self, profiles, tmpdir):
+        """Test that failing sessions are reported, not raised"""
+        profiles['broken'] = str(tmpdir.join('no_such_session'))
+
+        sessions = SessionSet(profiles, 'radical.prof', workers=2)
+        found    = [sid for sid, _ in sessions]
+
+        assert (sorted(found) == ['session.0', 'session.1', 'session.2'])
+        assert (sessions.errors.keys() == ['broken'])
+
+    def test_lost_worker(self, profiles, monkeypatch):
+        """Test that sessions of killed workers are reported, not waited for"""
+        def dying(src, stype, sid=None, **kwargs):
+            if sid == 'session.1':
+                # as the out-of-memory killer would do
+                os.kill(os.getpid(), signal.SIGKILL)
+            return Session(src, stype, sid=sid, **kwargs)
+        monkeypatch.setattr(rass, 'Session', dying)
+
+        sessions = SessionSet(profiles, 'radical.prof', workers=2)
+        found    = [sid for sid, _ in sessions]
+
+        assert (sorted(found) == ['session.0', 'session.2'])
+        assert (sessions.errors.keys() == ['session.1'])
+        assert ('died' in sessions.errors['session.1'])
+
+    def test_sids(self, tmpdir):
+        """Test that session IDs are derived from directory and tarball names"""
+        srcs = [str(tmpdir.join(name)) for name in
+                ['rp.session.a/', 'rp.session.b.tgz', 'rp.session.c.tar.gz',
+                 'rp.session.d.tbz', 'rp.session.e.tar.bz2']]
+
+        assert (SessionSet(srcs, 'radical.pilot').sids ==
+                ['rp.session.a', 'rp.session.b', 'rp.session.c',
+                 'rp.session.d', 'rp.session.e'])
@@ -0,0 +1,174 @@
+import os
+import json
+import pytest
+import numpy as np
+import pandas as pd
+import radical.utils as ru
+from radical.analytics.entity import Entity
+from radical.analytics.store import EventStore, code_dtype
+
+
+# Test Directory use to load example json files
+directory = "{}/example-data".format(
+    os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_entity(name):
+    """Load an example entity from example data"""
+    with open("{}/{}-entity-example.json".format(directory, name), 'r') as f:
+        entity = json.load(f)
+        entity['events'] = [tuple(l) for l in entity['events']]
+        return entity
+
+
+@pytest.fixture
+def pilot_entity():
+    """Fixture to get the example Pilot entity from example data"""
+    return load_entity('pilot')
+
+
+@pytest.fixture
+def range_entity():
+    """Fixture to get the example range-testing entity from example data"""
+    return load_entity('range-testing')
+
+
+def make_entities(entity):
+    """Create a profile based and a store based entity from the same data"""
+    e_prof = Entity(_uid=entity['uid'],
+                    _etype=entity['etype'],
+                    _profile=entity['events'],
+                    _details=entity['details'])
+
+    store = EventStore(entity['events'])
+    uid, etype, rng = list(store.entities())[0]
+    e_store = Entity(_uid=uid,
+                     _etype=etype,
+                     _profile=rng,
+                     _details=entity['details'],
+                     _store=store)
+
+    return e_prof, e_store
+
+
+class TestEventStore(object):
+
+    def test_columns(self, pilot_entity):
+        """Test the column types and sizes"""
+        store = EventStore(pilot_entity['events'])
+
+        assert (len(store) == len(pilot_entity['events']))
+        assert (store.time.dtype == np.float64)
+        for key in EventStore.CODED:
+            assert (store.column(key).dtype == np.int8)
+            assert (len(store.column(key)) == len(store))
+
+    def test_code_dtype(self):
+        """Test that code columns use the smallest fitting integer type"""
+        assert (code_dtype(0)       == np.int8)
+        assert (code_dtype(128)     == np.int8)
+        assert (code_dtype(129)     == np.int16)
+        assert (code_dtype(2 ** 16) == np.int32)
+
+    def test_intern(self, pilot_entity):
+        """Test that equal names are shared after interning"""
+        events = pilot_entity['events']
+        copies = load_entity('pilot')['events']
+        interned = EventStore.intern(events + copies)
+
+        assert (interned == events + copies)
+        for e1, e2 in zip(interned[:len(events)], interned[len(events):]):
+            for key in EventStore.CODED:
+                assert (e1[key] is e2[key])
+
+    def test_entities(self, pilot_entity, range_entity):
+        """Test grouping of events by uid"""
+        events = pilot_entity['events'] + \
+                 [tuple([e[0]] + list(e[1:4]) + ['other.0000'] + list(e[5:]))
+                  for e in range_entity['events']]
+        store = EventStore(events)
+
+        found = dict()
+        for uid, etype, rng in store.entities():
+            times = store.time[rng]
+            assert (np.all(np.diff(times) >= 0))
+            found[uid] = rng.stop - rng.start
+
+        assert (found == {pilot_entity['uid']: len(pilot_entity['events']),
+                          'other.0000'       : len(range_entity['events'])})
+
+    def test_unsorted(self):
+        """Test grouping of interleaved, unsorted events"""
+        def event(t, name, uid):
+            return (t, name, 'comp', 'tid', uid, None, '', uid.split('.')[0])
+
+        events = [event(3.0, 'a', 'x.0'), event(1.0, 'b', 'y.0'),
+                  event(1.0, 'c', 'x.0'), event(2.0, 'd', 'y.0'),
+                  event(1.0, 'e', 'x.0')]
+        store  = EventStore(events)
+
+        assert (store.symbols(ru.UID) == ['x.0', 'y.0'])
+        assert (store.bounds.tolist() == [0, 3, 5])
+        assert (store.names(ru.EVENT, slice(0, 5)) == ['c', 'e', 'a', 'b', 'd'])
+
+        entity = Entity(_uid='x.0', _etype='x', _profile=events[0::2],
+                        _details={'hostid': None})
+        assert ([e[ru.EVENT] for e in entity.events] == ['c', 'e', 'a'])
+        assert (entity.t_range == [1.0, 3.0])
+
+    def test_events(self, pilot_entity):
+        """Test that events are recreated from the store"""
+        e_prof, e_store = make_entities(pilot_entity)
+
+        assert (e_store.events == e_prof.events)
+        assert (e_store.states == e_prof.states)
+        assert (e_store.t_range == e_prof.t_range)
+        assert (e_store.ttc == e_prof.ttc)
+        assert (sorted(e_store.list_states()) == sorted(e_prof.list_states()))
+
+    def test_timestamps(self, pilot_entity):
+        """Test timestamps on a store based entity"""
+        e_prof, e_store = make_entities(pilot_entity)
+
+        for state in e_prof.list_states():
+            assert (e_store.timestamps(state=state) ==
+                    e_prof.timestamps(state=state))
+
+        assert (e_store.timestamps(event={ru.EVENT: 'state'}) ==
+                e_prof.timestamps(event={ru.EVENT: 'state'}))
+        assert (e_store.timestamps(event={ru.EVENT: 'no_such_event'}) == [])
+
+    def test_ranges(self, range_entity):
+        """Test ranges on a store based entity"""
+        e_prof, e_store = make_entities(range_entity)
+
+        conds = [{'state': ['PMGR_ACTIVE_PENDING', 'FAILED']},
+                 {'state': ['PMGR_LAUNCHING', 'PMGR_ACTIVE_PENDING']},
+                 {'event': [{ru.EVENT: 'put'}, {ru.EVENT: 'sync_rel'}]},
+                 {'event': [{ru.EVENT: 'put'}, {ru.EVENT: 'aaa'}]},
+                 {'event': [['NEW'], ['AAA']]}]
+
+        for cond in conds:
+            for expand in [True, False]:
+                assert (sorted(e_store.ranges(expand=expand, **cond)) ==
+                        sorted(e_prof.ranges(expand=expand, **cond)))
+
+        assert (sorted(e_store.ranges(time=[25.0, 30.0], **conds[0])) ==
+                sorted(e_prof.ranges(time=[25.0, 30.0], **conds[0])))
+
+    def test_missing(self, pilot_entity):
+        """Test that missing values in a frame are stored as empty strings"""
+        frame = pd.DataFrame([list(e) for e in pilot_entity['events']])
+        frame.loc[0, ru.STATE] = None
+        frame.loc[1, ru.STATE] = np.nan
+        frame.loc[2, ru.UID]   = None
+        store = EventStore.from_frame(frame)
+
+        assert (store.column(ru.STATE).min() >= 0)
+        assert (store.column(ru.UID).min()   >= 0)
+        assert ('' in store.symbols(ru.UID))
+
+        events = dict((e[ru.TIME], e) for e in store.events(slice(0, len(store))))
+        assert (events[frame.loc[0, ru.TIME]][ru.STATE] == '')
+        assert (events[frame.loc[1, ru.TIME]][ru.STATE] == '')
+        assert (events[frame.loc[2, ru.TIME]][ru.UID]   == '')
@@ -0,0 +1,95 @@
+import random
+import pytest
+
+from radical.analytics import sweep
+
+
+def brute_concurrency(ranges, times):
+    return [[t, len([r for r in ranges if t >= r[0] and t <= r[1]])]
+            for t in times]
+
+
+def brute_rate(timestamps, times):
+    ret    = list()
+    ts_idx = 0
+    for t_start, t_stop in zip(times[:-1], times[1:]):
+        cnt = 0
+        while ts_idx < len(timestamps) and timestamps[ts_idx] <= t_stop:
+            cnt    += 1
+            ts_idx += 1
+        ret.append([t_stop, cnt / (t_stop - t_start)])
+    return ret
+
+
+@pytest.fixture
+def ranges():
+    """Fixture for a set of random, partially overlapping ranges"""
+    rnd = random.Random(42)
+    ret = list()
+    for _ in range(200):
+        start = rnd.randint(0, 100) / 2.0
+        ret.append([start, start + rnd.randint(0, 20) / 2.0])
+    return ret
+
+
+class TestSweep(object):
+
+    def test_concurrency(self, ranges):
+        """Test sweep line concurrency against the direct count"""
+        times = sorted([r[0] for r in ranges] + [r[1] for r in ranges])
+        assert (sweep.concurrency(ranges) == brute_concurrency(ranges, times))
+        assert (sweep.concurrency([]) == [])
+
+    def test_sampling(self, ranges):
+        """Test sampled concurrency against the direct count"""
+        ret   = sweep.concurrency(ranges, sampling=1.5)
+        times = [t for t, _ in ret]
+
+        assert (times[0]  == min(r[0] for r in ranges))
+        assert (times[-1] >= max(r[1] for r in ranges))
+        assert (times[-2] <  max(r[1] for r in ranges))
+        assert (ret == brute_concurrency(ranges, times))
+
+    def test_sample_times(self):
+        """Test the regular sampling grid"""
+        assert (sweep.sample_times(1.0, 1.0, 0.5).tolist() == [1.0])
+        assert (sweep.sample_times(0.0, 1.0, 0.5).tolist() == [0.0, 0.5, 1.0])
+        assert (sweep.sample_times(0.0, 1.2, 0.5).tolist() ==
+                [0.0, 0.5, 1.0, 1.5])
+
+    def test_weighted(self, ranges):
+        """Test weighted, grouped concurrency against the direct sums"""
+        groups  = [i % 3 for i in range(len(ranges))]
+        weights = [i % 5 + 1 for i in range(len(ranges))]
+
+        ret = sweep.weighted(groups, [r[0] for r in ranges],
+                             [r[1] for r in ranges], weights, 4)
+
+        assert (len(ret) == 4)
+        assert (ret[3] == [])
+
+        for g in range(3):
+            idx   = [i for i in range(len(ranges)) if groups[i] == g]
+            times = sorted([ranges[i][0] for i in idx] +
+                           [ranges[i][1] for i in idx])
+            util  = [[t, sum(weights[i] for i in idx
+                             if t >= ranges[i][0] and t <= ranges[i][1])]
+                     for t in times]
+            assert (ret[g] == util)
+
+    def test_rate(self, ranges):
+        """Test the sweep line rate against a sequential count"""
+        timestamps = sorted(r[0] for r in ranges)
+
+        for sampling in [None, 0.7, 5.0]:
+            times = sweep.rate_times(timestamps, sampling)
+            rates = sweep.rate(timestamps, times)
+
+            assert (len(times) == len(set(times)))
+            assert (times[0]  == timestamps[0])
+            assert (times[-1] == timestamps[-1])
+            assert ([[t, r] for t, r in zip(times[1:], rates)] ==
+                    brute_rate(timestamps, times.tolist()))
+
+        assert (sweep.rate([], sweep.rate_times([])).tolist() == [])
+        assert (sweep.rate([1.0], sweep.rate_times([1.0], 0.5)).tolist() == [])
@@ -0,0 +1,214 @@
+import os
+import imp
+import pytest
+import pandas as pd
+import radical.utils as ru
+
+pytest.importorskip('radical.pilot')
+pytest.importorskip('sqlalchemy')
+
+from radical.analytics import Session
+
+from .test_session import PROFILE
+
+
+# The wrangler is a script, so we load it as module
+WRANGLER = os.path.join(os.path.dirname(os.path.dirname(
+                        os.path.abspath(__file__))),
+                        'bin', 'radical-analytics-wrangler.py')
+wrangler = imp.load_source('wrangler', WRANGLER)
+rp       = wrangler.rp
+
+
+def frames(sid, n_units=2):
+    """Create the session, pilot and unit DFs of a wrangled session"""
+    pilots = pd.DataFrame({'sid': [sid], 'pid': ['pilot.0000'],
+                           'ncore': [8]})
+    units  = pd.DataFrame({'sid': [sid] * n_units,
+                           'uid': ['unit.%06d' % i for i in range(n_units)],
+                           'pid': ['pilot.0000'] * n_units})
+    session = pd.DataFrame({'sid': [sid], 'session': [None],
+                            'nunit': [n_units], 'npilot': [1]}, index=[sid])
+    return {'session': session, 'pilot': pilots, 'unit': units}
+
+
+def wrangle_session(sdir, sid, sra_session=None):
+    """Replacement for `wrangle_session()`, which fails for one session"""
+    if sid == 'rp.session.fail':
+        raise ValueError('no duration defined for given constraints')
+    return frames(sid, n_units=int(sid[-1]))
+
+
+class SessionSet(object):
+    """Replacement for `ra.SessionSet`, which does not parse sessions"""
+    def __init__(self, srcs, stype, workers=None):
+        self._srcs  = srcs
+        self.errors = dict()
+
+    def __iter__(self):
+        for sid in sorted(self._srcs):
+            yield sid, None
+
+
+@pytest.fixture
+def session(tmpdir):
+    """Fixture to create an RP like session of one pilot and two units"""
+    path = tmpdir.join('agent_0.prof')
+    path.write(PROFILE.replace(
+        '101.0,advance,agent_0,MainThread,pilot.0000,PMGR_ACTIVE,\n',
+        '100.5,advance,agent_0,MainThread,pilot.0000,NEW,\n'
+        '101.0,advance,agent_0,MainThread,pilot.0000,PMGR_ACTIVE,\n'))
+
+    session = Session(str(path), 'radical.prof')
+    session._description['tree'] = {
+        'pilot.0000' : {'children': ['unit.000000', 'unit.000001']}}
+    session.get(uid='pilot.0000')[0]._description = {'cores': 8}
+    return session
+
+
+@pytest.fixture
+def engine(tmpdir, monkeypatch):
+    """Fixture to use a temporary wrangler database"""
+    ret = wrangler.create_db(str(tmpdir.join('wrangler.db')))
+    monkeypatch.setattr(wrangler, 'engine', ret)
+    return ret
+
+
+@pytest.fixture
+def sids(monkeypatch):
+    """Fixture to wrangle a set of sessions, one of which fails"""
+    monkeypatch.setattr(wrangler, 'wrangle_session', wrangle_session)
+    monkeypatch.setattr(wrangler.ra, 'SessionSet', SessionSet)
+    return {'data/exp1/%s' % sid: sid for sid in
+            ['rp.session.1', 'rp.session.2', 'rp.session.3',
+             'rp.session.fail']}
+
+
+def dump(engine):
+    """Return the sorted contents of all wrangler tables"""
+    ret = dict()
+    for etype, table in wrangler.tables.items():
+        df = pd.read_sql('SELECT * FROM %s' % table, engine)
+        ret[etype] = df.sort_values(list(df.columns)).values.tolist()
+    return ret
+
+
+class TestWrangler(object):
+
+    def test_wrangle(self, session):
+        """Test the durations derived with the compiled duration definitions"""
+        frames = wrangler.wrangle_session('data/exp1/rp.session.1',
+                                          'rp.session.1', session)
+        pilots = frames['pilot']
+        units  = frames['unit']
+        sess   = frames['session']
+
+        assert (pilots['pid'].tolist() == ['pilot.0000'])
+        assert (pilots['nunit'].tolist() == [2])
+        assert (pilots['P_LRMS_RUNNING'].tolist() == [7.0])
+        assert (pilots['P_LRMS_QUEUING'].isnull().all())
+
+        assert (units['uid'].tolist() == ['unit.000000', 'unit.000001'])
+        assert (units['pid'].tolist() == ['pilot.0000', 'pilot.0000'])
+        assert (units['experiment'].tolist() == ['exp1', 'exp1'])
+        assert (units['util_u_eprep'].tolist() == [0.5, 0.5])
+        assert (units['U_AGENT_EXECUTING'].isnull().all())
+
+        # the compiled definitions yield the durations of the plain ones
+        unit  = session.get(uid='unit.000001')[0]
+        event = [{ru.EVENT: 'state',      ru.STATE: rp.AGENT_EXECUTING},
+                 {ru.EVENT: 'exec_start', ru.STATE: None}]
+        assert (units['util_u_eprep'].iloc[1] == unit.duration(event=event))
+
+        assert (sess['nunit'].tolist() == [2])
+        assert (sess['nunit_done'].tolist() == [2])
+        assert (sess['npilot_active'].tolist() == [1])
+        assert (sess['ncore_active'].tolist() == [8])
+        assert (sess['P_LRMS_RUNNING'].tolist() == [7.0])
+        assert (sess['util_u_eprep'].tolist() == [1.0])
+        assert (sess['TTC'].tolist() == [session.ttc])
+
+    def test_rewrite(self, engine):
+        """Test that re-writing a session replaces its rows"""
+        assert (not wrangler.has_table(engine, 'unit'))
+        assert (wrangler.count_rows('unit', 'rp.session.1') == 0)
+
+        wrangler.write_session('rp.session.1', frames('rp.session.1', 2))
+        wrangler.write_session('rp.session.2', frames('rp.session.2', 2))
+        wrangler.write_session('rp.session.1', frames('rp.session.1', 3))
+
+        assert (wrangler.has_table(engine, 'unit'))
+        assert (wrangler.count_rows('unit',    'rp.session.1') == 3)
+        assert (wrangler.count_rows('unit',    'rp.session.2') == 2)
+        assert (wrangler.count_rows('pilot',   'rp.session.1') == 1)
+        assert (wrangler.count_rows('session', 'rp.session.1') == 1)
+
+        units = pd.read_sql('SELECT sid, uid FROM units', engine)
+        assert (not units.duplicated().any())
+
+        # stored sessions are only wrangled again if rows are missing
+        engine.execute("DELETE FROM units WHERE sid = 'rp.session.1' "
+                       "AND uid = 'unit.000001'")
+        assert (wrangler.get_new_sessions({'a': 'rp.session.1',
+                                           'b': 'rp.session.2',
+                                           'c': 'rp.session.3'}) ==
+                {'a': 'rp.session.1', 'c': 'rp.session.3'})
+
+    def test_failed_write(self, engine):
+        """Test that a failed write leaves the stored session unchanged"""
+        wrangler.write_session('rp.session.1', frames('rp.session.1', 2))
+
+        broken = frames('rp.session.1', 3)
+        broken['unit'] = broken['unit'].rename(columns={'uid': 'unknown'})
+        with pytest.raises(Exception):
+            wrangler.write_session('rp.session.1', broken)
+
+        assert (wrangler.count_rows('unit',    'rp.session.1') == 2)
+        assert (wrangler.count_rows('session', 'rp.session.1') == 1)
+
+    def test_indexes(self, engine):
+        """Test that the tables are indexed"""
+        wrangler.write_session('rp.session.1', frames('rp.session.1'))
+
+        found = set(row[0] for row in engine.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'index'"))
+
+        for etype, columns in wrangler.indexes.items():
+            for column in columns:
+                assert ('%s_%s' % (wrangler.tables[etype], column) in found)
+
+    def test_parallel(self, tmpdir, engine, sids, monkeypatch):
+        """Test that parallel mode stores the same tables as sequential mode"""
+        failed = wrangler.wrangle_sequential(sids)
+        tables = dump(engine)
+
+        assert (failed == ['rp.session.fail'])
+        assert (len(tables['unit']) == 1 + 2 + 3)
+
+        parallel = wrangler.create_db(str(tmpdir.join('parallel.db')))
+        monkeypatch.setattr(wrangler, 'engine', parallel)
+
+        assert (wrangler.wrangle_parallel(sids, 2) == ['rp.session.fail'])
+        assert (dump(parallel) == tables)
+
+    def test_writer_errors(self, engine, sids, monkeypatch, capfd):
+        """Test that sessions which cannot be stored are reported"""
+        write_session = wrangler.write_session
+
+        def failing(sid, frames):
+            if sid == 'rp.session.2':
+                raise IOError('disk full')
+            write_session(sid, frames)
+        monkeypatch.setattr(wrangler, 'write_session', failing)
+
+        failed = wrangler.wrangle_parallel(sids, 2)
+
+        assert (sorted(failed) == ['rp.session.2', 'rp.session.fail'])
+        assert ('cannot store session rp.session.2' in capfd.readouterr()[0])
+        assert (wrangler.count_rows('unit', 'rp.session.3') == 3)
+        assert (wrangler.count_rows('unit', 'rp.session.2') == 0)
+
+        # sequential mode does not abort either
+        failed = wrangler.wrangle_sequential(sids)
+        assert (sorted(failed) == ['rp.session.2', 'rp.session.fail'])
+        assert (wrangler.count_rows('unit', 'rp.session.1') == 1)